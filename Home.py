@@ -1,16 +1,12 @@
-cat > Home.py << 'EOL'
 import streamlit as st
 import os
 import logging
-import json
-import logging.config
 from dotenv import load_dotenv
+from app.logging_setup import configure_from_file
 
 # Configurazione logging
 try:
-    with open('logging_config.json', 'r') as f:
-        config = json.load(f)
-    logging.config.dictConfig(config)
+    configure_from_file('logging_config.json')
 except Exception as e:
     logging.basicConfig(level=logging.INFO)
     logging.warning(f"Non è stato possibile caricare la configurazione di logging: {e}")
@@ -46,7 +42,7 @@ st.markdown(
     "\n\n"
     "### Note: "
     "\n\n"
-    "- L'app salverà le campagne esportate nella cartella \"converted\" "
+    "- L'app salverà le campagne esportate nell'archivio \"archive.db\" "
     "- Un file JSON terrà traccia di cosa è stato esportato"
 )
 
@@ -67,4 +63,3 @@ st.sidebar.info(
     "\n\n"
     "Per maggiori informazioni, visita la [repository GitHub](https://github.com/lucagaribaldi/newsletter_migrator)."
 )
-EOL
@@ -0,0 +1,307 @@
+"""
+Archivio compatto delle newsletter convertite.
+
+Sostituisce i file sciolti in `converted/` con un unico database SQLite: per
+ogni campagna conserva Markdown e HTML pulito (compressi con zlib) e i
+metadati. Le letture usano la mappatura in memoria di SQLite (`mmap_size`),
+quindi l'accesso a una singola campagna non richiede di leggere l'intero file.
+
+    python -m app.archive stats
+    python -m app.archive export converted/            # un file per campagna
+    python -m app.archive export newsletter.zip --format md
+    python -m app.archive import converted/            # migra i vecchi file sciolti
+"""
+import os
+import re
+import sys
+import json
+import zlib
+import sqlite3
+import logging
+import argparse
+import threading
+import zipfile
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FILE = "archive.db"
+
+# Quanta parte del file SQLite mappare in memoria per le letture (256 MB)
+MMAP_SIZE = 256 * 1024 * 1024
+COMPRESSION_LEVEL = 6
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS posts (
+    key TEXT PRIMARY KEY,
+    campaign_id INTEGER,
+    title TEXT NOT NULL,
+    slug TEXT NOT NULL,
+    sent_date TEXT,
+    updated_at TEXT NOT NULL,
+    markdown BLOB,
+    html BLOB,
+    markdown_size INTEGER NOT NULL DEFAULT 0,
+    html_size INTEGER NOT NULL DEFAULT 0,
+    meta TEXT
+)
+"""
+
+_SLUG_RE = re.compile(r'[^\w\s-]')
+
+
+def slugify(title):
+    """Nome di file leggibile ricavato dal titolo (stesso schema usato finora in converted/)."""
+    return _SLUG_RE.sub('', title).strip().replace(' ', '-').lower() or "senza-titolo"
+
+
+def _pack(text):
+    if text is None:
+        return None
+    return zlib.compress(text.encode("utf-8"), COMPRESSION_LEVEL)
+
+
+def _unpack(blob):
+    if blob is None:
+        return None
+    return zlib.decompress(blob).decode("utf-8")
+
+
+class Archive:
+    """
+    Archivio SQLite delle campagne convertite.
+
+    Una sola connessione condivisa tra i thread, protetta da un lock: le
+    scritture sono poche e brevi rispetto a conversione e upload.
+    """
+
+    def __init__(self, path=ARCHIVE_FILE):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+        self._conn.execute(_SCHEMA)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS posts_campaign_id ON posts (campaign_id)")
+        self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def put(self, title, markdown=None, html=None, campaign_id=None, sent_date=None, meta=None):
+        """
+        Salva (o aggiorna) una campagna.
+
+        La chiave è l'ID Brevo quando disponibile, altrimenti lo slug del
+        titolo: così batch e pagina Migrazione non creano più due copie dello
+        stesso post. Un contenuto passato come None non sovrascrive quello già
+        archiviato.
+
+        Returns:
+            str: La chiave della campagna nell'archivio.
+        """
+        slug = slugify(title)
+        key = str(campaign_id) if campaign_id is not None else slug
+        markdown_blob, html_blob = _pack(markdown), _pack(html)
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO posts (key, campaign_id, title, slug, sent_date, updated_at,
+                                   markdown, html, markdown_size, html_size, meta)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    title = excluded.title,
+                    slug = excluded.slug,
+                    sent_date = COALESCE(excluded.sent_date, posts.sent_date),
+                    updated_at = excluded.updated_at,
+                    markdown = COALESCE(excluded.markdown, posts.markdown),
+                    html = COALESCE(excluded.html, posts.html),
+                    markdown_size = CASE WHEN excluded.markdown IS NULL
+                                         THEN posts.markdown_size ELSE excluded.markdown_size END,
+                    html_size = CASE WHEN excluded.html IS NULL
+                                     THEN posts.html_size ELSE excluded.html_size END,
+                    meta = COALESCE(excluded.meta, posts.meta)
+                """,
+                (
+                    key, campaign_id, title, slug, sent_date, datetime.now().isoformat(),
+                    markdown_blob, html_blob,
+                    len(markdown) if markdown is not None else 0,
+                    len(html) if html is not None else 0,
+                    json.dumps(meta) if meta is not None else None,
+                ),
+            )
+            self._conn.commit()
+        return key
+
+    def get(self, key):
+        """
+        Legge una campagna per ID o slug.
+
+        Returns:
+            dict: Metadati più 'markdown' e 'html' decompressi, o None se assente.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT key, campaign_id, title, slug, sent_date, updated_at, markdown, html, meta "
+                "FROM posts WHERE key = ?",
+                (str(key),),
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "key": row[0],
+            "campaign_id": row[1],
+            "title": row[2],
+            "slug": row[3],
+            "sent_date": row[4],
+            "updated_at": row[5],
+            "markdown": _unpack(row[6]),
+            "html": _unpack(row[7]),
+            "meta": json.loads(row[8]) if row[8] else {},
+        }
+
+    def entries(self):
+        """Elenca i metadati delle campagne archiviate, senza leggere i contenuti."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, campaign_id, title, slug, sent_date, updated_at, markdown_size, html_size "
+                "FROM posts ORDER BY sent_date DESC, key"
+            ).fetchall()
+        columns = ("key", "campaign_id", "title", "slug", "sent_date", "updated_at", "markdown_size", "html_size")
+        return [dict(zip(columns, row)) for row in rows]
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM posts WHERE key = ?", (str(key),)).fetchone() is not None
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM posts").fetchone()[0]
+
+    def stats(self):
+        """Numero di campagne, dimensione dei contenuti originali e del file su disco."""
+        with self._lock:
+            count, markdown_size, html_size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(markdown_size), 0), COALESCE(SUM(html_size), 0) FROM posts"
+            ).fetchone()
+        return {
+            "posts": count,
+            "markdown_bytes": markdown_size,
+            "html_bytes": html_size,
+            "file_bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+        }
+
+    def _iter_files(self, formats):
+        """Genera (nome file, contenuto) una campagna alla volta, senza caricarle tutte."""
+        # Cursore separato: le righe vengono lette man mano dal file mappato
+        conn = sqlite3.connect(self.path)
+        conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+        cursor = conn.execute("SELECT key, slug, markdown, html FROM posts ORDER BY key")
+        try:
+            for key, slug, markdown, html in cursor:
+                name = f"{key}-{slug}" if key != slug else slug
+                if "md" in formats and markdown is not None:
+                    yield f"{name}.md", _unpack(markdown)
+                if "html" in formats and html is not None:
+                    yield f"{name}.html", _unpack(html)
+        finally:
+            conn.close()
+
+    def export(self, destination, formats=("md", "html")):
+        """
+        Esporta l'archivio in una directory o, se `destination` termina in .zip, in uno zip.
+
+        Returns:
+            int: Il numero di file scritti.
+        """
+        written = 0
+        if destination.endswith(".zip"):
+            with zipfile.ZipFile(destination, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+                for name, content in self._iter_files(formats):
+                    zf.writestr(name, content)
+                    written += 1
+        else:
+            os.makedirs(destination, exist_ok=True)
+            for name, content in self._iter_files(formats):
+                with open(os.path.join(destination, name), "w", encoding="utf-8") as f:
+                    f.write(content)
+                written += 1
+        logger.info(f"Esportati {written} file dall'archivio in {destination}")
+        return written
+
+    def import_dir(self, directory):
+        """
+        Importa i vecchi file sciolti di converted/ (`<id>.md` e `<slug>.html`).
+
+        Returns:
+            int: Il numero di file importati.
+        """
+        imported = 0
+        for name in sorted(os.listdir(directory)):
+            stem, ext = os.path.splitext(name)
+            if ext not in (".md", ".html"):
+                continue
+            with open(os.path.join(directory, name), "r", encoding="utf-8") as f:
+                content = f.read()
+            campaign_id = int(stem) if stem.isdigit() else None
+            title = stem.replace("-", " ")
+            existing = self.get(campaign_id if campaign_id is not None else slugify(title))
+            if existing:
+                title = existing["title"]
+            if ext == ".md":
+                self.put(title, markdown=content, campaign_id=campaign_id)
+            else:
+                self.put(title, html=content, campaign_id=campaign_id)
+            imported += 1
+        logger.info(f"Importati {imported} file da {directory} in {self.path}")
+        return imported
+
+
+_archives = {}
+_archives_lock = threading.Lock()
+
+
+def get_archive(path=ARCHIVE_FILE):
+    """Restituisce l'archivio condiviso per `path`, aprendolo alla prima richiesta."""
+    with _archives_lock:
+        if path not in _archives:
+            _archives[path] = Archive(path)
+        return _archives[path]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gestione dell'archivio delle newsletter convertite")
+    parser.add_argument("--archive", default=ARCHIVE_FILE, help="File dell'archivio")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("stats", help="Mostra il contenuto dell'archivio")
+    export_parser = subparsers.add_parser("export", help="Esporta in una directory o in un file .zip")
+    export_parser.add_argument("destination")
+    export_parser.add_argument("--format", choices=["md", "html", "all"], default="all")
+    import_parser = subparsers.add_parser("import", help="Importa i file sciolti di una directory")
+    import_parser.add_argument("directory", nargs="?", default="converted")
+    args = parser.parse_args()
+
+    from app.logging_setup import setup_logging
+    setup_logging()
+
+    archive = Archive(args.archive)
+    if args.command == "stats":
+        stats = archive.stats()
+        original = stats["markdown_bytes"] + stats["html_bytes"]
+        print(f"{stats['posts']} campagne, {original / 1e6:.1f} MB di contenuti "
+              f"in {stats['file_bytes'] / 1e6:.1f} MB su disco")
+    elif args.command == "export":
+        formats = ("md", "html") if args.format == "all" else (args.format,)
+        archive.export(args.destination, formats)
+    elif args.command == "import":
+        archive.import_dir(args.directory)
+    archive.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+import os
+import logging
+
+from app import resilience
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASE_URL = "https://api.brevo.com/v3"
+# Numero massimo di campagne per pagina accettato dall'API Brevo
+PAGE_SIZE = 100
+# Timeout (connessione, lettura) delle richieste, in secondi
+TIMEOUT = (10, 60)
+
+
+def get_base_url():
+    """Restituisce l'URL base dell'API Brevo (configurabile con BREVO_API_BASE_URL)."""
+    return (os.getenv("BREVO_API_BASE_URL") or DEFAULT_BASE_URL).rstrip("/")
+
+
+def _headers(api_key):
+    return {
+        "accept": "application/json",
+        "api-key": api_key
+    }
+
+
+def _get_json(url, api_key, params=None):
+    """GET con verifica dello stato HTTP; gli errori vengono classificati da app.resilience."""
+    import requests
+
+    response = requests.get(url, headers=_headers(api_key), params=params, timeout=TIMEOUT)
+    response.raise_for_status()
+    return response.json()
+
+
+def get_campaigns(api_key, status="sent", page_size=PAGE_SIZE, base_url=None):
+    """
+    Ottiene tutte le campagne email da Brevo, pagina per pagina.
+
+    Args:
+        api_key (str): La API key di Brevo.
+        status (str): Filtra per stato della campagna (None per tutte).
+        page_size (int): Numero di campagne richieste per pagina.
+        base_url (str): URL base dell'API (default: get_base_url()).
+
+    Returns:
+        list: Le campagne, senza il contenuto HTML.
+    """
+    url = f"{base_url or get_base_url()}/emailCampaigns"
+    params = {"limit": page_size, "offset": 0, "excludeHtmlContent": "true"}
+    if status:
+        params["status"] = status
+
+    campaigns = []
+    while True:
+        data = resilience.call("brevo.campaigns", _get_json, url, api_key, dict(params))
+        page = data.get("campaigns") or []
+        campaigns.extend(page)
+
+        total = data.get("count", 0)
+        params["offset"] += len(page)
+        if not page or params["offset"] >= total:
+            break
+
+    logger.info(f"Ottenute {len(campaigns)} campagne da Brevo")
+    return campaigns
+
+
+def get_campaign(api_key, campaign_id, base_url=None):
+    """
+    Ottiene i dettagli (incluso htmlContent) di una campagna.
+
+    Args:
+        api_key (str): La API key di Brevo.
+        campaign_id: ID della campagna.
+        base_url (str): URL base dell'API (default: get_base_url()).
+
+    Returns:
+        dict: I dettagli della campagna.
+    """
+    url = f"{base_url or get_base_url()}/emailCampaigns/{campaign_id}"
+    return resilience.call("brevo.campaign", _get_json, url, api_key)
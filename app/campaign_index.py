@@ -0,0 +1,95 @@
+import os
+import json
+import logging
+
+from app.models import Campaign
+
+logger = logging.getLogger(__name__)
+
+
+def load_exported_keys(ledger_file="exported_posts.json"):
+    """
+    Legge exported_posts.json una sola volta e restituisce le chiavi di confronto.
+
+    Il file contiene sia voci scritte da batch_migrate (con 'id') sia voci
+    scritte dalla pagina Migrazione (con 'title' e 'date').
+
+    Returns:
+        tuple: (insieme degli ID, insieme delle coppie (titolo, data)).
+    """
+    ids, title_dates = set(), set()
+    if not os.path.exists(ledger_file):
+        return ids, title_dates
+    try:
+        with open(ledger_file, "r") as f:
+            exported_posts = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        logger.error(f"Errore nella lettura dei post esportati: {e}")
+        return ids, title_dates
+
+    for post in exported_posts:
+        if not isinstance(post, dict):
+            continue
+        if post.get("id") is not None:
+            # Le vecchie esportazioni dalla pagina Migrazione salvavano l'ID come stringa
+            ids.add(int(post["id"]) if str(post["id"]).isdigit() else post["id"])
+        if post.get("title") is not None:
+            title_dates.add((post["title"], post.get("date")))
+    return ids, title_dates
+
+
+def build_index(campaigns, exported_keys):
+    """
+    Normalizza le campagne mostrate nella tabella.
+
+    Args:
+        campaigns (list): Le campagne restituite da Brevo.
+        exported_keys (tuple): Il risultato di load_exported_keys().
+
+    Returns:
+        list: Una Campaign per campagna, ordinate dalla più recente.
+    """
+    index = [Campaign.from_brevo(c, exported_keys) for c in campaigns]
+    # Le campagne senza data vanno in fondo
+    index.sort(key=lambda campaign: campaign.sort_key, reverse=True)
+    return index
+
+
+def filter_index(index, name=None, start_ts=None, end_ts=None, exported=None):
+    """
+    Filtra l'indice delle campagne.
+
+    Args:
+        index (list): Campagne prodotte da build_index().
+        name (str): Sottostringa da cercare nel nome (senza distinzione di maiuscole).
+        start_ts (float): Timestamp minimo di invio (incluso).
+        end_ts (float): Timestamp massimo di invio (escluso).
+        exported (bool): True solo esportate, False solo da esportare, None tutte.
+
+    Returns:
+        list: Le campagne che soddisfano tutti i filtri, nello stesso ordine.
+    """
+    needle = name.strip().lower() if name else ""
+    rows = index
+    if needle:
+        rows = [row for row in rows if needle in row.name_lower]
+    if start_ts is not None:
+        rows = [row for row in rows if row.sent_ts is not None and row.sent_ts >= start_ts]
+    if end_ts is not None:
+        rows = [row for row in rows if row.sent_ts is not None and row.sent_ts < end_ts]
+    if exported is not None:
+        rows = [row for row in rows if row.exported == exported]
+    return rows
+
+
+def paginate(rows, page, page_size):
+    """
+    Restituisce solo le righe della pagina richiesta (la prima pagina è 1).
+
+    Returns:
+        tuple: (righe della pagina, numero totale di pagine).
+    """
+    total_pages = max(1, -(-len(rows) // page_size))
+    page = min(max(1, page), total_pages)
+    start = (page - 1) * page_size
+    return rows[start:start + page_size], total_pages
@@ -0,0 +1,118 @@
+import os
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+
+from app import brevo
+from app.archive import get_archive
+from app.history import record_attempt
+from app.links import get_resolver
+from app.logging_setup import log_context
+from app.utils import process_html_content, convert_html_to_markdown
+
+logger = logging.getLogger(__name__)
+
+EXPORTED_POSTS_FILE = "exported_posts.json"
+
+# Serializza gli aggiornamenti di exported_posts.json tra i job in background
+_ledger_lock = threading.Lock()
+
+
+def save_export(title, content, date, campaign_id=None, markdown=None, uploaded=False):
+    """
+    Registra una campagna in exported_posts.json e ne salva i contenuti nell'archivio.
+
+    Args:
+        title (str): Titolo del post.
+        content (str): HTML processato.
+        date (str): sentDate della campagna.
+        campaign_id: ID Brevo della campagna (opzionale); registrato come intero, come fa il batch.
+        markdown (str): Markdown del post, se già convertito (opzionale).
+        uploaded (bool): True se il post è stato caricato su Substack; le voci
+            solo convertite non vengono saltate dal batch.
+
+    Returns:
+        str: La chiave della campagna nell'archivio.
+    """
+    with _ledger_lock:
+        # Carica i post già esportati
+        exported_posts = []
+        if os.path.exists(EXPORTED_POSTS_FILE):
+            with open(EXPORTED_POSTS_FILE, "r") as f:
+                try:
+                    exported_posts = json.load(f)
+                except json.JSONDecodeError:
+                    logger.warning("File exported_posts.json non valido, verrà creato nuovo")
+
+        # Aggiungi il nuovo post
+        entry = {
+            "title": title,
+            "date": date,
+            "exported_at": datetime.now().isoformat()
+        }
+        if campaign_id is not None:
+            entry["id"] = int(campaign_id)
+        if uploaded:
+            entry["uploaded"] = True
+        exported_posts.append(entry)
+
+        # Salva il file aggiornato
+        with open(EXPORTED_POSTS_FILE, "w") as f:
+            json.dump(exported_posts, f, indent=2)
+
+    # Salva anche i contenuti nell'archivio compatto
+    return get_archive().put(title, markdown=markdown, html=content, campaign_id=campaign_id, sent_date=date)
+
+
+def export_campaign(api_key, campaign_id, upload=False):
+    """
+    Scarica, processa ed esporta una campagna; pensata per girare fuori dal thread UI.
+
+    Args:
+        api_key (str): La API key di Brevo.
+        campaign_id: ID della campagna.
+        upload (bool): Se vero, carica anche il post su Substack come bozza.
+
+    Returns:
+        str: Il titolo della campagna esportata.
+
+    Raises:
+        Exception: Se il download, la conversione o l'upload falliscono.
+    """
+    # Gli ID arrivano anche come stringhe dai widget: storico e registro usano interi
+    campaign_id = int(campaign_id)
+    with log_context(campaign_id=campaign_id):
+        subject = None
+        upload_seconds = None
+        try:
+            campaign_details = brevo.get_campaign(api_key, campaign_id)
+            subject = campaign_details.get("subject", "")
+            html_content = campaign_details.get("htmlContent", "")
+            if not html_content:
+                raise ValueError(f"Nessun contenuto HTML per la campagna {campaign_id}")
+
+            # I link di tracciamento di Brevo smettono di funzionare con la chiusura dell'account
+            processed_html = get_resolver().unwrap(process_html_content(html_content))
+            markdown_content = convert_html_to_markdown(processed_html)
+
+            if upload:
+                # Import locale: Selenium serve solo quando si carica davvero su Substack
+                from app.substack_bot import publish_post_to_substack
+                upload_start = time.perf_counter()
+                published = publish_post_to_substack(subject, markdown_content)
+                upload_seconds = time.perf_counter() - upload_start
+                if not published:
+                    raise RuntimeError(f"Upload su Substack fallito per '{subject}'")
+
+            save_export(subject, processed_html, campaign_details.get("sentDate", ""), campaign_id,
+                        markdown=markdown_content, uploaded=upload)
+        except Exception as e:
+            record_attempt(campaign_id, subject, False, e, upload_seconds)
+            raise
+
+        record_attempt(campaign_id, subject, True, upload_seconds=upload_seconds,
+                       text=markdown_content if upload else None)
+        logger.info(f"Campagna {campaign_id} esportata: {subject}")
+        return subject
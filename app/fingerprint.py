@@ -0,0 +1,231 @@
+"""
+Impronte SimHash per riconoscere newsletter quasi identiche.
+
+Reinvii, varianti A/B e copie per lista diverse hanno lo stesso corpo a meno
+di pochi dettagli (saluto, link di disiscrizione, data). L'impronta viene
+calcolata sul testo dell'HTML già pulito, senza tag né URL: due campagne con
+impronte a distanza di Hamming <= MAX_DISTANCE sono considerate duplicati.
+
+L'indice persistente (`fingerprints.db`) conserva l'impronta di ogni campagna
+migrata; la ricerca usa la suddivisione in bande (pigeonhole) per non
+confrontare l'impronta con tutte quelle salvate.
+
+Le campagne con troppo poco testo (ad esempio solo immagini) non hanno
+un'impronta: sarebbero tutte "uguali" tra loro, quindi non vengono né
+confrontate né salvate.
+"""
+import re
+import sqlite3
+import hashlib
+import logging
+import threading
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+FINGERPRINT_FILE = "fingerprints.db"
+
+BITS = 64
+SHINGLE_SIZE = 3
+# Con 64 bit e 8 bande da 8, due impronte a distanza <= 7 hanno almeno una banda identica
+BANDS = 8
+MAX_DISTANCE = 6
+# Sotto questa soglia di parole l'impronta non distingue campagne diverse
+MIN_WORDS = 10
+
+_IMG_RE = re.compile(r"<img\b[^>]*>", re.IGNORECASE)
+_IMG_ATTR_RE = re.compile(r"""\b(alt|src)\s*=\s*(["'])(.*?)\2""", re.IGNORECASE | re.DOTALL)
+_TAG_RE = re.compile(r"<[^>]+>")
+_URL_RE = re.compile(r"https?://\S+")
+_WORD_RE = re.compile(r"\w+")
+
+_BAND_COLUMNS = [f"band{i}" for i in range(BANDS)]
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS fingerprints (
+    campaign_id INTEGER PRIMARY KEY,
+    title TEXT,
+    simhash INTEGER NOT NULL,
+    {", ".join(f"{column} INTEGER NOT NULL" for column in _BAND_COLUMNS)},
+    duplicate_of INTEGER,
+    added_at TEXT NOT NULL
+);
+""" + "".join(
+    f"CREATE INDEX IF NOT EXISTS fingerprints_{column} ON fingerprints ({column});\n" for column in _BAND_COLUMNS
+)
+
+
+def _image_text(match):
+    # Testo alternativo e nome del file: distinguono le campagne fatte solo di immagini
+    parts = []
+    for name, _, value in _IMG_ATTR_RE.findall(match.group(0)):
+        if name.lower() == "src":
+            value = value.split("?", 1)[0].rstrip("/").rsplit("/", 1)[-1]
+        parts.append(value)
+    return " " + " ".join(parts) + " "
+
+
+def normalize_text(html):
+    """Parole del testo visibile (più alt e nome file delle immagini), in minuscolo, senza tag, URL e numeri."""
+    text = _URL_RE.sub(" ", _TAG_RE.sub(" ", _IMG_RE.sub(_image_text, html or "")))
+    return [word for word in _WORD_RE.findall(text.lower()) if not word.isdigit()]
+
+
+def simhash(words, bits=BITS):
+    """
+    SimHash a `bits` bit sulle sequenze di SHINGLE_SIZE parole consecutive.
+
+    Usa blake2b invece di hash() perché l'impronta deve restare uguale tra
+    un'esecuzione e l'altra.
+    """
+    if len(words) < SHINGLE_SIZE:
+        shingles = [" ".join(words)] if words else []
+    else:
+        shingles = [" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)]
+
+    if not shingles:
+        return 0
+    # Ogni hash come stringa di bit: zip(*...) conta gli 1 colonna per colonna in C
+    binary = [
+        format(int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=bits // 8).digest(), "big"), f"0{bits}b")
+        for s in shingles
+    ]
+    half = len(binary) / 2
+    value = 0
+    for column in zip(*binary):
+        value = (value << 1) | (column.count("1") > half)
+    return value
+
+
+def fingerprint(html):
+    """Impronta SimHash del testo di un HTML pulito, o None se ha meno di MIN_WORDS parole."""
+    words = normalize_text(html)
+    if len(words) < MIN_WORDS:
+        return None
+    return simhash(words)
+
+
+def text_digest(words):
+    """Hash del testo normalizzato: uguale solo se le parole sono identiche."""
+    return hashlib.blake2b(" ".join(words).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def distance(a, b):
+    """Distanza di Hamming tra due impronte."""
+    return bin(a ^ b).count("1")
+
+
+def _bands(value):
+    width = BITS // BANDS
+    return [(value >> (i * width)) & ((1 << width) - 1) for i in range(BANDS)]
+
+
+def _to_signed(value):
+    # SQLite memorizza interi a 64 bit con segno
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _to_unsigned(value):
+    return value + (1 << 64) if value < 0 else value
+
+
+class FingerprintIndex:
+    """
+    Indice delle impronte delle campagne migrate.
+
+    Con path=":memory:" l'indice vive solo per l'esecuzione corrente (dry-run
+    e replay non devono influenzare i run reali).
+    """
+
+    def __init__(self, path=FINGERPRINT_FILE, max_distance=MAX_DISTANCE):
+        self.path = path
+        self.max_distance = max_distance
+        self.skipped = []
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+        # Impronte vuote salvate dalle versioni precedenti: facevano risultare duplicate
+        # tutte le campagne senza testo
+        self._conn.execute("DELETE FROM fingerprints WHERE simhash = 0")
+        self._conn.commit()
+
+    def find_duplicate(self, value):
+        """
+        Cerca una campagna già indicizzata con impronta vicina a `value`.
+
+        Returns:
+            tuple: (campaign_id, distanza) della più vicina, o None.
+        """
+        if value is None:
+            return None
+        bands = _bands(value)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT campaign_id, simhash, duplicate_of FROM fingerprints WHERE "
+                + " OR ".join(f"{column} = ?" for column in _BAND_COLUMNS),
+                bands,
+            ).fetchall()
+        best = None
+        for campaign_id, stored, duplicate_of in rows:
+            d = distance(value, _to_unsigned(stored))
+            if d <= self.max_distance and (best is None or d < best[1]):
+                # Si rimanda sempre all'originale, non a un altro duplicato
+                best = (duplicate_of or campaign_id, d)
+        return best
+
+    def add(self, campaign_id, title, value, duplicate_of=None):
+        """Registra l'impronta di una campagna (migrata o riconosciuta come duplicato); None viene ignorato."""
+        if value is None:
+            return
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO fingerprints VALUES ({', '.join('?' * (BANDS + 5))})",
+                [campaign_id, title, _to_signed(value), *_bands(value), duplicate_of, datetime.now().isoformat()],
+            )
+            self._conn.commit()
+
+    def check(self, campaign_id, title, html):
+        """
+        Calcola l'impronta di una campagna e la confronta con l'indice.
+
+        Returns:
+            tuple: (impronta o None se il testo è troppo corto, ID della campagna originale o None).
+        """
+        value = fingerprint(html)
+        return value, self.check_value(campaign_id, title, value)
+
+    def check_value(self, campaign_id, title, value):
+        """
+        Confronta un'impronta già calcolata con l'indice.
+
+        Se è un duplicato lo registra subito (così i run successivi lo escludono
+        senza scaricarlo) e lo conta tra quelli saltati.
+
+        Returns:
+            L'ID della campagna originale, o None.
+        """
+        match = self.find_duplicate(value)
+        if match is None:
+            return None
+        original_id, d = match
+        if original_id == campaign_id:
+            return None
+        self.add(campaign_id, title, value, duplicate_of=original_id)
+        with self._lock:
+            self.skipped.append((campaign_id, title, original_id))
+        logger.info(f"'{title}' (ID: {campaign_id}) è un duplicato della campagna {original_id} (distanza {d})")
+        return original_id
+
+    def value(self, campaign_id):
+        """Impronta registrata per una campagna, o None se assente."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT simhash FROM fingerprints WHERE campaign_id = ?", (campaign_id,)
+            ).fetchone()
+        return _to_unsigned(row[0]) if row else None
+
+    def duplicate_ids(self):
+        """ID delle campagne già riconosciute come duplicati."""
+        with self._lock:
+            rows = self._conn.execute("SELECT campaign_id FROM fingerprints WHERE duplicate_of IS NOT NULL").fetchall()
+        return {row[0] for row in rows}
@@ -0,0 +1,294 @@
+"""
+Storico delle esportazioni, interrogabile senza rileggere exported_posts.json.
+
+exported_posts.json resta la fonte dei post esportati: qui ne viene tenuta
+una copia indicizzata in SQLite (`history.db`), aggiornata solo quando il
+file cambia. Accanto alle esportazioni vengono registrati i tentativi di
+upload, riusciti o falliti, con la loro durata.
+"""
+import os
+import json
+import sqlite3
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from app.fingerprint import normalize_text, text_digest
+
+logger = logging.getLogger(__name__)
+
+HISTORY_FILE = "history.db"
+EXPORTED_POSTS_FILE = "exported_posts.json"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS exports (
+    position INTEGER PRIMARY KEY,
+    campaign_id INTEGER,
+    title TEXT,
+    sent_date TEXT,
+    exported_at TEXT,
+    exported_day TEXT
+);
+CREATE INDEX IF NOT EXISTS exports_exported_at ON exports (exported_at);
+CREATE INDEX IF NOT EXISTS exports_exported_day ON exports (exported_day);
+CREATE INDEX IF NOT EXISTS exports_campaign_id ON exports (campaign_id);
+CREATE TABLE IF NOT EXISTS attempts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    campaign_id INTEGER,
+    title TEXT,
+    attempted_at TEXT NOT NULL,
+    success INTEGER NOT NULL,
+    error TEXT,
+    upload_seconds REAL,
+    text_hash TEXT,
+    word_count INTEGER
+);
+CREATE INDEX IF NOT EXISTS attempts_attempted_at ON attempts (attempted_at);
+CREATE TABLE IF NOT EXISTS ledger_state (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    mtime REAL,
+    size INTEGER
+);
+"""
+
+EXPORT_COLUMNS = ("campaign_id", "title", "sent_date", "exported_at")
+# Colonne aggiunte dopo la prima versione dello schema
+_ATTEMPT_COLUMNS = {"text_hash": "TEXT", "word_count": "INTEGER"}
+
+
+def _ledger_row(position, post):
+    """Normalizza una voce di exported_posts.json (scritta dal batch o dalla pagina Migrazione)."""
+    if not isinstance(post, dict):
+        # Le versioni più vecchie salvavano solo l'ID della campagna
+        post = {"id": post}
+    exported_at = post.get("exported_at") or post.get("exported_date") or ""
+    campaign_id = post.get("id")
+    try:
+        campaign_id = int(campaign_id) if campaign_id is not None else None
+    except (TypeError, ValueError):
+        campaign_id = None
+    return (position, campaign_id, post.get("title"), post.get("date"), exported_at, exported_at[:10] or None)
+
+
+class History:
+    """Copia indicizzata di exported_posts.json più il registro dei tentativi di upload."""
+
+    def __init__(self, path=HISTORY_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(attempts)")}
+        for column, kind in _ATTEMPT_COLUMNS.items():
+            if column not in existing:
+                self._conn.execute(f"ALTER TABLE attempts ADD COLUMN {column} {kind}")
+        self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def sync_ledger(self, ledger_file=EXPORTED_POSTS_FILE):
+        """
+        Allinea la tabella delle esportazioni a exported_posts.json.
+
+        Se il file non è cambiato dall'ultima lettura non viene nemmeno aperto;
+        altrimenti vengono inserite solo le voci nuove (il file cresce in coda).
+        Se l'ultima voce già nota non è più nella stessa posizione il file è
+        stato riscritto (ad esempio da `app.reconcile --requeue`) e la tabella
+        viene ricostruita da capo.
+
+        Returns:
+            int: Il numero di voci aggiunte.
+        """
+        if not os.path.exists(ledger_file):
+            return 0
+        stat = os.stat(ledger_file)
+        with self._lock:
+            state = self._conn.execute("SELECT mtime, size FROM ledger_state WHERE id = 1").fetchone()
+            if state == (stat.st_mtime, stat.st_size):
+                return 0
+
+            try:
+                with open(ledger_file, "r") as f:
+                    exported_posts = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                logger.error(f"Errore nella lettura dei post esportati: {e}")
+                return 0
+
+            known = self._conn.execute("SELECT COUNT(*) FROM exports").fetchone()[0]
+            last = self._conn.execute(
+                "SELECT * FROM exports WHERE position = ?", (known - 1,)
+            ).fetchone() if known else None
+            if len(exported_posts) < known or (last and tuple(last) != _ledger_row(known - 1, exported_posts[known - 1])):
+                # Il file è stato riscritto o ripulito: si ricostruisce da capo
+                self._conn.execute("DELETE FROM exports")
+                known = 0
+            rows = [_ledger_row(i, post) for i, post in enumerate(exported_posts[known:], start=known)]
+            self._conn.executemany("INSERT INTO exports VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ledger_state (id, mtime, size) VALUES (1, ?, ?)",
+                (stat.st_mtime, stat.st_size),
+            )
+            self._conn.commit()
+        if rows:
+            logger.info(f"Storico aggiornato con {len(rows)} esportazioni")
+        return len(rows)
+
+    def record_attempt(self, campaign_id, title, success, error=None, upload_seconds=None, text=None):
+        """
+        Registra un tentativo di esportazione o upload, riuscito o fallito.
+
+        Di `text` (il Markdown caricato) vengono salvati solo hash e numero di
+        parole: `app.reconcile` li confronta con le bozze senza dipendere
+        dall'archivio, che dry-run e replay possono riscrivere.
+        """
+        text_hash = word_count = None
+        if text is not None:
+            words = normalize_text(text)
+            text_hash, word_count = text_digest(words), len(words)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO attempts (campaign_id, title, attempted_at, success, error, upload_seconds, "
+                "text_hash, word_count) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (campaign_id, title, datetime.now().isoformat(), int(bool(success)),
+                 str(error) if error else None, upload_seconds, text_hash, word_count),
+            )
+            self._conn.commit()
+
+    def _where(self, search=None, start_day=None, end_day=None):
+        clauses, params = [], []
+        search = (search or "").strip()
+        if search:
+            if search.isdigit():
+                clauses.append("(campaign_id = ? OR title LIKE ?)")
+                params += [int(search), f"%{search}%"]
+            else:
+                clauses.append("title LIKE ?")
+                params.append(f"%{search}%")
+        if start_day:
+            clauses.append("exported_day >= ?")
+            params.append(str(start_day))
+        if end_day:
+            clauses.append("exported_day <= ?")
+            params.append(str(end_day))
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def count(self, search=None, start_day=None, end_day=None):
+        """Numero di esportazioni che soddisfano i filtri (vedi query)."""
+        where, params = self._where(search, start_day, end_day)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM exports{where}", params).fetchone()[0]
+
+    def query(self, search=None, start_day=None, end_day=None, page=1, page_size=50):
+        """
+        Legge una pagina dello storico, dalla esportazione più recente.
+
+        Args:
+            search (str): Parte del titolo o ID della campagna.
+            start_day (date): Primo giorno di esportazione (incluso).
+            end_day (date): Ultimo giorno di esportazione (incluso).
+            page (int): Pagina richiesta (la prima è 1).
+            page_size (int): Righe per pagina.
+
+        Returns:
+            list: Le righe della pagina richiesta.
+        """
+        where, params = self._where(search, start_day, end_day)
+        offset = (max(1, page) - 1) * page_size
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(EXPORT_COLUMNS)} FROM exports{where} "
+                "ORDER BY exported_at DESC, position DESC LIMIT ? OFFSET ?",
+                params + [page_size, offset],
+            ).fetchall()
+        return [dict(zip(EXPORT_COLUMNS, row)) for row in rows]
+
+    def stats(self, days=30):
+        """
+        Statistiche aggregate dello storico.
+
+        Returns:
+            dict: Totale esportazioni, esportazioni al giorno negli ultimi `days`
+            giorni, tentativi, fallimenti, tasso di fallimento e durata media
+            degli upload riusciti (in secondi, None se non ce ne sono).
+        """
+        since = (datetime.now() - timedelta(days=days)).date().isoformat()
+        with self._lock:
+            total = self._conn.execute("SELECT COUNT(*) FROM exports").fetchone()[0]
+            per_day = self._conn.execute(
+                "SELECT exported_day, COUNT(*) FROM exports WHERE exported_day >= ? "
+                "GROUP BY exported_day ORDER BY exported_day",
+                (since,),
+            ).fetchall()
+            attempts, failures, avg_upload = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(1 - success), 0), "
+                "AVG(CASE WHEN success THEN upload_seconds END) FROM attempts"
+            ).fetchone()
+        return {
+            "total_exports": total,
+            "exports_per_day": dict(per_day),
+            "attempts": attempts,
+            "failures": failures,
+            "failure_rate": failures / attempts if attempts else 0.0,
+            "avg_upload_seconds": avg_upload,
+        }
+
+    def uploaded_ids(self):
+        """ID delle campagne con almeno un upload su Substack riuscito."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT DISTINCT campaign_id FROM attempts WHERE success = 1 AND upload_seconds IS NOT NULL"
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def uploaded_texts(self):
+        """
+        Hash e numero di parole dell'ultimo testo caricato per ogni campagna.
+
+        Returns:
+            dict: campaign_id -> (text_hash, word_count), solo per gli upload
+            registrati con il testo.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT campaign_id, text_hash, word_count FROM attempts "
+                "WHERE success = 1 AND upload_seconds IS NOT NULL AND text_hash IS NOT NULL ORDER BY id"
+            ).fetchall()
+        return {campaign_id: (text_hash, word_count) for campaign_id, text_hash, word_count in rows}
+
+    def recent_failures(self, limit=20):
+        """Gli ultimi tentativi falliti, dal più recente."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT campaign_id, title, attempted_at, error FROM attempts "
+                "WHERE success = 0 ORDER BY id DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [dict(zip(("campaign_id", "title", "attempted_at", "error"), row)) for row in rows]
+
+
+_histories = {}
+_histories_lock = threading.Lock()
+
+
+def get_history(path=HISTORY_FILE):
+    """Restituisce lo storico condiviso per `path`, aprendolo alla prima richiesta."""
+    with _histories_lock:
+        if path not in _histories:
+            _histories[path] = History(path)
+        return _histories[path]
+
+
+def record_attempt(campaign_id, title, success, error=None, upload_seconds=None, text=None):
+    """
+    Registra un tentativo nello storico predefinito.
+
+    Un errore nello storico non deve mai interrompere una migrazione: viene
+    solo segnalato nei log.
+    """
+    try:
+        get_history().record_attempt(campaign_id, title, success, error, upload_seconds, text)
+    except sqlite3.Error as e:
+        logger.warning(f"Impossibile registrare il tentativo per la campagna {campaign_id}: {e}")
@@ -0,0 +1,106 @@
+import uuid
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    """Stato di un job in background, letto dalla UI a ogni rerun."""
+
+    def __init__(self, label, items):
+        self.id = uuid.uuid4().hex[:8]
+        self.label = label
+        self.items = list(items)
+        self.total = len(self.items)
+        self.done = 0
+        self.failed = 0
+        self.status = "in coda"
+        self.errors = []
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancelled = False
+
+    @property
+    def progress(self):
+        return (self.done + self.failed) / self.total if self.total else 1.0
+
+    @property
+    def running(self):
+        return self.status in ("in coda", "in corso")
+
+    def cancel(self):
+        """Chiede l'interruzione del job dopo l'elemento in corso."""
+        self.cancelled = True
+
+
+class JobManager:
+    """
+    Esegue job di esportazione su un pool di thread separato dallo script Streamlit.
+
+    Ogni job elabora i suoi elementi in sequenza; job diversi girano in parallelo
+    fino a `max_workers`.
+    """
+
+    def __init__(self, max_workers=2):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="export-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, label, items, worker, setup=None):
+        """
+        Accoda un job che chiama `worker(item)` per ogni elemento.
+
+        `setup`, se presente, viene eseguito una volta nel thread del job prima
+        degli elementi (ad esempio la verifica della sessione Substack): se
+        fallisce, il job termina senza elaborarli.
+
+        Returns:
+            Job: Il job creato.
+        """
+        job = Job(label, items)
+        with self._lock:
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, worker, setup)
+        logger.info(f"Job {job.id} accodato: {label} ({job.total} elementi)")
+        return job
+
+    def _run(self, job, worker, setup=None):
+        job.status = "in corso"
+        job.started_at = time.time()
+        if setup is not None:
+            try:
+                setup()
+            except Exception as e:
+                job.status = "fallito"
+                job.errors.append(str(e))
+                job.finished_at = time.time()
+                logger.error(f"Job {job.id} non avviato: {e}")
+                return
+        for item in job.items:
+            if job.cancelled:
+                job.status = "annullato"
+                break
+            try:
+                worker(item)
+                job.done += 1
+            except Exception as e:
+                job.failed += 1
+                job.errors.append(f"{item}: {e}")
+                logger.error(f"Job {job.id}, elemento {item} fallito: {e}")
+        else:
+            job.status = "completato" if not job.failed else "completato con errori"
+        job.finished_at = time.time()
+        logger.info(f"Job {job.id} terminato: {job.done} riusciti, {job.failed} falliti")
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def jobs(self, job_ids=None):
+        """Restituisce i job (opzionalmente solo quelli indicati), dal più recente."""
+        with self._lock:
+            jobs = [j for j in self._jobs.values() if job_ids is None or j.id in job_ids]
+        return sorted(jobs, key=lambda j: j.created_at, reverse=True)
@@ -0,0 +1,261 @@
+"""
+Sostituzione dei link di click-tracking di Brevo con le destinazioni reali.
+
+Le newsletter esportate da Brevo puntano a redirect di tracciamento
+(`https://xxxx.r.bh.d.sendibt3.com/tr/cl/...`): una volta chiuso l'account
+smettono di funzionare e, finché funzionano, registrano i clic dei lettori
+di Substack. Ogni link viene risolto con una richiesta HEAD senza seguire i
+redirect (basta leggere l'header Location); le richieste di un batch partono
+insieme, limitate da un semaforo.
+
+Le risoluzioni restano in `cache/links.json`: i link ripetuti in ogni
+newsletter (social, disiscrizione, sito) vengono risolti una volta sola.
+Ogni risoluzione conta come un clic nelle statistiche di Brevo, per questo
+il dry-run usa solo la mappa salvata.
+"""
+import os
+import re
+import json
+import html
+import time
+import logging
+import tempfile
+import threading
+from urllib.parse import urljoin
+
+from app import resilience
+
+logger = logging.getLogger(__name__)
+
+LINKS_FILE = os.path.join("cache", "links.json")
+
+CONCURRENCY = 16
+TIMEOUT = (5, 15)
+# Un redirect di tracciamento può rimandare a un altro prima della destinazione
+MAX_HOPS = 5
+# Dopo quanto (secondi) si riprova un link che non rimandava a nulla
+UNRESOLVABLE_TTL = 7 * 24 * 3600
+
+# Percorsi di click-tracking di Brevo (sendibt3.com, r.sp1-brevo.net, ...)
+_TRACKING_RE = re.compile(r"^https?://[^/\s]+/(?:tr|mk)/cl/", re.IGNORECASE)
+_HREF_RE = re.compile(r"""(href\s*=\s*)(["'])(.*?)\2""", re.IGNORECASE | re.DOTALL)
+
+_local = threading.local()
+
+
+def is_tracking_url(url):
+    """Restituisce True se `url` è un redirect di click-tracking di Brevo."""
+    return bool(url) and _TRACKING_RE.match(url) is not None
+
+
+def find_tracking_links(html_content):
+    """Insieme dei link di tracciamento presenti negli href di un HTML."""
+    links = set()
+    for match in _HREF_RE.finditer(html_content or ""):
+        url = html.unescape(match.group(3)).strip()
+        if is_tracking_url(url):
+            links.add(url)
+    return links
+
+
+def rewrite_links(html_content, resolved):
+    """
+    Sostituisce negli href i link presenti in `resolved` con la loro destinazione.
+
+    I link senza destinazione nota restano invariati.
+    """
+    if not html_content or not resolved:
+        return html_content
+
+    def replace(match):
+        target = resolved.get(html.unescape(match.group(3)).strip())
+        if not target:
+            return match.group(0)
+        return f"{match.group(1)}{match.group(2)}{html.escape(target, quote=True)}{match.group(2)}"
+
+    return _HREF_RE.sub(replace, html_content)
+
+
+def _session():
+    # Una sessione per thread: le connessioni verso lo stesso host vengono riusate
+    if not hasattr(_local, "session"):
+        import requests
+        _local.session = requests.Session()
+    return _local.session
+
+
+def _head(url, timeout):
+    response = _session().head(url, allow_redirects=False, timeout=timeout)
+    if response.status_code == 405:
+        # Alcuni redirect non accettano HEAD: GET senza scaricare il corpo
+        response = _session().get(url, allow_redirects=False, timeout=timeout, stream=True)
+        response.close()
+    if response.status_code >= 400:
+        # 4xx e 5xx non dicono nulla del link: errori (ritentati solo se transitori), mai salvati in mappa
+        response.raise_for_status()
+    return response
+
+
+class LinkResolver:
+    """
+    Mappa persistente link di tracciamento -> destinazione reale.
+
+    I link a cui Brevo risponde senza redirect vengono ricordati come non
+    risolvibili per UNRESOLVABLE_TTL secondi, poi si riprovano. Le risposte
+    di errore (4xx, 5xx) e i problemi di rete non vengono salvati: in questa
+    esecuzione il link resta quello di Brevo, alla successiva si riprova.
+
+    Con offline=True usa solo la mappa salvata, senza richieste di rete
+    (replay e dry-run).
+    """
+
+    def __init__(self, path=LINKS_FILE, concurrency=CONCURRENCY, timeout=TIMEOUT, offline=False):
+        self.path = path
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.offline = offline
+        self.stats = {"cached": 0, "resolved": 0, "unresolvable": 0, "failed": 0}
+        self._lock = threading.Lock()
+        self._map = {}
+        # Link senza redirect -> istante (epoch) dell'ultima verifica
+        self._unresolvable = {}
+        # Link falliti in questa esecuzione: non si richiedono di nuovo fino alla prossima
+        self._failed = set()
+        # Link già contati nelle statistiche di questa esecuzione
+        self._seen = set()
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    data = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                logger.warning(f"Mappa dei link non valida ({path}), verrà ricreata: {e}")
+            else:
+                if "links" in data:
+                    self._map = data["links"]
+                    self._unresolvable = data.get("unresolvable", {})
+                else:
+                    # Formato precedente: None anche per i 4xx, che vengono quindi riprovati
+                    self._map = {url: target for url, target in data.items() if target}
+
+    def __len__(self):
+        with self._lock:
+            return len(self._map) + len(self._unresolvable)
+
+    def resolve_one(self, url):
+        """
+        Segue i redirect di tracciamento di `url` senza scaricare la destinazione.
+
+        Returns:
+            str: La destinazione, o None se il link non rimanda più a nulla.
+
+        Raises:
+            requests.HTTPError: Se Brevo risponde con un errore (4xx, 5xx).
+        """
+        current = url
+        for _ in range(MAX_HOPS):
+            response = resilience.call("brevo.links", _head, current, self.timeout)
+            location = response.headers.get("Location")
+            if not (response.is_redirect and location):
+                # Il link di tracciamento non rimanda più a nulla (scaduto o account chiuso)
+                return None
+            current = urljoin(current, location)
+            if not is_tracking_url(current):
+                return current
+        return None
+
+    async def _resolve_many(self, urls):
+        import asyncio
+        from concurrent.futures import ThreadPoolExecutor
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        # asyncio.to_thread usa l'executor predefinito: lo si dimensiona sul semaforo
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=self.concurrency))
+
+        async def resolve(url):
+            async with semaphore:
+                try:
+                    return url, await asyncio.to_thread(self.resolve_one, url), None
+                except Exception as e:
+                    return url, None, e
+
+        return await asyncio.gather(*(resolve(url) for url in urls))
+
+    def resolve(self, urls):
+        """
+        Risolve un insieme di link, in parallelo quelli non ancora in mappa.
+
+        Returns:
+            dict: link -> destinazione, solo per i link risolti.
+        """
+        urls = set(urls)
+        expired = time.time() - UNRESOLVABLE_TTL
+        with self._lock:
+            known = {url: self._map[url] for url in urls if url in self._map}
+            known.update((url, None) for url in urls if self._unresolvable.get(url, expired) > expired)
+            self.stats["cached"] += len(known.keys() - self._seen)
+            self._seen |= urls
+            missing = sorted(urls - known.keys() - self._failed)
+
+        if missing and not self.offline:
+            # asyncio costa ~20 ms all'avvio: si importa solo quando servono richieste
+            import asyncio
+
+            logger.info(f"Risoluzione di {len(missing)} link di tracciamento ({len(known)} già in mappa)")
+            results = asyncio.run(self._resolve_many(missing))
+            now = time.time()
+            with self._lock:
+                for url, target, error in results:
+                    if error is not None:
+                        self._failed.add(url)
+                        self.stats["failed"] += 1
+                        logger.warning(f"Link non risolto, resta quello di Brevo: {url} ({error})")
+                        continue
+                    known[url] = target
+                    if target:
+                        self._map[url] = target
+                        self._unresolvable.pop(url, None)
+                        self.stats["resolved"] += 1
+                    else:
+                        self._unresolvable[url] = now
+                        self.stats["unresolvable"] += 1
+            self.save()
+
+        return {url: target for url, target in known.items() if target}
+
+    def unwrap(self, html_content):
+        """Risolve e sostituisce i link di tracciamento di un singolo HTML."""
+        return rewrite_links(html_content, self.resolve(find_tracking_links(html_content)))
+
+    def save(self):
+        """Scrive la mappa in modo atomico (file temporaneo e os.replace)."""
+        with self._lock:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(prefix=".links-", suffix=".tmp", dir=directory)
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump({"links": self._map, "unresolvable": self._unresolvable}, f, indent=1, sort_keys=True)
+                os.replace(tmp_path, self.path)
+            except Exception:
+                os.unlink(tmp_path)
+                raise
+
+    def report(self):
+        """Scrive nei log quanti link sono stati risolti, letti dalla mappa o lasciati invariati."""
+        stats = self.stats
+        logger.info(
+            f"Link di tracciamento: {stats['resolved']} risolti, {stats['cached']} dalla mappa, "
+            f"{stats['unresolvable']} non più risolvibili, {stats['failed']} non risolti per errore"
+        )
+
+
+_resolvers = {}
+_resolvers_lock = threading.Lock()
+
+
+def get_resolver(path=LINKS_FILE):
+    """Restituisce il resolver condiviso per `path`, leggendo la mappa alla prima richiesta."""
+    with _resolvers_lock:
+        if path not in _resolvers:
+            _resolvers[path] = LinkResolver(path)
+        return _resolvers[path]
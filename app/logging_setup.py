@@ -0,0 +1,230 @@
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+STANDARD_FORMAT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+
+# Campagna e fase correnti, aggiunte a ogni record di log
+_campaign_id = contextvars.ContextVar("campaign_id", default=None)
+_stage = contextvars.ContextVar("stage", default=None)
+
+_listener = None
+_rate_limit = None
+_listener_lock = threading.Lock()
+
+
+@contextmanager
+def log_context(campaign_id=None, stage=None):
+    """Associa campaign_id e stage a tutti i log emessi nel blocco."""
+    tokens = []
+    if campaign_id is not None:
+        tokens.append((_campaign_id, _campaign_id.set(campaign_id)))
+    if stage is not None:
+        tokens.append((_stage, _stage.set(stage)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """Aggiunge campaign_id e stage al record (se non già passati con `extra`)."""
+
+    def filter(self, record):
+        if getattr(record, "campaign_id", None) is None:
+            record.campaign_id = _campaign_id.get()
+        if getattr(record, "stage", None) is None:
+            record.stage = _stage.get()
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Limita gli avvisi ripetuti emessi dalla stessa riga di codice.
+
+    Entro `interval` secondi passano al massimo `burst` record per punto di
+    chiamata; gli altri vengono scartati e contati. Alla chiusura della
+    finestra un unico messaggio riassume quelli soppressi (tramite `emit`, o
+    in coda al primo messaggio della finestra successiva se `emit` manca).
+    Vengono limitati solo i livelli tra `min_level` e `max_level` (di default
+    i soli WARNING, cioè i retry ripetuti): INFO, ERROR e CRITICAL passano
+    sempre.
+    """
+
+    def __init__(self, interval=30.0, burst=5, min_level=logging.WARNING, max_level=logging.WARNING, emit=None):
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        self.min_level = min_level
+        self.max_level = max_level
+        self.emit = emit
+        self._windows = {}
+        self._last = {}
+        self._timers = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if getattr(record, "rate_limit_summary", False) or not self.min_level <= record.levelno <= self.max_level:
+            return True
+
+        key = (record.name, record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            start, count, suppressed = self._windows.get(key, (now, 0, 0))
+            if now - start >= self.interval:
+                if suppressed:
+                    record.msg = f"{record.msg} ({suppressed} messaggi simili soppressi)"
+                start, count, suppressed = now, 0, 0
+            if count < self.burst:
+                self._windows[key] = (start, count + 1, suppressed)
+                return True
+            self._windows[key] = (start, count, suppressed + 1)
+            if self.emit is not None:
+                self._last[key] = record
+                if key not in self._timers:
+                    timer = threading.Timer(max(0.0, start + self.interval - now), self._summarize, (key,))
+                    timer.daemon = True
+                    self._timers[key] = timer
+                    timer.start()
+            return False
+
+    def _summarize(self, key):
+        with self._lock:
+            self._timers.pop(key, None)
+            record = self._last.pop(key, None)
+            start, count, suppressed = self._windows.get(key, (0.0, 0, 0))
+            self._windows[key] = (start, count, 0)
+        if record is None or not suppressed:
+            return
+        summary = logging.makeLogRecord(record.__dict__)
+        summary.msg = f"{record.getMessage()} ({suppressed} messaggi simili soppressi negli ultimi {self.interval:.0f}s)"
+        summary.args = None
+        summary.exc_info = summary.exc_text = None
+        summary.rate_limit_summary = True
+        self.emit(summary)
+
+    def flush(self):
+        """Emette subito i riepiloghi in sospeso (ad esempio all'uscita del processo)."""
+        with self._lock:
+            timers = dict(self._timers)
+        for key, timer in timers.items():
+            timer.cancel()
+            self._summarize(key)
+
+
+class JsonFormatter(logging.Formatter):
+    """Formatta i record come righe JSON, con campaign_id e stage."""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "campaign_id": getattr(record, "campaign_id", None),
+            "stage": getattr(record, "stage", None),
+            "thread": record.threadName,
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def _stop_listener():
+    global _listener
+    with _listener_lock:
+        if _rate_limit is not None:
+            _rate_limit.flush()
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def install_queue_logging(logger=None, rate_limit=True):
+    """
+    Sposta gli handler di `logger` (default: root) dietro una coda.
+
+    I thread che loggano si limitano ad accodare il record; la scrittura su
+    file e console avviene in un unico thread di background. La funzione è
+    idempotente, così può essere chiamata a ogni rerun di Streamlit.
+    """
+    global _listener, _rate_limit
+    from logging.handlers import QueueHandler, QueueListener
+
+    logger = logger or logging.getLogger()
+    with _listener_lock:
+        if any(isinstance(h, QueueHandler) for h in logger.handlers):
+            return _listener
+
+        handlers = list(logger.handlers)
+        for handler in handlers:
+            logger.removeHandler(handler)
+
+        log_queue = queue.SimpleQueue()
+        queue_handler = QueueHandler(log_queue)
+        queue_handler.addFilter(ContextFilter())
+        if rate_limit:
+            # I riepiloghi passano dall'handler stesso: finiscono in coda come gli altri record
+            _rate_limit = RateLimitFilter(emit=queue_handler.handle)
+            queue_handler.addFilter(_rate_limit)
+        logger.addHandler(queue_handler)
+
+        _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+
+    atexit.register(_stop_listener)
+    return _listener
+
+
+def setup_logging(log_file=None, level=logging.INFO):
+    """
+    Configura il logging con console leggibile, file JSON lines e coda di background.
+
+    Args:
+        log_file (str): File di log JSON (None per la sola console).
+        level (int): Livello minimo di log.
+    """
+    root = logging.getLogger()
+    if _listener is not None:
+        return _listener
+    root.setLevel(level)
+
+    console = logging.StreamHandler(sys.stdout)
+    console.setFormatter(logging.Formatter(STANDARD_FORMAT))
+    root.addHandler(console)
+
+    if log_file:
+        from logging.handlers import RotatingFileHandler
+
+        os.makedirs(os.path.dirname(log_file) or ".", exist_ok=True)
+        file_handler = RotatingFileHandler(log_file, maxBytes=10485760, backupCount=5, encoding="utf8")
+        file_handler.setFormatter(JsonFormatter())
+        root.addHandler(file_handler)
+
+    return install_queue_logging(root)
+
+
+def configure_from_file(config_file):
+    """
+    Applica una configurazione dictConfig da file JSON e la mette dietro una coda.
+
+    Viene applicata una sola volta per processo: i rerun di Streamlit non
+    ricreano gli handler.
+    """
+    if _listener is not None:
+        return _listener
+    import logging.config
+
+    with open(config_file, "r") as f:
+        logging.config.dictConfig(json.load(f))
+    return install_queue_logging()
@@ -0,0 +1,112 @@
+"""
+Campagna normalizzata, condivisa da batch_migrate e dalle pagine Streamlit.
+
+I dizionari di Brevo vengono letti una sola volta: titolo pulito e data di
+invio (come timestamp epoch) sono calcolati all'ingresso e non vengono più
+ricalcolati da filtri, ordinamenti e tabelle. `Campaign` usa `__slots__`:
+anche decine di migliaia di campagne occupano poca memoria e si ordinano
+per data senza rileggere le stringhe.
+"""
+import re
+import logging
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+DATE_LABEL_FORMAT = "%d/%m/%Y %H:%M"
+
+_COUNCIL_PREFIX_RE = re.compile(r'^Cronache\s+dal\s+Consiglio\s+n°\s*\d+\s*-\s*')
+_SPACES_RE = re.compile(r'\s+')
+
+
+def clean_title(title):
+    """Rimuove prefissi come 'Cronache dal Consiglio n° xxx -' dal titolo."""
+    title = _COUNCIL_PREFIX_RE.sub('', title)
+    return _SPACES_RE.sub(' ', title).strip()
+
+
+def parse_sent_date(sent_date):
+    """
+    Converte la sentDate di Brevo in un timestamp epoch (UTC).
+
+    Gestisce sia il formato ISO ('2024-03-01T10:00:00.000Z') sia
+    '2024-03-01 10:00:00'. Le date senza fuso orario sono considerate UTC.
+
+    Returns:
+        float: Il timestamp, o None se la data è assente o non valida.
+    """
+    if not sent_date:
+        return None
+    try:
+        if 'T' in sent_date:
+            date = datetime.fromisoformat(sent_date.replace('Z', '+00:00'))
+        else:
+            date = datetime.strptime(sent_date, '%Y-%m-%d %H:%M:%S')
+    except ValueError as e:
+        logger.warning(f"Errore nella conversione della data {sent_date}: {e}")
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return date.timestamp()
+
+
+class Campaign:
+    """
+    Una campagna Brevo, senza HTML.
+
+    Attributes:
+        id: ID Brevo della campagna.
+        name (str): Nome originale della campagna.
+        name_lower (str): Nome in minuscolo, per la ricerca.
+        title (str): Titolo pulito, usato per il post su Substack.
+        subject (str): Oggetto dell'email.
+        sent_date (str): sentDate originale (serve per il confronto con exported_posts.json).
+        sent_ts (float): sentDate come timestamp epoch UTC, None se assente.
+        exported (bool): True se la campagna risulta già esportata.
+    """
+
+    __slots__ = ("id", "name", "name_lower", "title", "subject", "sent_date", "sent_ts", "exported")
+
+    def __init__(self, campaign_id, name="", subject="", sent_date="", sent_ts=None, exported=False):
+        self.id = campaign_id
+        self.name = name
+        self.name_lower = name.lower()
+        self.title = clean_title(name)
+        self.subject = subject
+        self.sent_date = sent_date
+        self.sent_ts = sent_ts
+        self.exported = exported
+
+    @classmethod
+    def from_brevo(cls, data, exported_keys=None):
+        """
+        Crea la campagna da un dizionario restituito da Brevo (lista o dettagli).
+
+        Args:
+            data (dict): La campagna come la restituisce l'API.
+            exported_keys (tuple): Il risultato di campaign_index.load_exported_keys(),
+                per calcolare subito lo stato di esportazione.
+        """
+        name = data.get("name") or ""
+        sent_date = data.get("sentDate") or ""
+        exported = False
+        if exported_keys is not None:
+            exported_ids, exported_title_dates = exported_keys
+            exported = data.get("id") in exported_ids or (name, sent_date) in exported_title_dates
+        return cls(data.get("id"), name, subject=data.get("subject") or "", sent_date=sent_date,
+                   sent_ts=parse_sent_date(sent_date), exported=exported)
+
+    @property
+    def sort_key(self):
+        """Chiave per ordinare per data di invio; le campagne senza data vengono prima delle altre."""
+        return self.sent_ts if self.sent_ts is not None else float("-inf")
+
+    @property
+    def sent_label(self):
+        """Data di invio leggibile, calcolata solo per le righe mostrate."""
+        if self.sent_ts is None:
+            return self.sent_date or "N/D"
+        return datetime.fromtimestamp(self.sent_ts, timezone.utc).strftime(DATE_LABEL_FORMAT)
+
+    def __repr__(self):
+        return f"Campaign(id={self.id!r}, title={self.title!r}, sent_date={self.sent_date!r})"
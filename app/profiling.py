@@ -0,0 +1,188 @@
+import os
+import json
+import time
+import cProfile
+import logging
+import threading
+import statistics
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+
+from app.logging_setup import log_context
+
+logger = logging.getLogger(__name__)
+
+# Numero di righe mostrate nei report delle allocazioni
+TOP_ALLOCATIONS = 25
+# Fattore rispetto alla mediana oltre il quale una campagna è considerata anomala
+OUTLIER_FACTOR = 5.0
+# Durata minima (secondi) perché un'anomalia venga segnalata
+OUTLIER_MIN_SECONDS = 0.05
+
+
+class StageProfiler:
+    """
+    Misura la durata delle fasi della pipeline (download, conversione, upload...).
+
+    I tempi per fase vengono sempre registrati; se `enabled` è vero vengono
+    anche raccolti un profilo cProfile e le allocazioni tracemalloc per ogni
+    fase, salvati in `output_dir` in formati standard:
+
+    - `<fase>.prof`: statistiche cProfile (apribili con snakeviz, gprof2dot, pstats)
+    - `<fase>.snapshot`: snapshot tracemalloc (`tracemalloc.Snapshot.load`)
+    - `<fase>.alloc.txt`: le allocazioni principali della fase
+    - `summary.json`: tempi per fase e campagne anomale
+    """
+
+    def __init__(self, enabled=False, output_dir="profiles", run_name=None):
+        self.enabled = enabled
+        self.run_name = run_name or datetime.now().strftime("%Y%m%d-%H%M%S")
+        self.output_dir = os.path.join(output_dir, self.run_name)
+        self.timings = defaultdict(list)  # fase -> [(campaign_id, secondi)]
+        self._profiles = {}
+        self._allocations = defaultdict(lambda: defaultdict(int))
+        self._snapshots = {}
+        self._peaks = defaultdict(int)
+        self._local = threading.local()
+        self._profile_lock = threading.Lock()
+
+        if self.enabled and not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+
+    @contextmanager
+    def stage(self, name, campaign_id=None):
+        """Context manager che misura una fase per una campagna."""
+        # Le fasi annidate, o eseguite in parallelo su altri thread, vengono
+        # solo cronometrate: cProfile non supporta più profiler attivi insieme
+        depth = getattr(self._local, "depth", 0)
+        profile_this = self.enabled and depth == 0 and self._profile_lock.acquire(blocking=False)
+        self._local.depth = depth + 1
+
+        profiler = None
+        start_snapshot = None
+        if profile_this:
+            profiler = self._profiles.setdefault(name, cProfile.Profile())
+            start_snapshot = tracemalloc.take_snapshot()
+            tracemalloc.reset_peak()
+            profiler.enable()
+
+        start = time.perf_counter()
+        try:
+            with log_context(campaign_id=campaign_id, stage=name):
+                yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self._local.depth = depth
+            if profile_this:
+                profiler.disable()
+                self._record_allocations(name, start_snapshot)
+                self._profile_lock.release()
+            self.timings[name].append((campaign_id, elapsed))
+
+    def _record_allocations(self, name, start_snapshot):
+        _, peak = tracemalloc.get_traced_memory()
+        self._peaks[name] = max(self._peaks[name], peak)
+
+        end_snapshot = tracemalloc.take_snapshot()
+        filters = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ]
+        end_snapshot = end_snapshot.filter_traces(filters)
+        for stat in end_snapshot.compare_to(start_snapshot.filter_traces(filters), "lineno"):
+            if stat.size_diff > 0:
+                frame = stat.traceback[0]
+                self._allocations[name][f"{frame.filename}:{frame.lineno}"] += stat.size_diff
+        self._snapshots[name] = end_snapshot
+
+    def stage_stats(self):
+        """Restituisce le statistiche aggregate per fase."""
+        stats = {}
+        for name, samples in self.timings.items():
+            durations = [d for _, d in samples]
+            stats[name] = {
+                "count": len(durations),
+                "total": sum(durations),
+                "mean": statistics.mean(durations),
+                "median": statistics.median(durations),
+                "max": max(durations),
+            }
+        return stats
+
+    def find_outliers(self, factor=OUTLIER_FACTOR, min_seconds=OUTLIER_MIN_SECONDS):
+        """
+        Individua le campagne che hanno impiegato molto più della mediana in una fase.
+
+        Returns:
+            list: Dizionari con fase, ID campagna, durata e rapporto con la mediana.
+        """
+        outliers = []
+        for name, samples in self.timings.items():
+            if len(samples) < 3:
+                continue
+            median = statistics.median(d for _, d in samples)
+            if median <= 0:
+                continue
+            for campaign_id, duration in samples:
+                ratio = duration / median
+                if ratio >= factor and duration >= min_seconds:
+                    outliers.append({
+                        "stage": name,
+                        "campaign_id": campaign_id,
+                        "seconds": duration,
+                        "ratio": ratio,
+                    })
+        outliers.sort(key=lambda o: o["ratio"], reverse=True)
+        return outliers
+
+    def report(self):
+        """Scrive nel log il riepilogo dei tempi e le eventuali anomalie."""
+        for name, s in self.stage_stats().items():
+            logger.info(
+                f"Fase {name}: {s['count']} esecuzioni, totale {s['total']:.2f}s, "
+                f"mediana {s['median']:.3f}s, max {s['max']:.3f}s"
+            )
+        for o in self.find_outliers():
+            logger.warning(
+                f"Campagna {o['campaign_id']} ha impiegato {o['ratio']:.1f}× la mediana "
+                f"in {o['stage']} ({o['seconds']:.2f}s)"
+            )
+
+    def save(self):
+        """
+        Salva profili, snapshot e riepilogo nella directory del run.
+
+        Returns:
+            str: La directory di output, o None se il profiling è disattivato.
+        """
+        if not self.enabled:
+            return None
+
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        for name, profiler in self._profiles.items():
+            profiler.dump_stats(os.path.join(self.output_dir, f"{name}.prof"))
+
+        for name, snapshot in self._snapshots.items():
+            snapshot.dump(os.path.join(self.output_dir, f"{name}.snapshot"))
+
+        for name, allocations in self._allocations.items():
+            top = sorted(allocations.items(), key=lambda item: item[1], reverse=True)[:TOP_ALLOCATIONS]
+            with open(os.path.join(self.output_dir, f"{name}.alloc.txt"), "w", encoding="utf-8") as f:
+                f.write(f"# Fase {name} - picco memoria {self._peaks[name] / 1024:.1f} KiB\n")
+                for location, size in top:
+                    f.write(f"{size / 1024:10.1f} KiB  {location}\n")
+
+        summary = {
+            "run": self.run_name,
+            "stages": self.stage_stats(),
+            "peak_memory": dict(self._peaks),
+            "outliers": self.find_outliers(),
+        }
+        with open(os.path.join(self.output_dir, "summary.json"), "w") as f:
+            json.dump(summary, f, indent=4, default=str)
+
+        logger.info(f"Profili salvati in {self.output_dir}")
+        return self.output_dir
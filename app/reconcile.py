@@ -0,0 +1,343 @@
+"""
+Riconciliazione di exported_posts.json con le bozze presenti su Substack.
+
+Un upload viene registrato come riuscito quando il bot ha premuto "salva"
+senza errori, ma la bozza potrebbe mancare, essere doppia o essere stata
+salvata a metà. Qui l'elenco delle bozze viene scaricato con poche richieste
+paginate (senza Chrome) e confrontato in memoria con le campagne caricate:
+
+- per titolo e, se il titolo non basta, per impronta SimHash del testo;
+- il testo della bozza viene confrontato con hash e numero di parole del
+  Markdown caricato, registrati in history.db al momento dell'upload, per
+  riconoscere le bozze troncate. Per gli upload precedenti, senza hash, si usa
+  il Markdown in archive.db.
+
+Le campagne mancanti o troncate possono essere rimesse in coda (`--requeue`):
+vengono tolte da exported_posts.json e il batch successivo le ricarica.
+
+    python -m app.reconcile
+    python -m app.reconcile --requeue --output riconciliazione.json
+"""
+import os
+import sys
+import json
+import logging
+import tempfile
+
+from app import resilience, session
+from app.archive import ARCHIVE_FILE, Archive
+from app.fingerprint import FINGERPRINT_FILE, FingerprintIndex, distance, fingerprint, normalize_text, text_digest
+from app.history import EXPORTED_POSTS_FILE, get_history
+
+logger = logging.getLogger(__name__)
+
+DRAFTS_PATH = "/api/v1/post_management/drafts"
+PAGE_SIZE = 50
+TIMEOUT = (10, 30)
+
+# L'editor di Substack riformatta il testo: soglia più larga di quella dei duplicati
+MATCH_DISTANCE = 10
+# Una bozza con meno di questa frazione delle parole attese è considerata troncata
+TRUNCATION_RATIO = 0.9
+
+STATUSES = ("ok", "missing", "duplicate", "truncated", "mismatch")
+# Stati che si risolvono ricaricando la campagna; i duplicati vanno invece eliminati a mano
+REQUEUE_STATUSES = ("missing", "truncated")
+
+
+def _normalize_id(campaign_id):
+    return int(campaign_id) if str(campaign_id).isdigit() else campaign_id
+
+
+def _normalize_title(title):
+    return " ".join((title or "").lower().split())
+
+
+def draft_text(body):
+    """
+    Testo di una bozza: il documento dell'editor (JSON) viene ridotto ai suoi
+    nodi di testo, il Markdown o l'HTML restano come sono.
+    """
+    if not isinstance(body, str) or not body.lstrip().startswith("{"):
+        return body or ""
+    try:
+        document = json.loads(body)
+    except json.JSONDecodeError:
+        return body
+    parts = []
+    stack = [document]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            if isinstance(node.get("text"), str):
+                parts.append(node["text"])
+            stack.extend(reversed(node.get("content") or []))
+        elif isinstance(node, list):
+            stack.extend(reversed(node))
+    return " ".join(parts)
+
+
+def _get_page(url, cookie_header, offset, limit):
+    import requests
+
+    response = requests.get(url, headers={"Cookie": cookie_header}, timeout=TIMEOUT,
+                            params={"offset": offset, "limit": limit,
+                                    "order_by": "draft_created_at", "order_direction": "asc"})
+    response.raise_for_status()
+    return response.json()
+
+
+def fetch_drafts(cookies, base_url=None, page_size=PAGE_SIZE):
+    """
+    Scarica l'elenco completo delle bozze della pubblicazione.
+
+    Returns:
+        list: Le bozze, come dizionari con almeno id, draft_title e draft_body.
+    """
+    url = f"{(base_url or session.get_base_url()).rstrip('/')}{DRAFTS_PATH}"
+    cookie_header = "; ".join(f"{c['name']}={c['value']}" for c in cookies if c.get("name") and "value" in c)
+    drafts, offset, pages = [], 0, 0
+    while True:
+        page = resilience.call("substack.api", _get_page, url, cookie_header, offset, page_size)
+        posts = page.get("posts", []) if isinstance(page, dict) else page
+        drafts.extend(posts)
+        pages += 1
+        if len(posts) < page_size:
+            break
+        offset += len(posts)
+    logger.info(f"Scaricate {len(drafts)} bozze da Substack in {pages} richieste")
+    return drafts
+
+
+def load_uploaded_entries(ledger_file=EXPORTED_POSTS_FILE, uploaded_ids=None):
+    """
+    Voci di exported_posts.json che dovrebbero avere una bozza su Substack.
+
+    Le voci del batch (`exported_date`) sono scritte solo dopo un upload; quelle
+    della pagina Migrazione anche senza upload, quindi contano solo se marcate
+    `uploaded` o se lo storico registra un upload riuscito per quella campagna.
+
+    Returns:
+        list: Una voce per campagna (id, titolo), nell'ordine del file.
+    """
+    if not os.path.exists(ledger_file):
+        return []
+    with open(ledger_file, "r") as f:
+        exported_posts = json.load(f)
+    uploaded_ids = uploaded_ids or set()
+    entries, seen = [], set()
+    for post in exported_posts:
+        if not isinstance(post, dict) or not str(post.get("id")).isdigit():
+            continue
+        campaign_id = int(post["id"])
+        if campaign_id in seen:
+            continue
+        if "exported_date" in post or post.get("uploaded") or campaign_id in uploaded_ids:
+            seen.add(campaign_id)
+            entries.append({"id": campaign_id, "title": post.get("title") or ""})
+    return entries
+
+
+def reconcile(entries, drafts, archive=None, fingerprints=None, uploaded_texts=None):
+    """
+    Confronta le campagne caricate con le bozze, in memoria.
+
+    Le impronte SimHash sono la parte costosa: vengono calcolate solo se il
+    testo della bozza differisce da quello atteso o se il titolo non trova
+    nessuna bozza, e l'indice per contenuto contiene solo le bozze che nessun
+    titolo ha già reclamato.
+
+    Args:
+        entries (list): Voci da load_uploaded_entries().
+        drafts (list): Bozze da fetch_drafts().
+        archive (Archive): Archivio con il Markdown convertito, usato per le campagne
+            senza testo registrato in `uploaded_texts`.
+        fingerprints (FingerprintIndex): Impronte salvate dal batch, usate se l'archivio non ha la campagna.
+        uploaded_texts (dict): campaign_id -> (hash, numero di parole) del testo caricato,
+            da History.uploaded_texts().
+
+    Returns:
+        list: Per ogni voce: id, titolo, stato (vedi STATUSES), ID delle bozze
+        corrispondenti, distanza tra le impronte e rapporto tra parole trovate e attese.
+    """
+    uploaded_texts = uploaded_texts or {}
+    by_title = {}
+    by_id = {}
+    texts = {}
+    values = {}
+    digests = {}
+    for draft in drafts:
+        by_id[draft["id"]] = draft
+        by_title.setdefault(_normalize_title(draft.get("draft_title")), []).append(draft)
+        texts[draft["id"]] = normalize_text(draft_text(draft.get("draft_body")))
+
+    def value_of(draft_id):
+        if draft_id not in values:
+            values[draft_id] = fingerprint(" ".join(texts[draft_id]))
+        return values[draft_id]
+
+    def digest_of(draft_id):
+        if draft_id not in digests:
+            digests[draft_id] = text_digest(texts[draft_id])
+        return digests[draft_id]
+
+    claimed = {draft["id"] for entry in entries for draft in by_title.get(_normalize_title(entry["title"]), [])}
+    unclaimed = None
+
+    results = []
+    for entry in entries:
+        expected_words = None
+        expected = None
+        expected_digest, expected_count = uploaded_texts.get(entry["id"], (None, None))
+        if expected_digest is None:
+            # Upload registrati prima degli hash: si usa il Markdown dell'archivio
+            stored = archive.get(entry["id"]) if archive is not None else None
+            if stored and stored.get("markdown"):
+                expected_words = normalize_text(stored["markdown"])
+                expected_digest, expected_count = text_digest(expected_words), len(expected_words)
+        if expected_words is None and fingerprints is not None:
+            expected = fingerprints.value(entry["id"])
+
+        candidates = by_title.get(_normalize_title(entry["title"]), [])
+        if not candidates and (expected_words or expected is not None):
+            # Titolo modificato su Substack: si cerca per contenuto tra le bozze senza titolo corrispondente
+            if unclaimed is None:
+                unclaimed = FingerprintIndex(":memory:", max_distance=MATCH_DISTANCE)
+                for draft in drafts:
+                    if draft["id"] not in claimed:
+                        unclaimed.add(draft["id"], draft.get("draft_title"), value_of(draft["id"]))
+            if expected is None:
+                expected = fingerprint(" ".join(expected_words))
+            match = unclaimed.find_duplicate(expected)
+            if match is not None:
+                candidates = [by_id[match[0]]]
+
+        result = {"id": entry["id"], "title": entry["title"], "drafts": [d["id"] for d in candidates],
+                  "distance": None, "ratio": None}
+        if not candidates:
+            result["status"] = "missing"
+            results.append(result)
+            continue
+
+        identical = [d for d in candidates if expected_digest is not None and digest_of(d["id"]) == expected_digest]
+        if identical:
+            best = identical[0]
+            result["distance"] = 0
+        else:
+            best = candidates[0]
+            if expected is None and expected_words:
+                expected = fingerprint(" ".join(expected_words))
+            # Testi troppo corti non hanno impronta: restano solo il titolo e il rapporto tra le parole
+            comparable = [d for d in candidates if value_of(d["id"]) is not None]
+            if expected is not None and comparable:
+                best = min(comparable, key=lambda d: distance(expected, value_of(d["id"])))
+                result["distance"] = distance(expected, value_of(best["id"]))
+        if expected_count:
+            result["ratio"] = len(texts[best["id"]]) / expected_count
+
+        if result["ratio"] is not None and result["ratio"] < TRUNCATION_RATIO:
+            result["status"] = "truncated"
+        elif result["distance"] is not None and result["distance"] > MATCH_DISTANCE:
+            result["status"] = "mismatch"
+        elif len(candidates) > 1:
+            result["status"] = "duplicate"
+        else:
+            result["status"] = "ok"
+        results.append(result)
+    return results
+
+
+def requeue(campaign_ids, ledger_file=EXPORTED_POSTS_FILE):
+    """
+    Toglie le campagne da exported_posts.json, così il batch successivo le ricarica.
+
+    Il file viene riscritto in modo atomico. Restituisce il numero di voci tolte.
+    """
+    # Il registro contiene ID interi o stringhe, a seconda di chi li ha scritti
+    campaign_ids = {_normalize_id(campaign_id) for campaign_id in campaign_ids}
+    if not campaign_ids or not os.path.exists(ledger_file):
+        return 0
+    with open(ledger_file, "r") as f:
+        exported_posts = json.load(f)
+    kept = [post for post in exported_posts
+            if not (isinstance(post, dict) and _normalize_id(post.get("id")) in campaign_ids)]
+
+    directory = os.path.dirname(os.path.abspath(ledger_file))
+    fd, tmp_path = tempfile.mkstemp(prefix=".exported-", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(kept, f, indent=4)
+        os.replace(tmp_path, ledger_file)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+    removed = len(exported_posts) - len(kept)
+    logger.info(f"{removed} voci tolte da {ledger_file}: verranno ricaricate al prossimo batch")
+    return removed
+
+
+def report(results):
+    """Scrive nei log il riepilogo per stato e l'elenco delle campagne da controllare."""
+    counts = {status: 0 for status in STATUSES}
+    for result in results:
+        counts[result["status"]] += 1
+    logger.info("Riconciliazione: " + ", ".join(f"{status} {count}" for status, count in counts.items()))
+    for result in results:
+        if result["status"] == "ok":
+            continue
+        detail = f"bozze {result['drafts']}" if result["drafts"] else "nessuna bozza"
+        if result["ratio"] is not None:
+            detail += f", {result['ratio']:.0%} del testo"
+        if result["distance"] is not None:
+            detail += f", distanza {result['distance']}"
+        logger.warning(f"  [{result['status']}] '{result['title']}' (ID: {result['id']}): {detail}")
+    return counts
+
+
+def main():
+    import argparse
+    from app.logging_setup import setup_logging
+
+    parser = argparse.ArgumentParser(description="Confronta exported_posts.json con le bozze su Substack")
+    parser.add_argument("--cookies", default=session.COOKIES_FILE, help="File dei cookie di Substack")
+    parser.add_argument("--ledger", default=EXPORTED_POSTS_FILE, help="Registro dei post esportati")
+    parser.add_argument("--archive", default=ARCHIVE_FILE, help="Archivio con il Markdown caricato")
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE, help="Bozze per richiesta")
+    parser.add_argument("--requeue", action="store_true",
+                        help="Toglie dal registro le campagne mancanti o troncate, per ricaricarle")
+    parser.add_argument("--output", help="File JSON in cui salvare l'esito per ogni campagna")
+    args = parser.parse_args()
+
+    setup_logging()
+    try:
+        cookies = session.preflight(args.cookies)
+        drafts = fetch_drafts(cookies, page_size=args.page_size)
+    except session.SessionError as e:
+        logger.error(str(e))
+        return 1
+    except Exception as e:
+        logger.error(f"Impossibile scaricare le bozze da Substack: {e}")
+        return 1
+
+    try:
+        history = get_history()
+        uploaded_ids, uploaded_texts = history.uploaded_ids(), history.uploaded_texts()
+    except Exception as e:
+        logger.warning(f"Storico non disponibile, verranno controllate solo le voci del batch: {e}")
+        uploaded_ids, uploaded_texts = set(), {}
+    entries = load_uploaded_entries(args.ledger, uploaded_ids)
+    archive = Archive(args.archive) if os.path.exists(args.archive) else None
+    fingerprints = FingerprintIndex(FINGERPRINT_FILE) if os.path.exists(FINGERPRINT_FILE) else None
+
+    results = reconcile(entries, drafts, archive, fingerprints, uploaded_texts)
+    counts = report(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    if args.requeue:
+        requeue([r["id"] for r in results if r["status"] in REQUEUE_STATUSES], args.ledger)
+    return 0 if counts["ok"] == len(results) else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
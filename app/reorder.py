@@ -0,0 +1,103 @@
+"""
+Buffer di riordino per la fase di upload del batch.
+
+Download, pulizia e conversione girano in parallelo e terminano in ordine
+sparso; le bozze devono però arrivare su Substack nell'ordine di invio
+originale. Il buffer trattiene i risultati arrivati in anticipo e li rilascia
+solo quando tutti i precedenti sono stati rilasciati.
+
+Una campagna lenta non blocca tutto: quando `window` risultati successivi
+sono già pronti, il buffer la salta e la rilascia appena arriva, fuori
+ordine. Le statistiche riportano l'occupazione del buffer e il tempo in cui
+c'erano risultati pronti ma bloccati in attesa di un precedente.
+"""
+import time
+import heapq
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WINDOW = 8
+
+
+class ReorderBuffer:
+    """
+    Rilascia gli elementi in ordine di posizione (0, 1, 2, ...).
+
+    Non è thread-safe: va usato dal solo thread che esegue gli upload.
+    """
+
+    def __init__(self, window=DEFAULT_WINDOW):
+        self.window = max(1, window)
+        self._next = 0
+        self._heap = []
+        self._blocked_since = None
+        self._occupancy_total = 0
+        self._puts = 0
+        self.stats = {
+            "released": 0,
+            "max_occupancy": 0,
+            "stall_seconds": 0.0,
+            "skipped": 0,
+            "out_of_order": 0,
+        }
+
+    def __len__(self):
+        return len(self._heap)
+
+    def put(self, position, item):
+        """Aggiunge il risultato della campagna in posizione `position`."""
+        heapq.heappush(self._heap, (position, item))
+        self._puts += 1
+        self._occupancy_total += len(self._heap)
+        self.stats["max_occupancy"] = max(self.stats["max_occupancy"], len(self._heap))
+
+    def pop_ready(self):
+        """
+        Estrae gli elementi che possono essere rilasciati ora.
+
+        Returns:
+            list: Coppie (posizione, elemento) nell'ordine in cui vanno elaborate.
+        """
+        released = []
+        while self._heap:
+            position = self._heap[0][0]
+            if position < self._next:
+                # Campagna saltata in precedenza: va elaborata appena arriva
+                self.stats["out_of_order"] += 1
+            elif position > self._next:
+                if len(self._heap) < self.window:
+                    break
+                # Troppi risultati pronti dietro a uno lento: si salta l'attesa
+                self.stats["skipped"] += position - self._next
+                logger.warning(f"Buffer di riordino: salto {position - self._next} campagne ancora in lavorazione")
+                self._next = position + 1
+            else:
+                self._next += 1
+            released.append(heapq.heappop(self._heap))
+
+        now = time.perf_counter()
+        if self._heap and self._blocked_since is None:
+            self._blocked_since = now
+        elif not self._heap and self._blocked_since is not None:
+            self.stats["stall_seconds"] += now - self._blocked_since
+            self._blocked_since = None
+        self.stats["released"] += len(released)
+        return released
+
+    def metrics(self):
+        """Statistiche del buffer, con l'occupazione media."""
+        stats = dict(self.stats)
+        stats["avg_occupancy"] = self._occupancy_total / self._puts if self._puts else 0.0
+        if self._blocked_since is not None:
+            stats["stall_seconds"] += time.perf_counter() - self._blocked_since
+        return stats
+
+    def report(self):
+        """Scrive nei log occupazione, attese e campagne rilasciate fuori ordine."""
+        stats = self.metrics()
+        logger.info(
+            f"Buffer di riordino: occupazione massima {stats['max_occupancy']}, "
+            f"media {stats['avg_occupancy']:.1f}; risultati bloccati per {stats['stall_seconds']:.1f}s; "
+            f"{stats['out_of_order']} campagne caricate fuori ordine"
+        )
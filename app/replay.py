@@ -0,0 +1,69 @@
+import os
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Directory in cui batch_migrate salva i dettagli delle campagne scaricate
+CACHE_DIR = os.path.join("cache", "campaigns")
+
+
+def save_to_cache(campaign_details, cache_dir=CACHE_DIR):
+    """Salva i dettagli di una campagna Brevo nella cache locale."""
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f"{campaign_details['id']}.json")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(campaign_details, f)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_campaigns(source=CACHE_DIR):
+    """
+    Legge i dettagli delle campagne da rigiocare offline.
+
+    Args:
+        source (str): Una directory di file `<id>.json` (la cache locale),
+            un file JSON con una lista di campagne o un file JSONL.
+
+    Returns:
+        list: I dettagli delle campagne, ordinati per ID.
+    """
+    if os.path.isdir(source):
+        campaigns = []
+        for name in os.listdir(source):
+            if name.endswith(".json"):
+                with open(os.path.join(source, name), "r", encoding="utf-8") as f:
+                    campaigns.append(json.load(f))
+    elif source.endswith(".jsonl"):
+        with open(source, "r", encoding="utf-8") as f:
+            campaigns = [json.loads(line) for line in f if line.strip()]
+    else:
+        with open(source, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        campaigns = data.get("campaigns", []) if isinstance(data, dict) else data
+
+    campaigns = [c for c in campaigns if c.get("htmlContent")]
+    campaigns.sort(key=lambda c: c["id"])
+    logger.info(f"Caricate {len(campaigns)} campagne da {source}")
+    return campaigns
+
+
+def noop_sink(title, markdown_content, profiler=None):
+    """Destinazione di upload che scarta il contenuto (sostituisce Substack in replay)."""
+    return True
+
+
+class FileSink:
+    """Destinazione di upload che scrive ogni post in un file Markdown."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def __call__(self, title, markdown_content, profiler=None):
+        slug = "".join(c if c.isalnum() else "-" for c in title.lower()).strip("-")[:80]
+        with open(os.path.join(self.directory, f"{slug}.md"), "w", encoding="utf-8") as f:
+            f.write(f"# {title}\n\n{markdown_content}")
+        return True
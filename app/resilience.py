@@ -0,0 +1,316 @@
+"""
+Tentativi ripetuti, budget di retry e circuit breaker per le chiamate esterne.
+
+Ogni endpoint (API Brevo, pagine Substack, ...) ha una propria politica e uno
+stato condiviso tra tutti i thread:
+
+- backoff esponenziale con jitter completo, rispettando `Retry-After` sui 429;
+- classificazione degli errori: 429, 5xx, timeout e problemi di connessione
+  vengono ritentati, tutto il resto (es. 401, 404, ValueError) no;
+- budget di retry: in una finestra di 60 secondi i retry non possono superare
+  una frazione delle chiamate, così un'interruzione non moltiplica il carico;
+- circuit breaker: se la quota di errori ritentabili supera la soglia, tutte le
+  chiamate a quell'endpoint vengono sospese per `cooldown` secondi, poi una
+  chiamata di prova decide se riprendere.
+
+Le metriche (`metrics()`, `report()`) mostrano quanto tempo è andato perso in
+tentativi falliti, attese di backoff e pause del circuito.
+"""
+import time
+import random
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+# Eccezioni ritentabili riconosciute per nome, per non importare requests e Selenium qui
+_RETRYABLE_NAMES = {
+    "TimeoutError",
+    "ConnectionError",
+    "Timeout",
+    "ConnectTimeout",
+    "ReadTimeout",
+    "ChunkedEncodingError",
+    "TimeoutException",
+    "StaleElementReferenceException",
+    "ElementNotInteractableException",
+    "ElementClickInterceptedException",
+}
+
+CLOSED, OPEN, HALF_OPEN = "chiuso", "aperto", "semiaperto"
+
+# Politiche predefinite per endpoint
+POLICIES = {
+    "default": {"max_attempts": 3, "base_delay": 2.0, "max_delay": 30.0},
+    "brevo": {"max_attempts": 5, "base_delay": 1.0, "max_delay": 60.0},
+    "brevo.links": {"max_attempts": 3, "base_delay": 0.5, "max_delay": 8.0},
+    "substack.page": {"max_attempts": 3, "base_delay": 1.0, "max_delay": 8.0},
+    "substack.api": {"max_attempts": 4, "base_delay": 1.0, "max_delay": 15.0},
+}
+
+
+class CircuitOpenError(Exception):
+    """Sollevata quando il circuito di un endpoint resta aperto oltre l'attesa consentita."""
+
+
+def _status_code(exc):
+    response = getattr(exc, "response", None)
+    return getattr(response, "status_code", None)
+
+
+def is_retryable(exc):
+    """Restituisce True se l'errore è transitorio (429, 5xx, timeout, connessione)."""
+    status = _status_code(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return any(cls.__name__ in _RETRYABLE_NAMES for cls in type(exc).__mro__)
+
+
+def _retry_after(exc):
+    """Secondi indicati dall'header Retry-After di una risposta 429/503, se presenti."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+class Endpoint:
+    """Politica di retry, budget, circuit breaker e metriche di un endpoint."""
+
+    def __init__(self, name, max_attempts=3, base_delay=1.0, max_delay=30.0,
+                 budget_ratio=0.2, min_retries=10, window=60.0,
+                 failure_threshold=0.5, min_calls=10, cooldown=30.0, max_pause=300.0,
+                 sleep=time.sleep):
+        self.name = name
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget_ratio = budget_ratio
+        self.min_retries = min_retries
+        self.window = window
+        self.failure_threshold = failure_threshold
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self.max_pause = max_pause
+        self._sleep = sleep
+
+        self._lock = threading.Lock()
+        self._calls = deque()      # (istante, fallita con errore ritentabile)
+        self._retries = deque()    # istanti dei retry
+        self.state = CLOSED
+        self._open_until = 0.0
+        self._probing = False
+        self.stats = {
+            "calls": 0,
+            "successes": 0,
+            "retries": 0,
+            "retryable_errors": 0,
+            "fatal_errors": 0,
+            "budget_exhausted": 0,
+            "circuit_opened": 0,
+            "failed_call_seconds": 0.0,
+            "backoff_seconds": 0.0,
+            "paused_seconds": 0.0,
+        }
+
+    def backoff(self, attempt, exc=None, base_delay=None):
+        """Attesa dopo il tentativo fallito numero `attempt` (da 0): jitter completo su base * 2^attempt."""
+        base_delay = self.base_delay if base_delay is None else base_delay
+        delay = random.uniform(0, min(self.max_delay, base_delay * 2 ** attempt))
+        retry_after = _retry_after(exc) if exc is not None else None
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+    def _trim(self, now):
+        while self._calls and now - self._calls[0][0] > self.window:
+            self._calls.popleft()
+        while self._retries and now - self._retries[0] > self.window:
+            self._retries.popleft()
+
+    def _take_retry(self):
+        """Consuma un retry dal budget; False se il budget della finestra è esaurito."""
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            allowed = self.min_retries + self.budget_ratio * len(self._calls)
+            if len(self._retries) >= allowed:
+                self.stats["budget_exhausted"] += 1
+                return False
+            self._retries.append(now)
+            self.stats["retries"] += 1
+            return True
+
+    def _before_call(self):
+        """Sospende il chiamante finché il circuito è aperto (la fase intera si ferma)."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if self.state == CLOSED:
+                    return
+                if self.state == OPEN and now >= self._open_until:
+                    self.state = HALF_OPEN
+                    self._probing = False
+                if self.state == HALF_OPEN and not self._probing:
+                    # Una sola chiamata di prova; le altre aspettano il suo esito
+                    self._probing = True
+                    return
+                pause = max(self._open_until - now, 0.5)
+            if waited >= self.max_pause:
+                raise CircuitOpenError(f"Circuito '{self.name}' aperto da oltre {self.max_pause:.0f}s")
+            pause = min(pause, self.max_pause - waited)
+            self._sleep(pause)
+            waited += pause
+            with self._lock:
+                self.stats["paused_seconds"] += pause
+
+    def _after_call(self, elapsed, exc=None):
+        retryable = exc is not None and is_retryable(exc)
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            self._calls.append((now, retryable))
+            if exc is None:
+                self.stats["successes"] += 1
+            else:
+                self.stats["failed_call_seconds"] += elapsed
+                self.stats["retryable_errors" if retryable else "fatal_errors"] += 1
+
+            if self.state == HALF_OPEN and self._probing:
+                self._probing = False
+                if retryable:
+                    self._open(now)
+                else:
+                    self.state = CLOSED
+                    self._calls.clear()
+                    logger.info(f"Circuito '{self.name}' richiuso")
+                return
+
+            if self.state == CLOSED and retryable and len(self._calls) >= self.min_calls:
+                failures = sum(1 for _, failed in self._calls if failed)
+                if failures / len(self._calls) >= self.failure_threshold:
+                    self._open(now)
+
+    def _open(self, now):
+        self.state = OPEN
+        self._open_until = now + self.cooldown
+        self.stats["circuit_opened"] += 1
+        logger.warning(f"Circuito '{self.name}' aperto: troppi errori, pausa di {self.cooldown:.0f}s")
+
+    def call(self, func, args=(), kwargs=None, max_attempts=None, base_delay=None):
+        """
+        Esegue `func(*args, **kwargs)` con la politica dell'endpoint.
+
+        Gli argomenti della funzione sono passati come tupla e dizionario, così
+        non possono mai scontrarsi con i parametri di retry.
+
+        Args:
+            func: La funzione da eseguire.
+            args (tuple): Argomenti posizionali per `func`.
+            kwargs (dict): Argomenti nominali per `func`.
+            max_attempts (int): Sostituisce il numero di tentativi dell'endpoint.
+            base_delay (float): Sostituisce il ritardo base dell'endpoint.
+
+        Returns:
+            Il risultato di `func`.
+
+        Raises:
+            L'ultima eccezione di `func` se non è ritentabile, se i tentativi
+            o il budget sono esauriti; CircuitOpenError se il circuito resta
+            aperto troppo a lungo.
+        """
+        kwargs = kwargs or {}
+        max_attempts = max_attempts or self.max_attempts
+        attempt = 0
+        while True:
+            self._before_call()
+            with self._lock:
+                self.stats["calls"] += 1
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                self._after_call(time.perf_counter() - start, e)
+                attempt += 1
+                if not is_retryable(e):
+                    raise
+                if attempt >= max_attempts:
+                    logger.error(f"[{self.name}] Tutti i {max_attempts} tentativi falliti: {e}")
+                    raise
+                if not self._take_retry():
+                    logger.error(f"[{self.name}] Budget di retry esaurito, rinuncio: {e}")
+                    raise
+                delay = self.backoff(attempt - 1, e, base_delay)
+                logger.warning(f"[{self.name}] Tentativo {attempt}/{max_attempts} fallito, "
+                               f"nuovo tentativo tra {delay:.1f}s: {e}")
+                self._sleep(delay)
+                with self._lock:
+                    self.stats["backoff_seconds"] += delay
+            else:
+                self._after_call(time.perf_counter() - start)
+                return result
+
+    def metrics(self):
+        """Copia delle metriche, con lo stato del circuito e il tempo perso totale."""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["state"] = self.state
+        stats["lost_seconds"] = stats["failed_call_seconds"] + stats["backoff_seconds"] + stats["paused_seconds"]
+        return stats
+
+
+_endpoints = {}
+_endpoints_lock = threading.Lock()
+
+
+def _policy(name):
+    """Politica di `name`, poi del suo prefisso ('brevo.campaign' -> 'brevo'), poi 'default'."""
+    return POLICIES.get(name) or POLICIES.get(name.split(".")[0]) or POLICIES["default"]
+
+
+def get_endpoint(name):
+    """Restituisce l'endpoint `name`, creandolo con la sua politica predefinita."""
+    with _endpoints_lock:
+        if name not in _endpoints:
+            _endpoints[name] = Endpoint(name, **_policy(name))
+        return _endpoints[name]
+
+
+def configure(name, **settings):
+    """Sostituisce la politica di un endpoint (es. nei test di carico)."""
+    with _endpoints_lock:
+        _endpoints[name] = Endpoint(name, **{**_policy(name), **settings})
+        return _endpoints[name]
+
+
+def call(endpoint, func, *args, **kwargs):
+    """Esegue `func(*args, **kwargs)` con la politica dell'endpoint `endpoint`."""
+    return get_endpoint(endpoint).call(func, args, kwargs)
+
+
+def metrics():
+    """Metriche di tutti gli endpoint usati finora."""
+    with _endpoints_lock:
+        endpoints = list(_endpoints.values())
+    return {endpoint.name: endpoint.metrics() for endpoint in endpoints}
+
+
+def report():
+    """Scrive nei log un riepilogo per gli endpoint che hanno avuto errori."""
+    for name, stats in metrics().items():
+        if not (stats["retries"] or stats["retryable_errors"] or stats["fatal_errors"]):
+            continue
+        logger.info(
+            f"[{name}] {stats['calls']} chiamate, {stats['retries']} retry, "
+            f"{stats['retryable_errors']} errori transitori, {stats['fatal_errors']} definitivi, "
+            f"circuito aperto {stats['circuit_opened']} volte; "
+            f"tempo perso {stats['lost_seconds']:.1f}s "
+            f"(tentativi falliti {stats['failed_call_seconds']:.1f}s, backoff {stats['backoff_seconds']:.1f}s, "
+            f"pause {stats['paused_seconds']:.1f}s)"
+        )
@@ -0,0 +1,231 @@
+"""
+Controllo preventivo della sessione Substack e salvataggio dei cookie aggiornati.
+
+Prima di un batch i cookie vengono verificati offline (presenza e scadenza dei
+cookie di sessione) e con una sola richiesta leggera a `/publish`, senza
+avviare Chrome. Dopo una sessione riuscita, i cookie restituiti dal browser
+vengono riscritti in modo atomico, così le sessioni rinnovate da Substack non
+vanno perse.
+
+    python -m app.session cookies.json
+"""
+import os
+import re
+import sys
+import json
+import time
+import logging
+import tempfile
+import threading
+from urllib.parse import urlparse
+
+from app import resilience
+
+logger = logging.getLogger(__name__)
+
+COOKIES_FILE = "cookies.json"
+DEFAULT_BASE_URL = "https://substack.com"
+
+# Cookie senza i quali Substack non riconosce la sessione
+REQUIRED_COOKIES = ("substack.sid",)
+
+# Attributi accettati da WebDriver.add_cookie
+_COOKIE_FIELDS = ("name", "value", "path", "domain", "secure", "httpOnly", "expiry", "sameSite")
+_SAME_SITE = {"strict": "Strict", "lax": "Lax", "none": "None", "no_restriction": "None"}
+
+# Percorsi della pagina di accesso a cui Substack rimanda senza una sessione valida
+_LOGIN_PATH_RE = re.compile(r"sign-?in|log-?in", re.IGNORECASE)
+
+_cookies_lock = threading.Lock()
+
+
+def get_base_url():
+    """Restituisce l'URL base di Substack (configurabile con SUBSTACK_BASE_URL)."""
+    return (os.getenv("SUBSTACK_BASE_URL") or DEFAULT_BASE_URL).rstrip("/")
+
+
+class SessionError(Exception):
+    """La sessione Substack non è utilizzabile (cookie mancanti, scaduti o rifiutati)."""
+
+
+def load_cookies(cookies_file=COOKIES_FILE):
+    """
+    Legge il file dei cookie.
+
+    Raises:
+        SessionError: Se il file manca o non è una lista JSON di cookie.
+    """
+    if not os.path.exists(cookies_file):
+        raise SessionError(f"File cookies non trovato: {cookies_file}")
+    try:
+        with open(cookies_file, "r") as f:
+            cookies = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        raise SessionError(f"File cookies non valido ({cookies_file}): {e}")
+    if not isinstance(cookies, list):
+        raise SessionError(f"File cookies non valido ({cookies_file}): attesa una lista di cookie")
+    return cookies
+
+
+def cookie_expiry(cookie):
+    """
+    Scadenza di un cookie come timestamp epoch, o None per i cookie di sessione.
+
+    Accetta sia il formato di Selenium (`expiry`) sia quello delle estensioni
+    del browser usate per esportare i cookie (`expirationDate`).
+    """
+    value = cookie.get("expiry", cookie.get("expirationDate"))
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def normalize_cookie(cookie):
+    """Riduce un cookie ai soli attributi accettati da WebDriver.add_cookie."""
+    normalized = {key: cookie[key] for key in _COOKIE_FIELDS if cookie.get(key) is not None}
+    expiry = cookie_expiry(cookie)
+    if expiry is not None:
+        normalized["expiry"] = int(expiry)
+    same_site = _SAME_SITE.get(str(cookie.get("sameSite", "")).lower())
+    if same_site:
+        normalized["sameSite"] = same_site
+    else:
+        normalized.pop("sameSite", None)
+    return normalized
+
+
+def check_cookies(cookies, min_validity=0, now=None):
+    """
+    Verifica offline i cookie di sessione.
+
+    Args:
+        cookies (list): I cookie letti da cookies.json.
+        min_validity (float): Secondi per cui la sessione deve restare valida
+            (es. la durata prevista del batch).
+        now (float): Istante di riferimento (default: adesso).
+
+    Returns:
+        list: I problemi trovati; vuota se i cookie sono utilizzabili.
+    """
+    now = time.time() if now is None else now
+    by_name = {cookie.get("name"): cookie for cookie in cookies if isinstance(cookie, dict)}
+    problems = []
+    for name in REQUIRED_COOKIES:
+        cookie = by_name.get(name)
+        if cookie is None or not cookie.get("value"):
+            problems.append(f"cookie '{name}' mancante")
+            continue
+        expiry = cookie_expiry(cookie)
+        if expiry is None:
+            continue
+        if expiry <= now:
+            problems.append(f"cookie '{name}' scaduto il {time.strftime('%d/%m/%Y %H:%M', time.localtime(expiry))}")
+        elif expiry < now + min_validity:
+            problems.append(f"cookie '{name}' scade tra {(expiry - now) / 60:.0f} minuti, prima della fine del batch")
+    return problems
+
+
+def _probe(url, cookie_header, timeout):
+    import requests
+
+    response = requests.get(url, headers={"Cookie": cookie_header}, allow_redirects=False, timeout=timeout)
+    if response.status_code >= 500 or response.status_code == 429:
+        response.raise_for_status()
+    return response
+
+
+def probe_session(cookies, base_url=None, timeout=10):
+    """
+    Verifica la sessione con una sola richiesta a /publish, senza seguire i redirect.
+
+    Un utente autenticato viene di solito reindirizzato alla dashboard della
+    sua pubblicazione: la sessione è rifiutata solo se il redirect porta alla
+    pagina di accesso.
+
+    Returns:
+        tuple: (True se la sessione è valida, descrizione dell'esito).
+    """
+    url = f"{(base_url or get_base_url()).rstrip('/')}/publish"
+    cookie_header = "; ".join(f"{c['name']}={c['value']}" for c in cookies if c.get("name") and "value" in c)
+    response = resilience.call("substack.probe", _probe, url, cookie_header, timeout)
+    if response.status_code == 200:
+        return True, "sessione valida"
+    if response.is_redirect:
+        location = response.headers.get("Location", "")
+        if not location or _LOGIN_PATH_RE.search(urlparse(location).path):
+            return False, f"reindirizzato a {location or '?'} (login richiesto)"
+        return True, f"sessione valida (reindirizzato a {location})"
+    return False, f"risposta HTTP {response.status_code}"
+
+
+def preflight(cookies_file=COOKIES_FILE, min_validity=0, probe=True):
+    """
+    Controlla i cookie prima di avviare Chrome.
+
+    Returns:
+        list: I cookie, pronti per login_with_cookies.
+
+    Raises:
+        SessionError: Se i cookie mancano, sono scaduti o Substack li rifiuta.
+    """
+    start = time.perf_counter()
+    cookies = load_cookies(cookies_file)
+    problems = check_cookies(cookies, min_validity)
+    if problems:
+        raise SessionError(f"Sessione Substack non valida: {'; '.join(problems)}")
+    if probe:
+        try:
+            valid, detail = probe_session(cookies)
+        except Exception as e:
+            raise SessionError(f"Verifica della sessione Substack non riuscita: {e}")
+        if not valid:
+            raise SessionError(f"Sessione Substack rifiutata: {detail}")
+    logger.info(f"Sessione Substack verificata in {(time.perf_counter() - start) * 1000:.0f} ms")
+    return cookies
+
+
+def save_cookies(browser_cookies, cookies_file=COOKIES_FILE):
+    """
+    Aggiorna cookies.json con i cookie restituiti dal browser, in modo atomico.
+
+    I cookie vengono uniti per (nome, dominio) a quelli già salvati: il browser
+    restituisce solo quelli del dominio corrente. Il file viene scritto in un
+    file temporaneo e poi sostituito, quindi non resta mai a metà.
+    """
+    with _cookies_lock:
+        try:
+            existing = load_cookies(cookies_file)
+        except SessionError:
+            existing = []
+        merged = {(c.get("name"), c.get("domain")): normalize_cookie(c) for c in existing if isinstance(c, dict)}
+        for cookie in browser_cookies:
+            merged[(cookie.get("name"), cookie.get("domain"))] = normalize_cookie(cookie)
+
+        directory = os.path.dirname(os.path.abspath(cookies_file))
+        fd, tmp_path = tempfile.mkstemp(prefix=".cookies-", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(list(merged.values()), f, indent=2)
+            os.replace(tmp_path, cookies_file)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+    logger.info(f"Cookie aggiornati salvati in {cookies_file}")
+
+
+def main():
+    from app.logging_setup import setup_logging
+    setup_logging()
+
+    cookies_file = sys.argv[1] if len(sys.argv) > 1 else COOKIES_FILE
+    try:
+        preflight(cookies_file)
+    except SessionError as e:
+        logger.error(str(e))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,7 @@
 
 import os
-```python
-import json
 import time
+import fcntl
 import logging
 import tempfile
 from selenium import webdriver
@@ -19,10 +18,74 @@ from selenium.common.exceptions import (
 )
 from webdriver_manager.chrome import ChromeDriverManager
 
+from app import resilience, session
+from app.session import DEFAULT_BASE_URL, get_base_url
+from app.profiling import StageProfiler
+
 logger = logging.getLogger(__name__)
 
-def setup_driver_for_replit():
-    """Configura il driver Chrome specificamente per l'ambiente Replit."""
+# Risorse non necessarie per creare una bozza, bloccate in modalità leggera
+BLOCKED_URL_PATTERNS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico",
+    "*.woff", "*.woff2", "*.ttf", "*.otf",
+    "*.mp4", "*.webm", "*.mp3",
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+    "*facebook.net*", "*connect.facebook.com*", "*segment.io*", "*segment.com*",
+    "*sentry.io*", "*intercom.io*", "*hotjar.com*", "*analytics*",
+]
+
+# Profili Chrome persistenti (cache calda tra un upload e l'altro), uno per worker
+BROWSER_PROFILE_DIR = os.path.join("cache", "chrome-profile")
+# File di lock in ogni directory di profilo: vale tra thread e tra processi diversi
+PROFILE_LOCK_FILE = ".lock"
+
+def lean_browser_enabled():
+    """Modalità leggera attiva se SUBSTACK_LEAN_BROWSER è impostata (1, true, si)."""
+    return os.getenv("SUBSTACK_LEAN_BROWSER", "").strip().lower() in ("1", "true", "yes", "si", "sì")
+
+def _acquire_profile_dir(base_dir):
+    """
+    Riserva una directory di profilo libera: Chrome non condivide un profilo tra due istanze.
+    
+    Ogni `worker-N` viene rivendicata con un lock esclusivo (flock) sul suo
+    file `.lock`, così la pagina Streamlit e un batch avviati insieme non
+    usano lo stesso profilo. Il sistema rilascia il lock anche se il processo
+    termina senza chiudere il driver.
+    
+    Returns:
+        tuple: (file di lock da passare a _release_profile_dir, percorso del profilo).
+    """
+    slot = 0
+    while True:
+        path = os.path.abspath(os.path.join(base_dir, f"worker-{slot}"))
+        os.makedirs(path, exist_ok=True)
+        lock = open(os.path.join(path, PROFILE_LOCK_FILE), "a")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock.close()
+            slot += 1
+            continue
+        return lock, path
+
+def _release_profile_dir(lock):
+    try:
+        fcntl.flock(lock, fcntl.LOCK_UN)
+    finally:
+        lock.close()
+
+def setup_driver_for_replit(lean=None, profile_dir=BROWSER_PROFILE_DIR):
+    """
+    Configura il driver Chrome specificamente per l'ambiente Replit.
+    
+    In modalità leggera (`lean`, default da SUBSTACK_LEAN_BROWSER) la pagina
+    è considerata pronta al DOMContentLoaded, immagini, font, media e script di
+    tracciamento vengono bloccati via DevTools e il profilo resta su disco in
+    `profile_dir` per riusare la cache.
+    """
+    if lean is None:
+        lean = lean_browser_enabled()
+    
     options = Options()
     options.add_argument('--no-sandbox')
     options.add_argument('--disable-dev-shm-usage')
@@ -32,77 +95,104 @@ def setup_driver_for_replit():
     options.add_argument('--disable-extensions')
     options.add_argument('--disable-infobars')
     
+    profile_lock = None
+    if lean:
+        options.page_load_strategy = 'eager'
+        options.add_argument('--blink-settings=imagesEnabled=false')
+        options.add_argument('--disable-background-networking')
+        options.add_argument('--disable-component-update')
+        options.add_argument('--disable-default-apps')
+        options.add_argument('--disable-sync')
+        options.add_argument('--no-first-run')
+        options.add_argument('--mute-audio')
+        options.add_experimental_option("prefs", {
+            "profile.managed_default_content_settings.images": 2,
+            "profile.default_content_setting_values.notifications": 2,
+        })
+        profile_lock, profile_path = _acquire_profile_dir(profile_dir)
+        options.add_argument(f'--user-data-dir={profile_path}')
+    
     # Installa ChromeDriver
     try:
         service = Service(ChromeDriverManager().install())
         driver = webdriver.Chrome(service=service, options=options)
-        logger.info("Driver Chrome inizializzato correttamente")
+        driver.profile_lock = profile_lock
+        if lean:
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
+        logger.info(f"Driver Chrome inizializzato correttamente{' (modalità leggera)' if lean else ''}")
         return driver
     except Exception as e:
+        if profile_lock is not None:
+            _release_profile_dir(profile_lock)
         logger.error(f"Errore nell'inizializzazione del driver Chrome: {str(e)}")
         raise
 
-def wait_and_click(driver, selector, timeout=10, max_retries=3):
-    """Attende che un elemento sia cliccabile e lo clicca con tentativi ripetuti."""
-    for attempt in range(max_retries):
-        try:
-            element = WebDriverWait(driver, timeout).until(
-                EC.element_to_be_clickable((By.CSS_SELECTOR, selector))
-            )
-            element.click()
-            return element
-        except (TimeoutException, ElementNotInteractableException, StaleElementReferenceException) as e:
-            if attempt < max_retries - 1:
-                wait_time = 2 ** attempt
-                logger.warning(f"Tentativo {attempt+1}/{max_retries} fallito per click su '{selector}'. Attendo {wait_time}s. Errore: {str(e)}")
-                time.sleep(wait_time)
-            else:
-                logger.error(f"Impossibile cliccare su '{selector}' dopo {max_retries} tentativi. Errore: {str(e)}")
-                raise
-
-def wait_for_element(driver, selector, timeout=10, max_retries=3):
-    """Attende che un elemento sia presente con tentativi ripetuti."""
-    for attempt in range(max_retries):
-        try:
-            element = WebDriverWait(driver, timeout).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, selector))
-            )
-            return element
-        except TimeoutException as e:
-            if attempt < max_retries - 1:
-                wait_time = 2 ** attempt
-                logger.warning(f"Tentativo {attempt+1}/{max_retries} fallito per trovare '{selector}'. Attendo {wait_time}s")
-                time.sleep(wait_time)
-            else:
-                logger.error(f"Impossibile trovare '{selector}' dopo {max_retries} tentativi")
-                raise
+def quit_driver(driver):
+    """Chiude il driver e libera la sua directory di profilo."""
+    try:
+        driver.quit()
+    finally:
+        lock = getattr(driver, "profile_lock", None)
+        if lock is not None:
+            _release_profile_dir(lock)
+
+def wait_and_click(driver, selector, timeout=10, max_retries=3, optional=False):
+    """
+    Attende che un elemento sia cliccabile e lo clicca con tentativi ripetuti.
+    
+    Con optional=True l'elemento può mancare: un solo tentativo, fuori
+    dall'endpoint "substack.page", così un'assenza prevista non consuma il
+    budget di retry né apre il circuito per gli altri worker.
+    """
+    def click():
+        element = WebDriverWait(driver, timeout).until(
+            EC.element_to_be_clickable((By.CSS_SELECTOR, selector))
+        )
+        element.click()
+        return element
+    
+    if optional:
+        return click()
+    try:
+        return resilience.get_endpoint("substack.page").call(click, max_attempts=max_retries)
+    except Exception as e:
+        logger.error(f"Impossibile cliccare su '{selector}' dopo {max_retries} tentativi. Errore: {str(e)}")
+        raise
+
+def wait_for_element(driver, selector, timeout=10, max_retries=3, optional=False):
+    """Attende che un elemento sia presente con tentativi ripetuti (optional: vedi wait_and_click)."""
+    def find():
+        return WebDriverWait(driver, timeout).until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, selector))
+        )
+    
+    if optional:
+        return find()
+    try:
+        return resilience.get_endpoint("substack.page").call(find, max_attempts=max_retries)
+    except Exception as e:
+        logger.error(f"Impossibile trovare '{selector}' dopo {max_retries} tentativi")
+        raise
 
 def login_with_cookies(driver, cookies_file):
     """Effettua il login su Substack usando i cookies salvati."""
     try:
         # Carica i cookies
-        if not os.path.exists(cookies_file):
-            logger.error(f"File cookies non trovato: {cookies_file}")
-            raise FileNotFoundError(f"File cookies non trovato: {cookies_file}")
-        
-        with open(cookies_file, 'r') as f:
-            cookies = json.load(f)
+        cookies = session.load_cookies(cookies_file)
         
         # Vai alla pagina principale di Substack
-        driver.get('https://substack.com/')
+        driver.get(f'{get_base_url()}/')
         
-        # Aggiungi i cookies
+        # Aggiungi i cookies, ridotti agli attributi accettati da Selenium
         for cookie in cookies:
-            # Alcuni cookies potrebbero avere attributi incompatibili
             try:
-                if 'expiry' in cookie:
-                    cookie['expiry'] = int(cookie['expiry'])
-                driver.add_cookie(cookie)
+                driver.add_cookie(session.normalize_cookie(cookie))
             except Exception as e:
                 logger.warning(f"Impossibile aggiungere cookie: {str(e)}")
         
         # Ricarica la pagina per applicare i cookies
-        driver.get('https://substack.com/publish')
+        driver.get(f'{get_base_url()}/publish')
         time.sleep(3)
         
         # Verifica login
@@ -121,12 +211,12 @@ def create_draft_post(driver, title, content):
     """Crea un nuovo post come bozza su Substack."""
     try:
         # Vai alla pagina di creazione post
-        driver.get('https://substack.com/publish')
+        driver.get(f'{get_base_url()}/publish')
         time.sleep(3)
         
         # Attendi e clicca su New Post se necessario
         try:
-            new_post_button = wait_for_element(driver, "a[href='/publish/post']", timeout=5)
+            new_post_button = wait_for_element(driver, "a[href='/publish/post']", timeout=5, optional=True)
             new_post_button.click()
             time.sleep(2)
         except Exception as e:
@@ -141,11 +231,11 @@ def create_draft_post(driver, title, content):
         # Switch to Markdown editor
         try:
             # Apri menu editor
-            editor_menu = wait_and_click(driver, "button.editor-menu-button")
+            editor_menu = wait_and_click(driver, "button.editor-menu-button", optional=True)
             time.sleep(1)
             
             # Seleziona Markdown
-            markdown_option = wait_and_click(driver, "button[data-format='markdown']")
+            markdown_option = wait_and_click(driver, "button[data-format='markdown']", optional=True)
             time.sleep(2)
         except Exception as e:
             logger.warning(f"Impossibile passare all'editor Markdown. Errore: {str(e)}")
@@ -172,27 +262,37 @@ def create_draft_post(driver, title, content):
         logger.error(f"Errore durante la creazione del post: {str(e)}")
         return False
 
-def publish_post_to_substack(title, markdown_content, cookies_file="cookies.json"):
+def publish_post_to_substack(title, markdown_content, cookies_file="cookies.json", profiler=None):
     """Funzione principale per pubblicare un post su Substack."""
     driver = None
     success = False
+    profiler = profiler or StageProfiler()
     
     try:
         logger.info(f"Avvio pubblicazione su Substack: {title}")
         
         # Inizializza il driver
-        driver = setup_driver_for_replit()
+        with profiler.stage("setup_driver", title):
+            driver = setup_driver_for_replit()
         
         # Login con cookies
-        if not login_with_cookies(driver, cookies_file):
+        with profiler.stage("login_with_cookies", title):
+            logged_in = login_with_cookies(driver, cookies_file)
+        if not logged_in:
             logger.error("Login su Substack fallito")
             return False
         
         # Crea il post
-        success = create_draft_post(driver, title, markdown_content)
+        with profiler.stage("create_draft_post", title):
+            success = create_draft_post(driver, title, markdown_content)
         
         if success:
             logger.info(f"Post '{title}' pubblicato con successo come bozza su Substack")
+            # Conserva i cookie rinnovati da Substack per le sessioni successive
+            try:
+                session.save_cookies(driver.get_cookies(), cookies_file)
+            except Exception as e:
+                logger.warning(f"Impossibile salvare i cookie aggiornati: {str(e)}")
         else:
             logger.error(f"Pubblicazione di '{title}' fallita")
         
@@ -205,25 +305,31 @@ def publish_post_to_substack(title, markdown_content, cookies_file="cookies.json
     finally:
         # Chiudi sempre il driver
         if driver:
-            driver.quit()
+            quit_driver(driver)
             logger.info("Driver Chrome chiuso")
 
 # Per esecuzione diretta dello script
 if __name__ == "__main__":
     import argparse
     
+    from app.logging_setup import setup_logging
+    
     # Configurazione logging base
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s"
-    )
+    setup_logging()
     
     parser = argparse.ArgumentParser(description="Pubblica un post su Substack come bozza")
     parser.add_argument("--title", required=True, help="Titolo del post")
     parser.add_argument("--file", required=True, help="File markdown da pubblicare")
     parser.add_argument("--cookies", default="cookies.json", help="File cookies per il login")
+    parser.add_argument("--profile", action="store_true", help="Raccoglie profili CPU e allocazioni per ogni fase")
+    parser.add_argument("--profile-dir", default="profiles", help="Directory in cui salvare i profili")
+    parser.add_argument("--lean-browser", action="store_true",
+                        help="Blocca immagini, font e tracciamento e riusa un profilo Chrome persistente")
     
     args = parser.parse_args()
+    if args.lean_browser:
+        os.environ["SUBSTACK_LEAN_BROWSER"] = "1"
+    profiler = StageProfiler(enabled=args.profile, output_dir=args.profile_dir)
     
     # Leggi il contenuto del file
     try:
@@ -234,7 +340,9 @@ if __name__ == "__main__":
         exit(1)
     
     # Pubblica
-    result = publish_post_to_substack(args.title, content, args.cookies)
+    result = publish_post_to_substack(args.title, content, args.cookies, profiler=profiler)
+    profiler.report()
+    profiler.save()
     
     if result:
         print(f"✅ Post '{args.title}' pubblicato con successo come bozza")
@@ -1,8 +1,5 @@
 import re
-import time
 import logging
-from bs4 import BeautifulSoup
-import html2text
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +17,9 @@ def process_html_content(html_content):
         if not html_content:
             return ""
             
+        # Import locale: BeautifulSoup serve solo quando si converte davvero
+        from bs4 import BeautifulSoup
+        
         # Usa BeautifulSoup per analizzare l'HTML
         soup = BeautifulSoup(html_content, 'html.parser')
         
@@ -70,6 +70,8 @@ def convert_html_to_markdown(html_content):
         str: Il contenuto in formato markdown.
     """
     try:
+        import html2text
+        
         # Crea un'istanza del convertitore html2text
         h = html2text.HTML2Text()
         h.ignore_links = False
@@ -85,28 +87,47 @@ def convert_html_to_markdown(html_content):
         logger.error(f"Errore nella conversione HTML->Markdown: {e}")
         return ""
 
-def retry_function(func, max_retries=3, delay=2, *args, **kwargs):
+def retry_function(func, *args, max_retries=3, delay=2, **kwargs):
     """
-    Ritenta l'esecuzione di una funzione in caso di errore.
+    Ritenta l'esecuzione di una funzione in caso di errore transitorio.
+    
+    Mantenuta per compatibilità: usa l'endpoint 'default' di app.resilience
+    (backoff esponenziale con jitter a partire da `delay`). Gli errori non
+    ritentabili vengono rilanciati subito.
     
     Args:
         func: La funzione da eseguire.
-        max_retries (int): Numero massimo di tentativi.
-        delay (int): Ritardo tra i tentativi in secondi.
         *args: Argomenti posizionali da passare alla funzione.
+        max_retries (int): Numero massimo di tentativi.
+        delay (int): Ritardo base tra i tentativi in secondi.
         **kwargs: Argomenti nominali da passare alla funzione.
         
     Returns:
         Il risultato della funzione.
     """
-    retries = 0
-    while retries < max_retries:
-        try:
-            return func(*args, **kwargs)
-        except Exception as e:
-            retries += 1
-            logger.warning(f"Tentativo {retries}/{max_retries} fallito: {e}")
-            if retries >= max_retries:
-                logger.error(f"Tutti i tentativi falliti: {e}")
-                raise
-            time.sleep(delay)
+    from app.resilience import get_endpoint
+    return get_endpoint("default").call(func, args, kwargs, max_attempts=max_retries, base_delay=delay)
+
+def chunk_text(text, chunk_size):
+    """
+    Divide un testo in blocchi di al massimo `chunk_size` caratteri, tagliando
+    preferibilmente a fine riga.
+    
+    Args:
+        text (str): Il testo da dividere.
+        chunk_size (int): Dimensione massima di ogni blocco.
+        
+    Returns:
+        list: I blocchi, nell'ordine originale.
+    """
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + chunk_size, len(text))
+        if end < len(text):
+            newline = text.rfind('\n', start, end)
+            if newline > start:
+                end = newline + 1
+        chunks.append(text[start:end])
+        start = end
+    return chunks or [""]
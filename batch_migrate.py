@@ -5,26 +5,32 @@ import time
 import logging
 import sys
 import random
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
 
 # Aggiungi il path della cartella corrente
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from app.utils import process_html_content
-from app.substack_bot import publish_post_to_substack
-
-# Configura il logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
-    handlers=[
-        logging.FileHandler("logs/batch_migrate.log"),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+from app import brevo, replay, resilience, session
+from app.utils import process_html_content, convert_html_to_markdown
+from app.profiling import StageProfiler
+from app.archive import ARCHIVE_FILE, get_archive
+from app.history import get_history, record_attempt
+from app.fingerprint import FINGERPRINT_FILE, FingerprintIndex
+from app.links import LINKS_FILE, LinkResolver
+from app.models import Campaign, clean_title
+from app.reorder import DEFAULT_WINDOW, ReorderBuffer
+from app.logging_setup import setup_logging
 
 logger = logging.getLogger(__name__)
 
+# Serializza gli aggiornamenti di exported_posts.json tra più worker
+_ledger_lock = threading.Lock()
+
+# Durata massima stimata di un post (upload più pausa), per la validità richiesta ai cookie
+SECONDS_PER_POST = 300
+
 def load_config():
     """Carica la configurazione dal file .env."""
     config = {}
@@ -36,85 +42,373 @@ def load_config():
                     config[key] = value
     return config
 
-def get_pending_campaigns(api_key):
-    """Ottiene le campagne in attesa di migrazione."""
-    import requests
+def get_pending_campaigns(api_key, fingerprints=None):
+    """Ottiene le campagne in attesa di migrazione, come Campaign."""
+    campaigns = brevo.get_campaigns(api_key, status="sent")
+    
+    # Filtra le campagne non ancora esportate e i duplicati già riconosciuti
+    try:
+        uploaded_ids = get_history().uploaded_ids()
+    except Exception as e:
+        logger.warning(f"Storico non disponibile, contano solo le voci del batch: {e}")
+        uploaded_ids = set()
+    skip_ids = load_exported_ids(uploaded_ids=uploaded_ids)
+    if fingerprints is not None:
+        skip_ids |= fingerprints.duplicate_ids()
+    pending_campaigns = [Campaign.from_brevo(c) for c in campaigns if c['id'] not in skip_ids]
+    
+    # Prima le campagne inviate per prime: il batch procede in ordine cronologico
+    pending_campaigns.sort(key=lambda campaign: campaign.sort_key)
+    return pending_campaigns
+
+def load_exported_ids(ledger_file='exported_posts.json', uploaded_ids=None):
+    """
+    Restituisce l'insieme degli ID delle campagne già migrate su Substack.
+    
+    La pagina Migrazione registra anche le campagne solo convertite: una voce
+    conta se è stata scritta dal batch (`exported_date`), se è marcata
+    `uploaded` o se lo storico registra un upload riuscito (`uploaded_ids`).
+    """
+    if not os.path.exists(ledger_file):
+        return set()
+    with open(ledger_file, 'r') as f:
+        exported = json.load(f)
+    uploaded_ids = uploaded_ids or set()
+    exported_ids = set()
+    for post in exported:
+        if not isinstance(post, dict) or post.get('id') is None:
+            continue
+        # Le vecchie esportazioni dalla pagina Migrazione salvavano l'ID come stringa
+        campaign_id = int(post['id']) if str(post['id']).isdigit() else post['id']
+        if 'exported_date' in post or post.get('uploaded') or campaign_id in uploaded_ids:
+            exported_ids.add(campaign_id)
+    return exported_ids
+
+def get_campaign_content(api_key, campaign_id):
+    """Ottiene il contenuto di una campagna specifica."""
+    campaign_details = brevo.get_campaign(api_key, campaign_id)
+    # Conserva una copia locale per poter rigiocare la conversione offline (--replay)
+    replay.save_to_cache(campaign_details)
+    return campaign_details
+
+def mark_as_exported(campaign_id, title):
+    """Marca una campagna come esportata."""
+    with _ledger_lock:
+        exported = []
+        if os.path.exists('exported_posts.json'):
+            with open('exported_posts.json', 'r') as f:
+                exported = json.load(f)
+        
+        # Aggiungi il nuovo post
+        exported.append({
+            'id': campaign_id,
+            'title': title,
+            'exported_date': datetime.now().isoformat()
+        })
+        
+        # Salva il file aggiornato
+        with open('exported_posts.json', 'w') as f:
+            json.dump(exported, f, indent=4)
     
-    headers = {
-        'accept': 'application/json',
-        'api-key': api_key
-    }
+    logger.info(f"Newsletter '{title}' (ID: {campaign_id}) marcata come esportata")
+
+def prepare_campaign(campaign_id, title, html_content, profiler, fingerprints=None, links=None):
+    """
+    Prima parte della pipeline, eseguibile in parallelo: pulizia, link, impronta e conversione.
     
-    # Fetch campaigns
-    url = 'https://api.brevo.com/v3/emailCampaigns?status=sent&limit=100'
-    response = requests.get(url, headers=headers)
-    response.raise_for_status()
+    Args:
+        campaign_id: ID della campagna Brevo.
+        title (str): Titolo già pulito del post.
+        html_content (str): HTML originale della campagna.
+        profiler (StageProfiler): Profiler che misura le fasi.
+        fingerprints (FingerprintIndex): Indice delle impronte; se presente, i duplicati vengono saltati.
+        links (LinkResolver): Se presente, i link di tracciamento di Brevo vengono sostituiti
+            con la loro destinazione.
+        
+    Returns:
+        dict: HTML pulito, Markdown e impronta; None se la campagna è un duplicato.
+    """
+    # Pulisci l'HTML e converti in Markdown
+    with profiler.stage("process_html_content", campaign_id):
+        processed_html = process_html_content(html_content)
     
-    campaigns = response.json().get('campaigns', [])
+    if links is not None:
+        with profiler.stage("rewrite_links", campaign_id):
+            processed_html = links.unwrap(processed_html)
     
-    # Carica le campagne già esportate
-    exported_ids = []
-    if os.path.exists('exported_posts.json'):
-        with open('exported_posts.json', 'r') as f:
-            exported = json.load(f)
-            exported_ids = [post.get('id') for post in exported]
+    # Salta reinvii, varianti A/B e copie per lista prima di convertire e caricare
+    content_fingerprint = None
+    if fingerprints is not None:
+        with profiler.stage("fingerprint", campaign_id):
+            content_fingerprint, original_id = fingerprints.check(campaign_id, title, processed_html)
+        if original_id is not None:
+            return None
     
-    # Filtra le campagne non ancora esportate
-    pending_campaigns = [c for c in campaigns if c['id'] not in exported_ids]
+    with profiler.stage("convert_html_to_markdown", campaign_id):
+        markdown_content = convert_html_to_markdown(processed_html)
     
-    return pending_campaigns
+    return {"html": processed_html, "markdown": markdown_content, "fingerprint": content_fingerprint}
 
-def get_campaign_content(api_key, campaign_id):
-    """Ottiene il contenuto di una campagna specifica."""
-    import requests
+def commit_campaign(campaign_id, title, prepared, profiler, dry_run=False, archive=None, publish=None,
+                    mark_exported=True, sent_date=None, fingerprints=None):
+    """
+    Seconda parte della pipeline, eseguita in ordine: salvataggio, upload e registrazione.
+    
+    L'impronta viene confrontata di nuovo con l'indice: con più worker, un
+    duplicato può essere stato preparato prima che l'originale (più vecchio)
+    venisse caricato.
+    
+    Args:
+        prepared (dict): Il risultato di prepare_campaign.
+        (gli altri come migrate_campaign)
+        
+    Returns:
+        bool: True se la campagna è stata caricata (o salvata, in dry-run);
+        None se è stata saltata perché duplicata.
+    """
+    if fingerprints is not None and fingerprints.check_value(campaign_id, title, prepared["fingerprint"]):
+        return None
+    
+    # Salva nell'archivio locale
+    if archive is None:
+        archive = get_archive()
+    with profiler.stage("save", campaign_id):
+        archive.put(title, markdown=prepared["markdown"], html=prepared["html"],
+                    campaign_id=campaign_id, sent_date=sent_date)
+    
+    logger.info(f"Newsletter '{title}' convertita e salvata in {archive.path}")
     
-    headers = {
-        'accept': 'application/json',
-        'api-key': api_key
-    }
+    if dry_run:
+        logger.info(f"Dry-run: upload di '{title}' saltato")
+        if fingerprints is not None:
+            fingerprints.add(campaign_id, title, prepared["fingerprint"])
+        return True
     
-    url = f'https://api.brevo.com/v3/emailCampaigns/{campaign_id}'
-    response = requests.get(url, headers=headers)
-    response.raise_for_status()
+    # Upload su Substack (Selenium viene importato solo se serve davvero)
+    if publish is None:
+        from app.substack_bot import publish_post_to_substack as publish
+    upload_start = time.perf_counter()
+    with profiler.stage("publish_post_to_substack", campaign_id):
+        success = publish(title, prepared["markdown"], profiler=profiler)
+    if mark_exported:
+        record_attempt(campaign_id, title, success, None if success else "Upload su Substack non riuscito",
+                       time.perf_counter() - upload_start, text=prepared["markdown"] if success else None)
     
-    return response.json()
+    if success:
+        logger.info(f"✅ '{title}' caricato su Substack come bozza")
+        if fingerprints is not None:
+            fingerprints.add(campaign_id, title, prepared["fingerprint"])
+        # Marca come esportato
+        if mark_exported:
+            mark_as_exported(campaign_id, title)
+    else:
+        logger.error(f"❌ Errore nel caricamento di '{title}' su Substack")
+    
+    return success
 
-def clean_title(title):
-    """Rimuove prefissi come 'Cronache dal Consiglio n° xxx -' dal titolo."""
-    import re
-    # Rimuovi prefissi specifici
-    title = re.sub(r'^Cronache\s+dal\s+Consiglio\s+n°\s*\d+\s*-\s*', '', title)
-    # Rimuovi spazi extra
-    title = re.sub(r'\s+', ' ', title).strip()
-    return title
+def migrate_campaign(campaign_id, title, html_content, profiler, dry_run=False, archive=None,
+                     publish=None, mark_exported=True, sent_date=None, fingerprints=None, links=None):
+    """
+    Converte una campagna in Markdown, la salva e la carica su Substack.
+    
+    Args:
+        campaign_id: ID della campagna Brevo.
+        title (str): Titolo già pulito del post.
+        html_content (str): HTML originale della campagna.
+        profiler (StageProfiler): Profiler che misura le fasi.
+        dry_run (bool): Se vero, salta l'upload e non aggiorna exported_posts.json.
+        archive (Archive): Archivio in cui salvare Markdown e HTML (default: archive.db).
+        publish: Funzione di upload (default: publish_post_to_substack).
+        mark_exported (bool): Se falso, non aggiorna exported_posts.json.
+        sent_date (str): sentDate della campagna, salvata nei metadati dell'archivio.
+        fingerprints (FingerprintIndex): Indice delle impronte; se presente, i duplicati vengono saltati.
+        links (LinkResolver): Se presente, i link di tracciamento di Brevo vengono sostituiti
+            con la loro destinazione.
+        
+    Returns:
+        bool: True se la campagna è stata caricata (o convertita, in dry-run) o saltata come duplicato.
+    """
+    prepared = prepare_campaign(campaign_id, title, html_content, profiler, fingerprints, links)
+    if prepared is None:
+        return True
+    result = commit_campaign(campaign_id, title, prepared, profiler, dry_run=dry_run, archive=archive,
+                             publish=publish, mark_exported=mark_exported, sent_date=sent_date,
+                             fingerprints=fingerprints)
+    return result is None or result
 
-def mark_as_exported(campaign_id, title):
-    """Marca una campagna come esportata."""
-    exported = []
-    if os.path.exists('exported_posts.json'):
-        with open('exported_posts.json', 'r') as f:
-            exported = json.load(f)
-    
-    # Aggiungi il nuovo post
-    exported.append({
-        'id': campaign_id,
-        'title': title,
-        'exported_date': datetime.now().isoformat()
-    })
-    
-    # Salva il file aggiornato
-    with open('exported_posts.json', 'w') as f:
-        json.dump(exported, f, indent=4)
+def process_campaigns(campaigns, fetch_details, profiler, dry_run=False, publish=None,
+                      mark_exported=True, pause=True, archive=None, fingerprints=None, links=None,
+                      workers=1, reorder_window=DEFAULT_WINDOW):
+    """
+    Esegue la pipeline su una lista di campagne.
     
-    logger.info(f"Newsletter '{title}' (ID: {campaign_id}) marcata come esportata")
+    Download, pulizia e conversione girano su `workers` thread in ordine
+    sparso; salvataggio e upload avvengono su questo thread, uno alla volta e
+    in ordine di data di invio, attraverso un buffer di riordino.
+    
+    Args:
+        campaigns (list): Campagne da elaborare (Campaign).
+        fetch_details: Funzione che data una Campaign ne restituisce i dettagli con htmlContent.
+        profiler (StageProfiler): Profiler che misura le fasi.
+        dry_run (bool): Se vero, salta l'upload.
+        publish: Funzione di upload (default: publish_post_to_substack).
+        mark_exported (bool): Se falso, non aggiorna exported_posts.json.
+        pause (bool): Se vero, attende 1-3 minuti tra un upload e l'altro.
+        archive (Archive): Archivio in cui salvare i post convertiti.
+        fingerprints (FingerprintIndex): Indice delle impronte per saltare i duplicati.
+        links (LinkResolver): Resolver dei link di tracciamento di Brevo.
+        workers (int): Thread per download e conversione.
+        reorder_window (int): Risultati pronti oltre i quali una campagna lenta viene saltata
+            e caricata appena pronta, fuori ordine.
+        
+    Returns:
+        ReorderBuffer: Il buffer usato, con le sue statistiche.
+    """
+    # Le bozze arrivano su Substack dalla campagna inviata per prima
+    campaigns = sorted(campaigns, key=lambda campaign: campaign.sort_key)
+    
+    # Download e link di tracciamento avvengono qui, per le sole campagne in lavorazione:
+    # in memoria non restano mai più di `workers` + `reorder_window` campagne
+    def prepare(campaign):
+        with profiler.stage("get_campaign_content", campaign.id):
+            campaign_details = fetch_details(campaign)
+        html_content = campaign_details.get('htmlContent', '')
+        if not html_content:
+            logger.error(f"Nessun contenuto HTML trovato per '{campaign.title}'")
+            return campaign_details, None
+        return campaign_details, prepare_campaign(campaign.id, campaign.title, html_content, profiler,
+                                                  fingerprints, links)
+    
+    def commit(i, campaign, future):
+        title = campaign.title
+        logger.info(f"Elaborazione {i+1}/{len(campaigns)}: {title}")
+        try:
+            campaign_details, prepared = future.result()
+            if prepared is None:
+                return False
+            result = commit_campaign(campaign.id, title, prepared, profiler, dry_run=dry_run, archive=archive,
+                                     publish=publish, mark_exported=mark_exported,
+                                     sent_date=campaign_details.get('sentDate') or campaign.sent_date,
+                                     fingerprints=fingerprints)
+            # None (duplicato) e False (upload fallito) non fanno scattare la pausa
+            return bool(result)
+        except Exception as e:
+            error_msg = f"Errore durante l'elaborazione di '{title}': {str(e)}"
+            logger.error(error_msg)
+            if mark_exported and not dry_run:
+                record_attempt(campaign.id, title, False, e)
+            return False
+    
+    buffer = ReorderBuffer(reorder_window)
+    # Campagne in lavorazione o in attesa nel buffer: oltre questo limite non se ne avviano altre
+    max_in_flight = max(1, workers) + buffer.window
+    queue = iter(enumerate(campaigns))
+    positions, pending = {}, set()
+    committed = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="prepare") as executor:
+        while True:
+            while len(pending) + len(buffer) < max_in_flight:
+                item = next(queue, None)
+                if item is None:
+                    break
+                future = executor.submit(prepare, item[1])
+                positions[future] = item[0]
+                pending.add(future)
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                buffer.put(positions.pop(future), future)
+            for i, future in buffer.pop_ready():
+                uploaded = commit(i, campaigns[i], future)
+                committed += 1
+                
+                # Pausa tra i post (1-3 minuti), solo dopo un upload vero
+                if pause and not dry_run and uploaded and committed < len(campaigns):
+                    pause_time = random.randint(60, 180)
+                    logger.info(f"Pausa di {pause_time} secondi prima del prossimo post")
+                    time.sleep(pause_time)
+    
+    return buffer
+
+def replay_campaigns(source, profiler, batch_size=None, sink="noop", sink_dir="replay", dry_run=False,
+                     archive=None, fingerprints=None, links=None, workers=1, reorder_window=DEFAULT_WINDOW):
+    """
+    Rigioca la pipeline su campagne salvate in locale, senza contattare Brevo né Substack.
+    
+    Args:
+        source (str): Cache locale, file JSON o JSONL con i dettagli delle campagne.
+        profiler (StageProfiler): Profiler che misura le fasi.
+        batch_size (int): Numero massimo di campagne (None per tutte).
+        sink (str): 'noop' scarta i post, 'file' li scrive in `sink_dir`.
+        sink_dir (str): Directory usata dal sink 'file'.
+        dry_run (bool): Se vero, salta anche l'upload verso il sink.
+        archive (Archive): Archivio in cui salvare i post convertiti.
+        fingerprints (FingerprintIndex): Indice delle impronte per saltare i duplicati.
+        links (LinkResolver): Resolver dei link di tracciamento (in replay solo dalla mappa salvata).
+        workers (int): Thread per download e conversione.
+        reorder_window (int): Finestra del buffer di riordino degli upload.
+        
+    Returns:
+        ReorderBuffer: Il buffer usato, con le sue statistiche.
+    """
+    details = {c['id']: c for c in replay.load_campaigns(source)[:batch_size]}
+    campaigns = [Campaign.from_brevo(c) for c in details.values()]
+    publish = replay.FileSink(sink_dir) if sink == "file" else replay.noop_sink
+    
+    logger.info(f"Replay di {len(campaigns)} campagne (sink: {sink})")
+    return process_campaigns(campaigns, lambda campaign: details[campaign.id], profiler, dry_run=dry_run,
+                             publish=publish, mark_exported=False, pause=False, archive=archive,
+                             fingerprints=fingerprints, links=links, workers=workers,
+                             reorder_window=reorder_window)
 
-def main(batch_size=5):
+def report_duplicates(fingerprints):
+    """Riepiloga nel log le campagne saltate perché duplicate."""
+    if fingerprints is None:
+        return
+    logger.info(f"Duplicati saltati: {len(fingerprints.skipped)}")
+    for campaign_id, title, original_id in fingerprints.skipped:
+        logger.info(f"  - '{title}' (ID: {campaign_id}) → copia della campagna {original_id}")
+
+def main(batch_size=5, profile=False, profile_dir="profiles", dry_run=False,
+         replay_source=None, sink="noop", sink_dir="replay", archive_file=ARCHIVE_FILE, dedupe=True,
+         unwrap_links=True, workers=1, reorder_window=DEFAULT_WINDOW):
     """Funzione principale per la migrazione batch."""
     logger.info(f"Avvio migrazione batch (dimensione batch: {batch_size})")
     
+    profiler = StageProfiler(enabled=profile, output_dir=profile_dir)
+    
+    archive = get_archive(archive_file)
+    
+    # Dry-run e replay usano un indice in memoria: non devono segnare duplicati nei run reali
+    fingerprints = None
+    if dedupe:
+        fingerprints = FingerprintIndex(":memory:" if dry_run or replay_source else FINGERPRINT_FILE)
+    
+    # Replay e dry-run restano offline: ogni richiesta conterebbe come un clic su Brevo
+    links = LinkResolver(LINKS_FILE, offline=bool(replay_source) or dry_run) if unwrap_links else None
+    
+    if replay_source:
+        buffer = replay_campaigns(replay_source, profiler, batch_size, sink, sink_dir, dry_run, archive,
+                                  fingerprints, links, workers, reorder_window)
+        buffer.report()
+        report_duplicates(fingerprints)
+        if links is not None:
+            links.report()
+        profiler.report()
+        profiler.save()
+        logger.info("Replay completato")
+        return
+    
     # Carica la configurazione
     config = load_config()
     
+    # Gli endpoint di Brevo e Substack possono essere sostituiti (es. server di test locali);
+    # SUBSTACK_LEAN_BROWSER attiva la modalità leggera di Chrome
+    for key in ("BREVO_API_BASE_URL", "SUBSTACK_BASE_URL", "SUBSTACK_LEAN_BROWSER"):
+        if config.get(key):
+            os.environ.setdefault(key, config[key])
+    
     # Verifica che le configurazioni necessarie siano presenti
     required_keys = [
         "BREVO_API_KEY", 
@@ -129,19 +423,17 @@ def main(batch_size=5):
         logger.error(f"Configurazione incompleta. Mancano: {', '.join(missing_keys)}")
         return
     
-    # Verifica che il file cookies.json esista
-    if not os.path.exists("cookies.json"):
-        logger.error("File cookies.json non trovato. Impossibile procedere con l'upload su Substack.")
-        return
-    
-    # Crea directory se non esistono
-    for directory in ["converted", "logs"]:
-        if not os.path.exists(directory):
-            os.makedirs(directory)
+    # Verifica i cookie di Substack prima di contattare Brevo e avviare Chrome
+    if not dry_run:
+        try:
+            session.preflight("cookies.json", min_validity=batch_size * SECONDS_PER_POST)
+        except session.SessionError as e:
+            logger.error(f"{e}. Impossibile procedere con l'upload su Substack.")
+            return
     
     # Ottieni le campagne in attesa
     try:
-        pending_campaigns = get_pending_campaigns(config["BREVO_API_KEY"])
+        pending_campaigns = get_pending_campaigns(config["BREVO_API_KEY"], fingerprints)
     except Exception as e:
         logger.error(f"Errore durante l'ottenimento delle campagne: {str(e)}")
         return
@@ -151,68 +443,57 @@ def main(batch_size=5):
     # Limita il numero di campagne al batch_size
     campaigns_to_process = pending_campaigns[:batch_size]
     
-    # Configura Cloudinary
-    cloudinary_config = {
-        "cloud_name": config["CLOUDINARY_CLOUD_NAME"],
-        "api_key": config["CLOUDINARY_API_KEY"],
-        "api_secret": config["CLOUDINARY_API_SECRET"],
-        "folder": "newsletter_migrator"
-    }
-    
-    # Processa ogni campagna
-    for i, campaign in enumerate(campaigns_to_process):
-        campaign_id = campaign['id']
-        title = clean_title(campaign['name'])
-        
-        logger.info(f"Elaborazione {i+1}/{len(campaigns_to_process)}: {title}")
-        
-        try:
-            # Ottieni contenuto HTML
-            campaign_details = get_campaign_content(config["BREVO_API_KEY"], campaign_id)
-            html_content = campaign_details.get('htmlContent', '')
-            
-            if not html_content:
-                logger.error(f"Nessun contenuto HTML trovato per '{title}'")
-                continue
-            
-            # Converti in Markdown
-            markdown_content = process_html_content(html_content, cloudinary_config, title)
-            
-            # Salva localmente
-            file_path = os.path.join("converted", f"{campaign_id}.md")
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(markdown_content)
-            
-            logger.info(f"Newsletter '{title}' convertita e salvata in {file_path}")
-            
-            # Upload su Substack
-            success = publish_post_to_substack(title, markdown_content)
-            
-            if success:
-                logger.info(f"✅ '{title}' caricato su Substack come bozza")
-                # Marca come esportato
-                mark_as_exported(campaign_id, title)
-            else:
-                logger.error(f"❌ Errore nel caricamento di '{title}' su Substack")
-            
-            # Pausa tra i post (1-3 minuti)
-            if i < len(campaigns_to_process) - 1:
-                pause_time = random.randint(60, 180)
-                logger.info(f"Pausa di {pause_time} secondi prima del prossimo post")
-                time.sleep(pause_time)
-            
-        except Exception as e:
-            error_msg = f"Errore durante l'elaborazione di '{title}': {str(e)}"
-            logger.error(error_msg)
+    api_key = config["BREVO_API_KEY"]
+    buffer = process_campaigns(campaigns_to_process, lambda campaign: get_campaign_content(api_key, campaign.id),
+                               profiler, dry_run=dry_run, archive=archive, fingerprints=fingerprints, links=links,
+                               workers=workers, reorder_window=reorder_window)
     
+    buffer.report()
+    report_duplicates(fingerprints)
+    if links is not None:
+        links.report()
+    profiler.report()
+    profiler.save()
+    resilience.report()
     logger.info("Processo batch completato")
 
 if __name__ == "__main__":
     import argparse
     
+    # Configura il logging: console leggibile e file JSON lines, scritti da un thread dedicato
+    setup_logging("logs/batch_migrate.log")
+    
     parser = argparse.ArgumentParser(description="Migrazione batch di newsletter da Brevo a Substack")
-    parser.add_argument("--batch-size", type=int, default=5, help="Numero di newsletter da migrare in questo batch")
+    parser.add_argument("--batch-size", type=int, help="Numero di newsletter da migrare in questo batch (default: 5, tutte in replay)")
+    parser.add_argument("--dry-run", action="store_true", help="Converte le newsletter senza caricarle su Substack")
+    parser.add_argument("--replay", nargs="?", const=replay.CACHE_DIR, metavar="SORGENTE",
+                        help="Rigioca offline le campagne dalla cache locale o da un archivio JSON/JSONL")
+    parser.add_argument("--sink", choices=["noop", "file"], default="noop", help="Destinazione degli upload in replay")
+    parser.add_argument("--sink-dir", default="replay", help="Directory del sink 'file'")
+    parser.add_argument("--lean-browser", action="store_true",
+                        help="Blocca immagini, font e tracciamento in Chrome e riusa un profilo persistente")
+    parser.add_argument("--no-dedupe", action="store_true",
+                        help="Migra anche le campagne quasi identiche a una già migrata")
+    parser.add_argument("--keep-tracking-links", action="store_true",
+                        help="Non sostituisce i link di tracciamento di Brevo con la loro destinazione")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Thread per download e conversione; gli upload restano uno alla volta, in ordine di invio")
+    parser.add_argument("--reorder-window", type=int, default=DEFAULT_WINDOW,
+                        help="Post pronti oltre i quali una campagna lenta viene caricata fuori ordine")
+    parser.add_argument("--archive", default=ARCHIVE_FILE, help="Archivio in cui salvare i post convertiti")
+    parser.add_argument("--profile", action="store_true", help="Raccoglie profili CPU e allocazioni per ogni fase")
+    parser.add_argument("--profile-dir", default="profiles", help="Directory in cui salvare i profili")
     
     args = parser.parse_args()
     
-    main(batch_size=args.batch_size)
+    if args.lean_browser:
+        os.environ["SUBSTACK_LEAN_BROWSER"] = "1"
+    
+    batch_size = args.batch_size
+    if batch_size is None and not args.replay:
+        batch_size = 5
+    
+    main(batch_size=batch_size, profile=args.profile, profile_dir=args.profile_dir, dry_run=args.dry_run,
+         replay_source=args.replay, sink=args.sink, sink_dir=args.sink_dir, archive_file=args.archive,
+         dedupe=not args.no_dedupe, unwrap_links=not args.keep_tracking_links,
+         workers=args.workers, reorder_window=args.reorder_window)
@@ -0,0 +1,46 @@
+import random
+
+from app.archive import Archive
+from app.utils import convert_html_to_markdown, process_html_content
+
+from benchmarks.corpus import KB, generate_campaigns
+
+CAMPAIGNS = generate_campaigns(200, size=50 * KB, seed=11)
+POSTS = []
+for _campaign in CAMPAIGNS[:20]:
+    _html = process_html_content(_campaign["htmlContent"])
+    POSTS.append((_campaign, _html, convert_html_to_markdown(_html)))
+
+
+def fill(archive, count):
+    for i in range(count):
+        campaign, html, markdown = POSTS[i % len(POSTS)]
+        archive.put(campaign["name"], markdown=markdown, html=html,
+                    campaign_id=100000 + i, sent_date=campaign["sentDate"])
+
+
+def test_put(benchmark, tmp_path):
+    archive = Archive(str(tmp_path / "archive.db"))
+    benchmark.pedantic(fill, args=(archive, len(CAMPAIGNS)), rounds=3, iterations=1)
+    assert len(archive) == len(CAMPAIGNS)
+
+
+def test_random_get(benchmark, tmp_path):
+    archive = Archive(str(tmp_path / "archive.db"))
+    fill(archive, len(CAMPAIGNS))
+    keys = [entry["key"] for entry in archive.entries()]
+    rng = random.Random(3)
+
+    def read_random():
+        return archive.get(rng.choice(keys))
+
+    post = benchmark(read_random)
+    assert post["markdown"] and post["html"]
+
+
+def test_export_zip(benchmark, tmp_path):
+    archive = Archive(str(tmp_path / "archive.db"))
+    fill(archive, len(CAMPAIGNS))
+    written = benchmark.pedantic(archive.export, args=(str(tmp_path / "export.zip"), ("md",)),
+                                 rounds=3, iterations=1)
+    assert written == len(CAMPAIGNS)
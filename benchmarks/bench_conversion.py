@@ -0,0 +1,24 @@
+from app.utils import process_html_content, convert_html_to_markdown
+from batch_migrate import clean_title
+
+from benchmarks.utils import newsletter, run
+
+
+def test_process_html_content(benchmark, size_label):
+    benchmark.group = "process_html_content"
+    html = newsletter(size_label)
+    result = run(benchmark, size_label, process_html_content, html)
+    assert "<script" not in result
+
+
+def test_convert_html_to_markdown(benchmark, size_label):
+    benchmark.group = "convert_html_to_markdown"
+    processed = process_html_content(newsletter(size_label))
+    result = run(benchmark, size_label, convert_html_to_markdown, processed)
+    assert result
+
+
+def test_clean_title(benchmark):
+    titles = [f"Cronache dal Consiglio n° {i} -   Seduta   del {i % 28 + 1} marzo" for i in range(1000)]
+    result = benchmark(lambda: [clean_title(t) for t in titles])
+    assert result[0] == "Seduta del 1 marzo"
@@ -0,0 +1,53 @@
+import io
+import os
+import json
+import tarfile
+
+import pytest
+
+from convert import run
+
+from benchmarks.corpus import KB, generate_campaigns
+
+COUNT = 40
+
+
+@pytest.fixture(scope="module")
+def source(tmp_path_factory):
+    path = tmp_path_factory.mktemp("convert") / "campaigns.jsonl"
+    with open(path, "w") as f:
+        for campaign in generate_campaigns(COUNT, size=50 * KB, seed=11):
+            f.write(json.dumps(campaign) + "\n")
+    return str(path)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_bulk_convert(benchmark, source, tmp_path, workers):
+    """Conversione in blocco di 40 newsletter da 50KB, nel processo corrente o su un pool."""
+    benchmark.group = "convert.py"
+    output = str(tmp_path / "converted.jsonl")
+    summary = benchmark.pedantic(run, args=(source, output, workers, 4), rounds=3, iterations=1)
+    assert summary["converted"] == COUNT and summary["errors"] == 0
+
+
+def test_bad_files_and_name_clashes(tmp_path):
+    """File illeggibili diventano errori per file; .html omonimi in cartelle diverse non si sovrascrivono."""
+    source = tmp_path / "newsletter.tar"
+    members = {
+        "2023/numero.html": "<html><title>Primo</title><body><p>Primo numero</p></body></html>",
+        "2024/numero.html": "<html><title>Secondo</title><body><p>Secondo numero</p></body></html>",
+        "lista.json": json.dumps([{"id": 1}]),
+        "rotto.json": b"\xff\xfe{",
+        "vuota.json": json.dumps({"name": "Senza ID", "htmlContent": "<p>Testo</p>"}),
+    }
+    with tarfile.open(source, "w") as archive:
+        for name, data in members.items():
+            data = data.encode("utf-8") if isinstance(data, str) else data
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+
+    output = tmp_path / "converted"
+    summary = run(str(source), str(output), workers=1)
+    assert summary["converted"] == 3 and summary["errors"] == 2
+    assert sorted(os.listdir(output)) == ["numero-2.md", "numero.md", "senza-id.md", "timings.csv"]
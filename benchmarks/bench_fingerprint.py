@@ -0,0 +1,34 @@
+import random
+
+import pytest
+
+from app.fingerprint import FingerprintIndex, fingerprint
+
+from benchmarks.corpus import KB, generate_newsletter
+
+COUNT = 20000
+
+
+@pytest.fixture(scope="module")
+def newsletter():
+    return generate_newsletter(50 * KB, seed=7)
+
+
+@pytest.fixture
+def index(tmp_path):
+    rng = random.Random(0)
+    index = FingerprintIndex(str(tmp_path / "fingerprints.db"))
+    for i in range(COUNT):
+        index.add(i, f"Campagna {i}", rng.getrandbits(64))
+    return index
+
+
+def test_fingerprint_50kb(benchmark, newsletter):
+    assert benchmark(fingerprint, newsletter) != 0
+
+
+def test_lookup(benchmark, index, newsletter):
+    value = fingerprint(newsletter)
+    index.add(COUNT, "Originale", value)
+    # Tre bit diversi: un reinvio con saluto o data cambiati
+    assert benchmark(index.find_duplicate, value ^ 0b10101) == (COUNT, 3)
@@ -0,0 +1,85 @@
+import json
+
+import pytest
+
+from app.history import History
+
+from benchmarks.corpus import generate_ledger
+
+COUNT = 20000
+
+
+@pytest.fixture
+def history(tmp_path):
+    ledger = tmp_path / "exported_posts.json"
+    ledger.write_text(json.dumps(generate_ledger(COUNT)))
+    history = History(str(tmp_path / "history.db"))
+    history.sync_ledger(str(ledger))
+    return history, str(ledger)
+
+
+def test_sync_unchanged_ledger(benchmark, history):
+    history, ledger = history
+    assert benchmark(history.sync_ledger, ledger) == 0
+
+
+def test_search_page(benchmark, history):
+    history, _ = history
+
+    def visible_page():
+        return history.count("a"), history.query("a", page=3, page_size=50)
+
+    total, rows = benchmark(visible_page)
+    assert total > 150 and len(rows) == 50
+
+
+def test_stats(benchmark, history):
+    history, _ = history
+    stats = benchmark(history.stats)
+    assert stats["total_exports"] == COUNT
+
+
+def test_sync_rewritten_ledger(tmp_path):
+    """Voci tolte da requeue e poi ricaricate: lo storico segue il file invece di contare le righe."""
+    ledger = tmp_path / "exported_posts.json"
+    posts = generate_ledger(10)
+    ledger.write_text(json.dumps(posts))
+    history = History(str(tmp_path / "history.db"))
+    history.sync_ledger(str(ledger))
+
+    requeued = posts[3:5]
+    posts = [post for post in posts if post not in requeued]
+    posts += [dict(post, exported_at=f"2030-01-0{i + 1}T00:00:00") for i, post in enumerate(requeued)]
+    posts.append(dict(posts[0], id=999999, exported_at="2030-01-03T00:00:00"))
+    ledger.write_text(json.dumps(posts))
+    history.sync_ledger(str(ledger))
+
+    assert history.count() == len(posts)
+    assert sorted((row["campaign_id"], row["exported_at"]) for row in history.query(page_size=50)) == sorted(
+        (post["id"], post.get("exported_at") or post["exported_date"]) for post in posts
+    )
+    assert history.query(page_size=1)[0]["campaign_id"] == 999999
+
+
+def test_uploaded_texts_and_schema_upgrade(tmp_path):
+    """Uno storico creato prima degli hash viene aggiornato e registra il testo degli upload riusciti."""
+    import sqlite3
+
+    path = str(tmp_path / "history.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE attempts (id INTEGER PRIMARY KEY AUTOINCREMENT, campaign_id INTEGER, title TEXT, "
+                 "attempted_at TEXT NOT NULL, success INTEGER NOT NULL, error TEXT, upload_seconds REAL)")
+    conn.execute("INSERT INTO attempts (campaign_id, title, attempted_at, success, upload_seconds) "
+                 "VALUES (1, 'Vecchio', '2024-01-01T00:00:00', 1, 2.0)")
+    conn.commit()
+    conn.close()
+
+    history = History(path)
+    history.record_attempt(2, "Nuovo", True, upload_seconds=1.0, text="Prima versione del testo")
+    history.record_attempt(2, "Nuovo", True, upload_seconds=1.0, text="Seconda versione, con più parole")
+    history.record_attempt(3, "Solo conversione", True, text="Mai caricato")
+
+    texts = history.uploaded_texts()
+    assert set(texts) == {2}
+    assert texts[2][1] == 5
+    assert history.uploaded_ids() == {1, 2}
@@ -0,0 +1,22 @@
+from app.campaign_index import build_index, filter_index, paginate
+
+from benchmarks.corpus import campaign_metadata
+
+CAMPAIGNS = [campaign_metadata(i) for i in range(20000)]
+EXPORTED = ({c["id"] for c in CAMPAIGNS[::3]}, set())
+
+
+def test_build_index(benchmark):
+    index = benchmark(build_index, CAMPAIGNS, EXPORTED)
+    assert index[0].sent_ts >= index[-1].sent_ts
+
+
+def test_filter_and_paginate(benchmark):
+    index = build_index(CAMPAIGNS, EXPORTED)
+
+    def visible_page():
+        rows = filter_index(index, name="consiglio n° 1", exported=False)
+        return paginate(rows, 2, 50)
+
+    page_rows, total_pages = benchmark(visible_page)
+    assert len(page_rows) == 50 and total_pages > 1
@@ -0,0 +1,40 @@
+import json
+
+import pytest
+
+from batch_migrate import load_exported_ids
+
+from benchmarks.corpus import generate_ledger
+
+
+@pytest.fixture(params=[1000, 10000])
+def ledger_file(request, tmp_path):
+    path = tmp_path / "exported_posts.json"
+    path.write_text(json.dumps(generate_ledger(request.param)))
+    return str(path), request.param
+
+
+def test_load_exported_ids(benchmark, ledger_file):
+    path, count = ledger_file
+    exported_ids = benchmark(load_exported_ids, path)
+    assert len(exported_ids) == count
+
+
+def test_filter_pending(benchmark, ledger_file):
+    path, count = ledger_file
+    exported_ids = load_exported_ids(path)
+    campaigns = [{"id": 1000 + i} for i in range(count * 2)]
+    pending = benchmark(lambda: [c for c in campaigns if c["id"] not in exported_ids])
+    assert len(pending) == count
+
+
+def test_converted_only_entries_stay_pending(tmp_path):
+    """Le voci della pagina Migrazione senza upload non vengono saltate dal batch."""
+    path = tmp_path / "exported_posts.json"
+    path.write_text(json.dumps([
+        {"id": 1, "title": "Batch", "exported_date": "2024-01-01T00:00:00"},
+        {"id": 2, "title": "Solo convertita", "date": "", "exported_at": "2024-01-02T00:00:00"},
+        {"id": "3", "title": "Caricata dalla pagina", "date": "", "uploaded": True},
+        {"id": 4, "title": "Caricata, nello storico", "date": ""},
+    ]))
+    assert load_exported_ids(str(path), uploaded_ids={4}) == {1, 3, 4}
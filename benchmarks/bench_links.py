@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+from app import links as links_module
+from app.links import LinkResolver, find_tracking_links
+
+from benchmarks.corpus import KB
+from benchmarks.stubs import brevo as brevo_stub
+
+CAMPAIGNS = 10
+
+
+@pytest.fixture(scope="module")
+def stub():
+    fake_brevo = brevo_stub.FakeBrevo(CAMPAIGNS, 50 * KB, latency=0.02)
+    server, _ = brevo_stub.start(fake_brevo)
+    html = [json.loads(fake_brevo.campaign_details(1000 + i))["htmlContent"] for i in range(CAMPAIGNS)]
+    yield fake_brevo, html
+    server.shutdown()
+
+
+def test_resolve_batch(benchmark, stub, tmp_path):
+    """Un batch di link nuovi, risolti in parallelo contro il redirect locale (20 ms per richiesta)."""
+    _, html = stub
+    urls = set().union(*(find_tracking_links(h) for h in html))
+    rounds = iter(range(100))
+
+    def fresh_resolver():
+        return (LinkResolver(str(tmp_path / f"links-{next(rounds)}.json")),), {}
+
+    resolved = benchmark.pedantic(lambda resolver: resolver.resolve(urls), setup=fresh_resolver, rounds=3)
+    assert len(resolved) == len(urls)
+
+
+def test_rewrite_from_map(benchmark, stub, tmp_path):
+    """Riscrittura di una newsletter da 50KB con tutti i link già nella mappa."""
+    _, html = stub
+    resolver = LinkResolver(str(tmp_path / "links.json"))
+    resolver.unwrap(html[0])
+    rewritten = benchmark(resolver.unwrap, html[0])
+    assert not find_tracking_links(rewritten)
+
+
+def test_expired_links(stub, tmp_path, monkeypatch):
+    """I 404 non finiscono in mappa; i link senza redirect sì, ma solo fino alla scadenza."""
+    fake_brevo, _ = stub
+    tracking = fake_brevo.tracking_base + "/tr/cl/"
+    expired, gone = tracking + "expired-1", tracking + "gone-1"
+    path = str(tmp_path / "links.json")
+
+    resolver = LinkResolver(path)
+    assert resolver.resolve([expired, gone]) == {}
+    assert resolver.stats["failed"] == 1 and resolver.stats["unresolvable"] == 1
+    requests_before = fake_brevo.stats["link_requests"]
+    resolver.resolve([expired, gone])
+    assert fake_brevo.stats["link_requests"] == requests_before
+
+    # Nuova esecuzione: il 404 si riprova, il link senza redirect arriva dalla mappa
+    resolver = LinkResolver(path)
+    resolver.resolve([expired, gone])
+    assert fake_brevo.stats["link_requests"] == requests_before + 1
+    assert resolver.stats["cached"] == 1
+
+    # Scaduto il TTL, anche il link senza redirect viene richiesto di nuovo
+    monkeypatch.setattr(links_module, "UNRESOLVABLE_TTL", -1)
+    resolver = LinkResolver(path)
+    resolver.resolve([gone])
+    assert fake_brevo.stats["link_requests"] == requests_before + 2
+
+    offline = LinkResolver(path, offline=True)
+    offline.resolve([expired, tracking + "nuovo"])
+    assert fake_brevo.stats["link_requests"] == requests_before + 2
@@ -0,0 +1,60 @@
+import time
+import random
+
+import pytest
+
+from app.archive import Archive
+from app.models import Campaign
+from app.profiling import StageProfiler
+from batch_migrate import clean_title, migrate_campaign, process_campaigns
+
+from benchmarks.corpus import KB, generate_campaigns
+
+CAMPAIGNS = generate_campaigns(20, size=50 * KB, seed=7)
+
+
+def test_dry_run_pipeline(benchmark, tmp_path):
+    """Pipeline completa (pulizia, conversione, salvataggio) senza upload."""
+
+    archive = Archive(str(tmp_path / "archive.db"))
+
+    def run_batch():
+        profiler = StageProfiler()
+        for campaign in CAMPAIGNS:
+            migrate_campaign(
+                campaign["id"],
+                clean_title(campaign["name"]),
+                campaign["htmlContent"],
+                profiler,
+                dry_run=True,
+                archive=archive,
+            )
+        return profiler
+
+    profiler = benchmark.pedantic(run_batch, rounds=5, iterations=1, warmup_rounds=1)
+    assert profiler.stage_stats()["save"]["count"] == len(CAMPAIGNS)
+    assert len(archive) == len(CAMPAIGNS)
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_parallel_pipeline_order(benchmark, tmp_path, workers):
+    """Download simulato (20 ms, in ordine sparso) e upload in ordine di data attraverso il buffer di riordino."""
+    benchmark.group = "process_campaigns"
+    archive = Archive(str(tmp_path / "archive.db"))
+    # Brevo restituisce le campagne dalla più recente: il batch deve caricarle dalla più vecchia
+    campaigns = [Campaign.from_brevo(c) for c in reversed(CAMPAIGNS)]
+    details = {c["id"]: c for c in CAMPAIGNS}
+
+    def fetch(campaign):
+        time.sleep(random.uniform(0.005, 0.035))
+        return details[campaign.id]
+
+    def run_batch():
+        published = []
+        process_campaigns(campaigns, fetch, StageProfiler(), publish=lambda title, markdown, profiler=None:
+                          published.append(title) or True, mark_exported=False, pause=False,
+                          archive=archive, workers=workers)
+        return published
+
+    published = benchmark.pedantic(run_batch, rounds=3, iterations=1)
+    assert published == [clean_title(c["name"]) for c in sorted(CAMPAIGNS, key=lambda c: c["sentDate"])]
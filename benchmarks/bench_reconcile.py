@@ -0,0 +1,128 @@
+import json
+import random
+
+import pytest
+
+from app.archive import Archive
+from app.fingerprint import FingerprintIndex, fingerprint, normalize_text, text_digest
+from app.reconcile import fetch_drafts, load_uploaded_entries, reconcile, requeue
+
+from benchmarks.stubs import substack as substack_stub
+
+ENTRIES = 2000
+PAGE_SIZE = 100
+COOKIES = [{"name": "substack.sid", "value": "stub"}]
+
+WORDS = ("consiglio comunale delibera bilancio scuola strada parco progetto cittadini mozione "
+         "assessore quartiere lavori pubblici servizi sociali trasporti cultura ambiente sicurezza").split()
+
+
+def _markdown(rng):
+    paragraphs = [" ".join(rng.choice(WORDS) for _ in range(60)) for _ in range(5)]
+    return "\n\n".join(paragraphs)
+
+
+@pytest.fixture(scope="module")
+def publication(tmp_path_factory):
+    """
+    Registro da ENTRIES campagne caricate e bozze corrispondenti sul finto Substack:
+    per ogni centinaio, una bozza manca, una è troncata, una è doppia e una ha il titolo cambiato.
+    """
+    directory = tmp_path_factory.mktemp("reconcile")
+    rng = random.Random(45)
+    archive = Archive(str(directory / "archive.db"))
+    fake_substack = substack_stub.FakeSubstack()
+    ledger = []
+    for i in range(ENTRIES):
+        title = f"Cronaca {i}"
+        markdown = _markdown(rng)
+        archive.put(title, markdown=markdown, campaign_id=i)
+        ledger.append({"id": i, "title": title, "sent_date": "", "exported_date": "2024-01-01T00:00:00"})
+        kind = i % 100
+        if kind == 0:
+            continue
+        if kind == 1:
+            markdown = markdown[:len(markdown) // 2]
+        if kind == 3:
+            title = f"{title} (modificato)"
+        fake_substack.add_draft(title, markdown)
+        if kind == 2:
+            fake_substack.add_draft(title, markdown)
+    ledger_file = directory / "exported_posts.json"
+    ledger_file.write_text(json.dumps(ledger))
+
+    server, base_url = substack_stub.start(fake_substack)
+    yield fake_substack, base_url, archive, str(ledger_file)
+    server.shutdown()
+
+
+def test_reconcile_drafts(benchmark, publication):
+    """Elenco paginato delle bozze e confronto con il registro, per titolo e impronta."""
+    fake_substack, base_url, archive, ledger_file = publication
+    entries = load_uploaded_entries(ledger_file)
+
+    def run():
+        return reconcile(entries, fetch_drafts(COOKIES, base_url, page_size=PAGE_SIZE), archive)
+
+    # Richieste di elenco di una singola riconciliazione, fuori dal benchmark
+    # (con --benchmark-disable il numero di round cambia)
+    fake_substack.list_requests = 0
+    run()
+    assert fake_substack.list_requests == len(fake_substack.drafts) // PAGE_SIZE + 1
+
+    results = benchmark.pedantic(run, rounds=3, iterations=1)
+
+    statuses = {}
+    for result in results:
+        statuses.setdefault(result["status"], set()).add(result["id"])
+    groups = ENTRIES // 100
+    assert len(statuses["missing"]) == len(statuses["truncated"]) == len(statuses["duplicate"]) == groups
+    assert all(campaign_id % 100 == 0 for campaign_id in statuses["missing"])
+    assert all(campaign_id % 100 == 1 for campaign_id in statuses["truncated"])
+    assert len(statuses["ok"]) == ENTRIES - 3 * groups
+    assert "mismatch" not in statuses
+
+
+def test_uploaded_texts_ignore_rewritten_archive(publication, tmp_path):
+    """Un dry-run che riscrive l'archivio non fa risultare troncate le bozze già caricate."""
+    _, base_url, archive, ledger_file = publication
+    entries = load_uploaded_entries(ledger_file)
+    # Hash e impronte registrati al momento dell'upload, come fa il batch
+    uploaded_texts = {}
+    fingerprints = FingerprintIndex(":memory:")
+    rewritten = Archive(str(tmp_path / "archive.db"))
+    for entry in entries:
+        words = normalize_text(archive.get(entry["id"])["markdown"])
+        uploaded_texts[entry["id"]] = (text_digest(words), len(words))
+        fingerprints.add(entry["id"], entry["title"], fingerprint(" ".join(words)))
+        rewritten.put(entry["title"], markdown=" ".join(words * 2), campaign_id=entry["id"])
+
+    drafts = fetch_drafts(COOKIES, base_url, PAGE_SIZE)
+    statuses = {}
+    for result in reconcile(entries, drafts, rewritten, fingerprints, uploaded_texts):
+        statuses.setdefault(result["status"], set()).add(result["id"])
+    groups = ENTRIES // 100
+    assert len(statuses["truncated"]) == groups
+    assert len(statuses["ok"]) == ENTRIES - 3 * groups
+
+
+def test_requeue(publication, tmp_path):
+    """Le campagne mancanti e troncate escono dal registro, le altre restano."""
+    _, base_url, archive, ledger_file = publication
+    copy = tmp_path / "exported_posts.json"
+    copy.write_text(open(ledger_file).read())
+
+    results = reconcile(load_uploaded_entries(str(copy)), fetch_drafts(COOKIES, base_url, PAGE_SIZE), archive)
+    removed = requeue([r["id"] for r in results if r["status"] in ("missing", "truncated")], str(copy))
+    remaining = {post["id"] for post in json.loads(copy.read_text())}
+    assert removed == 2 * ENTRIES // 100
+    assert len(remaining) == ENTRIES - removed
+    assert not any(campaign_id % 100 in (0, 1) for campaign_id in remaining)
+
+
+def test_requeue_string_ids(tmp_path):
+    """Le voci scritte con ID stringa vengono tolte come quelle con ID intero."""
+    ledger = tmp_path / "exported_posts.json"
+    ledger.write_text(json.dumps([{"id": "7", "title": "A"}, {"id": 8, "title": "B"}, {"id": "9", "title": "C"}]))
+    assert requeue([7, "8"], str(ledger)) == 2
+    assert [post["id"] for post in json.loads(ledger.read_text())] == ["9"]
@@ -0,0 +1,15 @@
+import importlib.util
+
+import pytest
+
+from benchmarks.startup import BUDGETS, measure_import
+
+
+@pytest.mark.parametrize("module", list(BUDGETS))
+def test_import_time_budget(benchmark, module):
+    if module == "Home" and importlib.util.find_spec("streamlit") is None:
+        pytest.skip("streamlit non installato")
+
+    benchmark.group = "startup"
+    total, _ = benchmark.pedantic(measure_import, args=(module,), rounds=3, iterations=1)
+    assert total <= BUDGETS[module], f"{module}: {total * 1000:.0f} ms, budget {BUDGETS[module] * 1000:.0f} ms"
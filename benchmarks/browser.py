@@ -0,0 +1,159 @@
+"""
+Confronto tra Chrome standard e modalità leggera di `setup_driver_for_replit`.
+
+Per ogni modalità avvia il browser più volte contro il finto Substack (o
+contro SUBSTACK_BASE_URL con --base-url), apre la dashboard e l'editor come
+fa `create_draft_post` e misura:
+
+- tempo di avvio del driver e di caricamento delle pagine;
+- memoria residente di tutti i processi Chrome (da /proc, solo Linux);
+- heap JavaScript (DevTools, Performance.getMetrics);
+- risorse statiche richieste al server (solo con il finto Substack).
+
+    python -m benchmarks.browser --runs 5
+    python -m benchmarks.browser --output browser.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+import statistics
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks.stubs import substack as substack_stub
+
+logger = logging.getLogger(__name__)
+
+
+def _children(pid):
+    """PID di tutti i discendenti di `pid`, letti da /proc."""
+    parents = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # Il nome del processo è tra parentesi e può contenere spazi
+                fields = f.read().rsplit(")", 1)[1].split()
+            parents.setdefault(int(fields[1]), []).append(int(entry))
+        except (OSError, IndexError, ValueError):
+            continue
+    found, stack = [], [pid]
+    while stack:
+        for child in parents.get(stack.pop(), []):
+            found.append(child)
+            stack.append(child)
+    return found
+
+
+def browser_rss(driver):
+    """Memoria residente (MB) dei processi avviati da chromedriver, o None fuori da Linux."""
+    if not os.path.isdir("/proc"):
+        return None
+    total_kb = 0
+    for pid in _children(driver.service.process.pid):
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total_kb += int(line.split()[1])
+                        break
+        except OSError:
+            continue
+    return total_kb / 1024
+
+
+def js_heap(driver):
+    """Heap JavaScript usato (MB) secondo DevTools."""
+    driver.execute_cdp_cmd("Performance.enable", {})
+    metrics = driver.execute_cdp_cmd("Performance.getMetrics", {})["metrics"]
+    values = {m["name"]: m["value"] for m in metrics}
+    return values.get("JSHeapUsedSize", 0) / (1024 * 1024)
+
+
+def run_once(base_url, lean, profile_dir):
+    """Un avvio completo del browser; restituisce le misure di questo giro."""
+    from app.substack_bot import setup_driver_for_replit, quit_driver
+
+    start = time.perf_counter()
+    driver = setup_driver_for_replit(lean=lean, profile_dir=profile_dir)
+    setup_seconds = time.perf_counter() - start
+    try:
+        driver.get(f"{base_url}/")
+        driver.add_cookie({"name": "substack.sid", "value": "benchmark", "path": "/"})
+        pages = {}
+        for path in ("/publish", "/publish/post"):
+            start = time.perf_counter()
+            driver.get(f"{base_url}{path}")
+            pages[path] = time.perf_counter() - start
+        return {
+            "setup_seconds": setup_seconds,
+            "load_seconds": sum(pages.values()),
+            "rss_mb": browser_rss(driver),
+            "js_heap_mb": js_heap(driver),
+        }
+    finally:
+        quit_driver(driver)
+
+
+def summarize(samples):
+    """Mediana di ogni misura sui giri di una modalità."""
+    summary = {}
+    for key in samples[0]:
+        values = [s[key] for s in samples if s[key] is not None]
+        summary[key] = statistics.median(values) if values else None
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Confronto Chrome standard / modalità leggera")
+    parser.add_argument("--runs", type=int, default=3, help="Avvii del browser per modalità")
+    parser.add_argument("--base-url", help="URL di Substack (default: finto Substack locale)")
+    parser.add_argument("--asset-size", type=int, default=200 * 1024, help="Byte per risorsa del finto Substack")
+    parser.add_argument("--output", help="File JSON in cui salvare i risultati")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+
+    fake_substack = None
+    base_url = args.base_url
+    if not base_url:
+        fake_substack = substack_stub.FakeSubstack(asset_size=args.asset_size)
+        server, base_url = substack_stub.start(fake_substack)
+
+    # Profilo persistente temporaneo: il primo giro in modalità leggera lo scalda
+    profile_dir = tempfile.mkdtemp(prefix="chrome-profile-")
+    results = {}
+    for mode, lean in (("standard", False), ("leggera", True)):
+        assets_before = fake_substack.asset_requests if fake_substack else 0
+        samples = [run_once(base_url, lean, profile_dir) for _ in range(args.runs)]
+        results[mode] = summarize(samples)
+        if fake_substack:
+            results[mode]["asset_requests"] = (fake_substack.asset_requests - assets_before) / args.runs
+
+    def fmt(value, unit):
+        return f"{value:8.2f} {unit}" if value is not None else "     N/D"
+
+    print(f"{'':24}{'standard':>14}{'leggera':>14}{'risparmio':>12}")
+    for key, label, unit in (("setup_seconds", "Avvio driver", "s"), ("load_seconds", "Caricamento pagine", "s"),
+                             ("rss_mb", "Memoria Chrome (RSS)", "MB"), ("js_heap_mb", "Heap JavaScript", "MB"),
+                             ("asset_requests", "Risorse scaricate", "")):
+        standard, lean = results["standard"].get(key), results["leggera"].get(key)
+        saving = f"{(1 - lean / standard):11.0%}" if standard and lean is not None else "        N/D"
+        print(f"{label:24}{fmt(standard, unit):>14}{fmt(lean, unit):>14}{saving:>12}")
+
+    if fake_substack:
+        server.shutdown()
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+# Rende importabili i moduli del progetto (app/, batch_migrate.py)
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks.corpus import SIZES
+
+
+@pytest.fixture(params=list(SIZES))
+def size_label(request):
+    return request.param
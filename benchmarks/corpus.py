@@ -0,0 +1,226 @@
+"""
+Generatore di newsletter sintetiche in stile Brevo per i benchmark.
+
+Le newsletter riproducono le caratteristiche che rendono costosa la
+conversione: tabelle di layout annidate, stili inline, commenti condizionali
+per Outlook, link di tracciamento e immagini base64. Lo stesso seed produce
+sempre lo stesso corpus, così i risultati sono confrontabili tra commit.
+"""
+import os
+import json
+import base64
+import random
+import argparse
+from datetime import datetime, timedelta
+
+KB = 1024
+MB = 1024 * KB
+
+# Dimensioni di riferimento usate dai benchmark
+SIZES = {
+    "5KB": 5 * KB,
+    "50KB": 50 * KB,
+    "500KB": 500 * KB,
+    "5MB": 5 * MB,
+}
+
+WORDS = (
+    "consiglio comunale seduta delibera bilancio mozione interrogazione "
+    "assessore sindaco cittadini quartiere scuola trasporti ambiente "
+    "approvato respinto emendamento commissione proposta regolamento "
+    "urbanistica cultura sport sociale lavori pubblici verde parcheggi"
+).split()
+
+HEAD = """<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Transitional//EN" "http://www.w3.org/TR/xhtml1/DTD/xhtml1-transitional.dtd">
+<html xmlns="http://www.w3.org/1999/xhtml"><head>
+<meta http-equiv="Content-Type" content="text/html; charset=UTF-8" />
+<meta name="viewport" content="width=device-width, initial-scale=1.0" />
+<title>{title}</title>
+<style type="text/css">
+#outlook a {{ padding:0; }} body {{ margin:0; padding:0; -webkit-text-size-adjust:100%; }}
+table, td {{ border-collapse:collapse; mso-table-lspace:0pt; mso-table-rspace:0pt; }}
+img {{ border:0; height:auto; line-height:100%; outline:none; text-decoration:none; }}
+@media only screen and (max-width:480px) {{ .mj-column-per-100 {{ width:100% !important; }} }}
+</style>
+<!--[if mso]><xml><o:OfficeDocumentSettings><o:AllowPNG/><o:PixelsPerInch>96</o:PixelsPerInch></o:OfficeDocumentSettings></xml><![endif]-->
+<script type="text/javascript">window.sib = {{ equeue: [], client_key: "{token}" }};</script>
+</head>
+<body style="word-spacing:normal;background-color:#f4f4f4;">
+<div style="display:none;font-size:1px;line-height:1px;max-height:0;overflow:hidden;">{preheader}</div>
+<table align="center" border="0" cellpadding="0" cellspacing="0" role="presentation" width="100%" bgcolor="#f4f4f4" style="width:100%;">
+<tbody><tr><td align="center" valign="top" style="padding:20px 0;">
+"""
+
+FOOT = """<table class="footer" border="0" cellpadding="0" cellspacing="0" width="600" style="width:600px;">
+<tr><td align="center" style="font-family:Arial,sans-serif;font-size:11px;color:#888888;padding:20px;">
+{social}
+<p style="margin:8px 0;">Hai ricevuto questa email perché sei iscritto alla newsletter.</p>
+<p style="margin:8px 0;"><a href="{unsubscribe}" style="color:#888888;">Disiscriviti</a> &middot; <a href="{mirror}" style="color:#888888;">Visualizza nel browser</a></p>
+</td></tr></table>
+</td></tr></tbody></table>
+<img width="1" height="1" src="https://{host}/tr/op/{token}" alt="" />
+</body></html>
+"""
+
+SOCIAL_NETWORKS = ("facebook", "instagram", "twitter", "linkedin", "youtube")
+
+
+def _text(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _token(rng, length=48):
+    alphabet = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789-_"
+    return "".join(rng.choice(alphabet) for _ in range(length))
+
+
+def tracking_url(rng, host):
+    """Restituisce un link di click-tracking in stile Brevo."""
+    return f"https://{host}/tr/cl/{_token(rng)}"
+
+
+def _base64_image(rng, size):
+    payload = bytes(rng.getrandbits(8) for _ in range(size))
+    return "data:image/png;base64," + base64.b64encode(payload).decode("ascii")
+
+
+def _section(rng, host, image_bytes):
+    """Una sezione di contenuto: tabelle annidate con titolo, testo, link e immagine."""
+    paragraphs = "".join(
+        f'<p style="margin:0 0 12px 0;font-family:Georgia,serif;font-size:16px;line-height:24px;color:#333333;">'
+        f'{_text(rng, rng.randint(30, 80))} '
+        f'<a href="{tracking_url(rng, host)}" style="color:#1a73e8;text-decoration:underline;" target="_blank">'
+        f'{_text(rng, 3)}</a></p>'
+        for _ in range(rng.randint(2, 5))
+    )
+    image = ""
+    if image_bytes:
+        image = (
+            f'<tr><td align="center" style="padding:0 0 16px 0;">'
+            f'<img src="{_base64_image(rng, image_bytes)}" width="560" height="315" '
+            f'style="display:block;width:100%;max-width:560px;" class="img-responsive" /></td></tr>'
+        )
+    return (
+        f'<table class="section" border="0" cellpadding="0" cellspacing="0" width="600" bgcolor="#ffffff" style="width:600px;background:#ffffff;">'
+        f'<tr><td style="padding:24px 20px;">'
+        f'<table border="0" cellpadding="0" cellspacing="0" width="100%" role="presentation"><tbody>'
+        f'<tr><td id="title-{_token(rng, 8)}" style="font-family:Arial,sans-serif;font-size:22px;font-weight:bold;color:#111111;padding:0 0 12px 0;">'
+        f'<h2 style="margin:0;">{_text(rng, rng.randint(4, 9))}</h2></td></tr>'
+        f'{image}'
+        f'<tr><td><div class="text-block"><span style="font-size:16px;">{paragraphs}</span></div></td></tr>'
+        f'<tr><td><!--[if mso]><table><tr><td width="560"><![endif]--><div><span></span></div><!--[if mso]></td></tr></table><![endif]--></td></tr>'
+        f'</tbody></table></td></tr></table>'
+    )
+
+
+def generate_newsletter(target_size, seed=0, title=None):
+    """
+    Genera una newsletter HTML in stile Brevo di circa `target_size` byte.
+
+    Args:
+        target_size (int): Dimensione desiderata in byte.
+        seed (int): Seed del generatore casuale.
+        title (str): Titolo della newsletter (generato se assente).
+
+    Returns:
+        str: Il contenuto HTML.
+    """
+    rng = random.Random(seed)
+    host = f"{_token(rng, 6).lower()}.r.bh.d.sendibt3.com"
+    title = title or f"Cronache dal Consiglio n° {rng.randint(1, 500)} - {_text(rng, 5)}"
+    token = _token(rng)
+
+    head = HEAD.format(title=title, token=token, preheader=_text(rng, 12))
+    social = " ".join(
+        f'<a href="{tracking_url(rng, host)}"><img src="https://img.mailinblue.com/social/{name}.png" width="24" height="24" alt="{name}" /></a>'
+        for name in SOCIAL_NETWORKS
+    )
+    foot = FOOT.format(
+        social=social,
+        unsubscribe=tracking_url(rng, host),
+        mirror=tracking_url(rng, host),
+        host=host,
+        token=token,
+    )
+
+    # Le newsletter grandi lo sono soprattutto per le immagini incorporate
+    image_bytes = 0
+    if target_size >= 50 * KB:
+        image_bytes = min(target_size // 12, 400 * KB)
+
+    sections = []
+    size = len(head) + len(foot)
+    while size < target_size:
+        remaining = target_size - size
+        section = _section(rng, host, min(image_bytes, remaining * 3 // 4))
+        sections.append(section)
+        size += len(section)
+
+    return head + "".join(sections) + foot
+
+
+def _sent_date(rng, index):
+    start = datetime(2015, 1, 1)
+    return (start + timedelta(days=index * 7, hours=rng.randint(6, 20))).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+def campaign_metadata(index, seed=0):
+    """Metadati (senza HTML) della campagna `index`, come nella lista di Brevo."""
+    rng = random.Random(seed * 100003 + index)
+    name = f"Cronache dal Consiglio n° {index + 1} - {_text(rng, rng.randint(3, 8))}"
+    return {
+        "id": 1000 + index,
+        "name": name,
+        "subject": name,
+        "status": "sent",
+        "sentDate": _sent_date(rng, index),
+    }
+
+
+def generate_campaign(index, size=5 * KB, seed=0):
+    """Dettagli completi della campagna `index`, incluso htmlContent."""
+    campaign = campaign_metadata(index, seed)
+    campaign["htmlContent"] = generate_newsletter(size, seed=seed * 100003 + index, title=campaign["name"])
+    return campaign
+
+
+def generate_campaigns(count, size=5 * KB, seed=0):
+    """
+    Genera `count` dettagli di campagna come li restituisce l'API Brevo.
+
+    Returns:
+        list: Dizionari con id, name, subject, sentDate e htmlContent.
+    """
+    return [generate_campaign(i, size, seed) for i in range(count)]
+
+
+def generate_ledger(count, seed=0):
+    """Genera un exported_posts.json sintetico con `count` voci."""
+    rng = random.Random(seed)
+    return [
+        {
+            "id": 1000 + i,
+            "title": _text(rng, 6),
+            "exported_date": _sent_date(rng, i),
+        }
+        for i in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera un corpus sintetico di newsletter Brevo")
+    parser.add_argument("--count", type=int, default=100, help="Numero di campagne")
+    parser.add_argument("--size", choices=SIZES.keys(), default="50KB", help="Dimensione di ogni newsletter")
+    parser.add_argument("--seed", type=int, default=0, help="Seed del generatore")
+    parser.add_argument("--output", default="corpus.jsonl", help="File JSONL di output")
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        for campaign in generate_campaigns(args.count, SIZES[args.size], args.seed):
+            f.write(json.dumps(campaign) + "\n")
+    print(f"Scritte {args.count} campagne in {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Test di carico end-to-end contro i finti Brevo e Substack.
+
+Esegue la pipeline completa (download, pulizia, conversione, salvataggio e,
+se Chrome è disponibile, upload con Selenium) con un numero crescente di
+worker e riporta i post/ora ottenuti per ogni livello di concorrenza.
+
+    python -m benchmarks.loadtest --campaigns 40 --workers 1,2,4 --latency 0.05
+    python -m benchmarks.loadtest --no-browser --workers 1,4,8
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from app import brevo, resilience
+from app.profiling import StageProfiler
+from benchmarks.corpus import SIZES
+from benchmarks.stubs import brevo as brevo_stub
+from benchmarks.stubs import substack as substack_stub
+
+logger = logging.getLogger(__name__)
+
+API_KEY = "stub-api-key"
+
+
+def run_level(campaigns, workers, dry_run):
+    """Migra `campaigns` con `workers` thread e restituisce (riusciti, secondi, profiler)."""
+    from batch_migrate import clean_title, get_campaign_content, migrate_campaign
+
+    profiler = StageProfiler()
+
+    def migrate(campaign):
+        campaign_id = campaign["id"]
+        try:
+            with profiler.stage("get_campaign_content", campaign_id):
+                details = get_campaign_content(API_KEY, campaign_id)
+            return migrate_campaign(campaign_id, clean_title(campaign["name"]),
+                                    details.get("htmlContent", ""), profiler, dry_run=dry_run)
+        except Exception as e:
+            logger.error(f"Campagna {campaign_id} fallita: {e}")
+            return False
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(migrate, campaigns))
+    return sum(results), time.perf_counter() - start, profiler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test di carico end-to-end con server locali")
+    parser.add_argument("--campaigns", type=int, default=40, help="Numero di campagne per livello")
+    parser.add_argument("--workers", default="1,2,4", help="Livelli di concorrenza, separati da virgola")
+    parser.add_argument("--size", choices=SIZES.keys(), default="50KB", help="Dimensione delle newsletter")
+    parser.add_argument("--latency", type=float, default=0.0, help="Latenza simulata di Brevo (s)")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Frazione di 429 da Brevo")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Frazione di errori 5xx da Brevo")
+    parser.add_argument("--substack-latency", type=float, default=0.0, help="Latenza simulata di Substack (s)")
+    parser.add_argument("--no-browser", action="store_true", help="Salta l'upload con Selenium (dry-run)")
+    parser.add_argument("--output", help="File JSON in cui salvare i risultati")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+
+    fake_brevo = brevo_stub.FakeBrevo(args.campaigns, SIZES[args.size], latency=args.latency,
+                                      rate_limit=args.rate_limit, error_rate=args.error_rate)
+    brevo_server, brevo_url = brevo_stub.start(fake_brevo)
+    fake_substack = substack_stub.FakeSubstack(args.substack_latency)
+    substack_server, substack_url = substack_stub.start(fake_substack)
+    os.environ["BREVO_API_BASE_URL"] = brevo_url
+    os.environ["SUBSTACK_BASE_URL"] = substack_url
+
+    # La pipeline scrive archive.db, exported_posts.json e cookies.json relativi
+    # alla directory corrente: lavoriamo in una directory temporanea
+    workdir = tempfile.mkdtemp(prefix="loadtest-")
+    os.chdir(workdir)
+    with open("cookies.json", "w") as f:
+        json.dump([{"name": "substack.sid", "value": "stub", "path": "/"}], f)
+
+    campaigns = brevo.get_campaigns(API_KEY)
+    results = []
+    baseline = None
+    for workers in [int(w) for w in args.workers.split(",")]:
+        drafts_before = len(fake_substack.drafts)
+        succeeded, elapsed, profiler = run_level(campaigns, workers, args.no_browser)
+        posts_per_hour = succeeded / elapsed * 3600 if elapsed else 0
+        baseline = baseline or posts_per_hour
+        results.append({
+            "workers": workers,
+            "succeeded": succeeded,
+            "drafts": len(fake_substack.drafts) - drafts_before,
+            "seconds": elapsed,
+            "posts_per_hour": posts_per_hour,
+            "speedup": posts_per_hour / baseline if baseline else 0,
+            "stages": profiler.stage_stats(),
+        })
+        print(f"{workers:>3} worker: {succeeded}/{len(campaigns)} post in {elapsed:.1f}s "
+              f"→ {posts_per_hour:,.0f} post/ora (×{results[-1]['speedup']:.2f})")
+
+    print(f"Richieste a Brevo: {fake_brevo.stats}")
+    for name, stats in resilience.metrics().items():
+        print(f"{name}: {stats['retries']} retry, circuito aperto {stats['circuit_opened']} volte, "
+              f"tempo perso {stats['lost_seconds']:.1f}s")
+    brevo_server.shutdown()
+    substack_server.shutdown()
+
+    if args.output:
+        with open(os.path.join(ROOT, args.output) if not os.path.isabs(args.output) else args.output, "w") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Report dei tempi di avvio dei punti di ingresso, basato su `python -X importtime`.
+
+Ogni punto di ingresso viene importato in un interprete nuovo; il report
+mostra il tempo totale di import e i moduli più costosi.
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --top 20 Home
+"""
+import os
+import sys
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Budget di import (secondi) per punto di ingresso, verificati da bench_startup.py
+BUDGETS = {
+    "run": 0.1,
+    "batch_migrate": 0.15,
+    "Home": 1.0,
+}
+
+
+def measure_import(module):
+    """
+    Importa `module` in un nuovo interprete con -X importtime.
+
+    Returns:
+        tuple: (secondi totali di import, lista di (secondi cumulativi, modulo)).
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Import di {module} fallito:\n{result.stderr[-2000:]}")
+
+    modules = []
+    total_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        cumulative_us = int(cumulative)
+        modules.append((cumulative_us / 1e6, name.rstrip()))
+        # Solo gli import di primo livello: i figli sono già inclusi nel cumulativo
+        if not name.startswith("  "):
+            total_us += cumulative_us
+    return total_us / 1e6, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report dei tempi di avvio (-X importtime)")
+    parser.add_argument("modules", nargs="*", default=list(BUDGETS), help="Punti di ingresso da misurare")
+    parser.add_argument("--top", type=int, default=10, help="Numero di moduli più costosi da mostrare")
+    args = parser.parse_args()
+
+    exit_code = 0
+    for module in args.modules:
+        total, modules = measure_import(module)
+        budget = BUDGETS.get(module)
+        status = ""
+        if budget is not None:
+            status = "OK" if total <= budget else "FUORI BUDGET"
+            exit_code = exit_code or int(total > budget)
+        print(f"{module}: {total * 1000:.0f} ms" + (f" (budget {budget * 1000:.0f} ms, {status})" if budget else ""))
+        for seconds, name in sorted(modules, reverse=True)[:args.top]:
+            print(f"    {seconds * 1000:8.1f} ms  {name.strip()}")
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+"""
+Server locali che imitano Brevo e Substack per i test di carico offline.
+
+Ogni stub è un `ThreadingHTTPServer` della libreria standard: può essere
+avviato da riga di comando (`python -m benchmarks.stubs.brevo`) oppure in un
+thread dello stesso processo con `serve_in_thread`.
+"""
+import threading
+
+
+def serve_in_thread(server):
+    """
+    Avvia `server` in un thread daemon.
+
+    Returns:
+        str: L'URL base del server (es. http://127.0.0.1:54321).
+    """
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}"
@@ -0,0 +1,217 @@
+"""
+Finto server API Brevo per test di carico offline.
+
+Espone gli endpoint usati dal progetto (`/v3/emailCampaigns` paginato e
+`/v3/emailCampaigns/{id}`) con latenza, risposte 429 ed errori iniettabili.
+I link di tracciamento delle campagne puntano allo stub stesso (`/tr/cl/...`),
+che risponde con un redirect 302 verso una destinazione fissa per ogni link.
+
+    python -m benchmarks.stubs.brevo --port 8025 --count 500 --latency 0.05 --rate-limit 0.05
+    BREVO_API_BASE_URL=http://127.0.0.1:8025/v3 python batch_migrate.py --dry-run
+"""
+import re
+import json
+import time
+import hashlib
+import random
+import argparse
+import threading
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from benchmarks.corpus import KB, SIZES, campaign_metadata, generate_campaign
+from benchmarks.stubs import serve_in_thread
+
+# Limite massimo di campagne per pagina dell'API reale
+MAX_PAGE_SIZE = 100
+
+# Host di tracciamento generati dal corpus, sostituiti con l'indirizzo dello stub
+_TRACKING_HOST_RE = re.compile(r"https://[\w-]+\.r\.bh\.d\.sendibt3\.com")
+
+
+def redirect_target(token):
+    """Destinazione (fissa) del link di tracciamento con questo token."""
+    return f"https://www.example.org/articoli/{hashlib.sha1(token.encode('utf-8')).hexdigest()[:12]}"
+
+
+class FakeBrevo:
+    """Stato del finto Brevo: campagne sintetiche, guasti simulati e contatori."""
+
+    def __init__(self, count=200, size=50 * KB, seed=0, latency=0.0, jitter=0.0,
+                 rate_limit=0.0, error_rate=0.0):
+        self.count = count
+        self.size = size
+        self.seed = seed
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.error_rate = error_rate
+        self.stats = {"requests": 0, "rate_limited": 0, "errors": 0, "redirects": 0, "link_requests": 0}
+        # URL base dei link di tracciamento (impostato da start)
+        self.tracking_base = None
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        # I metadati sono leggeri; l'HTML viene generato solo quando richiesto
+        self.campaigns = [campaign_metadata(i, seed) for i in range(count)]
+        self.campaign_details = lru_cache(maxsize=256)(self._campaign_details)
+
+    def _campaign_details(self, campaign_id):
+        index = campaign_id - 1000
+        if not 0 <= index < self.count:
+            return None
+        campaign = generate_campaign(index, self.size, self.seed)
+        if self.tracking_base:
+            campaign["htmlContent"] = _TRACKING_HOST_RE.sub(self.tracking_base, campaign["htmlContent"])
+        return json.dumps(campaign).encode("utf-8")
+
+    def fault(self):
+        """Decide se la richiesta corrente deve fallire: restituisce lo status HTTP o None."""
+        with self._lock:
+            self.stats["requests"] += 1
+            roll = self._rng.random()
+            if roll < self.rate_limit:
+                self.stats["rate_limited"] += 1
+                return 429
+            if roll < self.rate_limit + self.error_rate:
+                self.stats["errors"] += 1
+                return self._rng.choice((500, 502, 503))
+        return None
+
+    def delay(self):
+        if self.latency or self.jitter:
+            time.sleep(self.latency + random.uniform(0, self.jitter))
+
+
+def make_handler(brevo):
+    class BrevoHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status, body, headers=None):
+            if not isinstance(body, bytes):
+                body = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _redirect(self, token):
+            # Senza corpo, così la stessa risposta vale per HEAD e GET
+            brevo.delay()
+            with brevo._lock:
+                brevo.stats["link_requests"] += 1
+            # Token speciali per i link scaduti: "expired..." risponde 404, "gone..." 200 senza redirect
+            if token.startswith(("expired", "gone")):
+                self.send_response(404 if token.startswith("expired") else 200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            status = brevo.fault()
+            if not status:
+                status = 302
+                with brevo._lock:
+                    brevo.stats["redirects"] += 1
+            self.send_response(status)
+            if status == 302:
+                self.send_header("Location", redirect_target(token))
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def do_HEAD(self):
+            parts = [p for p in urlparse(self.path).path.split("/") if p]
+            if parts[:2] == ["tr", "cl"] and len(parts) == 3:
+                return self._redirect(parts[2])
+            self.send_response(405)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def do_GET(self):
+            parts = [p for p in urlparse(self.path).path.split("/") if p]
+            if parts[:2] == ["tr", "cl"] and len(parts) == 3:
+                # I redirect di tracciamento non richiedono la API key
+                return self._redirect(parts[2])
+            brevo.delay()
+            if not self.headers.get("api-key"):
+                return self._send(401, {"code": "unauthorized", "message": "Key not found"})
+
+            status = brevo.fault()
+            if status == 429:
+                return self._send(429, {"code": "too_many_requests", "message": "Rate limit exceeded"},
+                                  {"Retry-After": "1", "x-sib-ratelimit-reset": "1"})
+            if status:
+                return self._send(status, {"code": "internal_error", "message": "Simulated failure"})
+
+            url = urlparse(self.path)
+            parts = [p for p in url.path.split("/") if p]
+            if parts[:2] != ["v3", "emailCampaigns"]:
+                return self._send(404, {"code": "not_found", "message": "Unknown endpoint"})
+            if len(parts) == 2:
+                return self._list(parse_qs(url.query))
+            if len(parts) == 3 and parts[2].isdigit():
+                body = brevo.campaign_details(int(parts[2]))
+                if body is None:
+                    return self._send(404, {"code": "document_not_found", "message": "Campaign ID does not exist"})
+                return self._send(200, body)
+            return self._send(404, {"code": "not_found", "message": "Unknown endpoint"})
+
+        def _list(self, query):
+            limit = int(query.get("limit", ["50"])[0])
+            offset = int(query.get("offset", ["0"])[0])
+            if limit > MAX_PAGE_SIZE:
+                return self._send(400, {"code": "invalid_parameter", "message": "limit must be <= 100"})
+            status = query.get("status", [None])[0]
+            campaigns = [c for c in brevo.campaigns if not status or c["status"] == status]
+            page = campaigns[offset:offset + limit]
+            if query.get("excludeHtmlContent", ["false"])[0] != "true":
+                page = [json.loads(brevo.campaign_details(c["id"])) for c in page]
+            return self._send(200, {"campaigns": page, "count": len(campaigns)})
+
+    return BrevoHandler
+
+
+def start(brevo=None, host="127.0.0.1", port=0):
+    """
+    Avvia il finto Brevo in un thread.
+
+    Returns:
+        tuple: (server, URL base da usare come BREVO_API_BASE_URL).
+    """
+    brevo = brevo or FakeBrevo()
+    server = ThreadingHTTPServer((host, port), make_handler(brevo))
+    bound_host, bound_port = server.server_address[:2]
+    brevo.tracking_base = f"http://{bound_host}:{bound_port}"
+    return server, serve_in_thread(server) + "/v3"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Finto server API Brevo")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--count", type=int, default=200, help="Numero di campagne")
+    parser.add_argument("--size", choices=SIZES.keys(), default="50KB", help="Dimensione delle newsletter")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.0, help="Latenza fissa per richiesta (s)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Latenza casuale aggiuntiva massima (s)")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Frazione di richieste rifiutate con 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Frazione di richieste con errore 5xx")
+    args = parser.parse_args()
+
+    brevo = FakeBrevo(args.count, SIZES[args.size], args.seed, args.latency, args.jitter,
+                      args.rate_limit, args.error_rate)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(brevo))
+    brevo.tracking_base = f"http://{args.host}:{args.port}"
+    print(f"Finto Brevo in ascolto su http://{args.host}:{args.port}/v3")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
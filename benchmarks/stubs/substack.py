@@ -0,0 +1,209 @@
+"""
+Finta pagina di pubblicazione Substack per test di carico offline.
+
+Le pagine usano gli stessi selettori di `app.substack_bot.create_draft_post`
+(`a[href='/publish/post']`, `input.post-title-input`, `button.editor-menu-button`,
+`button[data-format='markdown']`, `textarea.markdown-editor-input`,
+`button.save-draft-button`); il salvataggio registra la bozza in memoria.
+Senza il cookie `substack.sid`, `/publish` reindirizza al login come il sito reale.
+`/api/v1/post_management/drafts` elenca le bozze a pagine (offset/limit), come
+la dashboard dei post, ed è usato da `app.reconcile`.
+
+    python -m benchmarks.stubs.substack --port 8026
+    SUBSTACK_BASE_URL=http://127.0.0.1:8026 python batch_migrate.py
+"""
+import json
+import time
+import argparse
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from benchmarks.stubs import serve_in_thread
+
+# Risorse "pesanti" come su Substack: immagini, font e uno script di tracciamento
+PAGE_ASSETS = """<link rel="stylesheet" href="/assets/fonts.css" />
+<img src="/assets/hero.png" alt="" /><img src="/assets/avatar.jpg" alt="" /><img src="/assets/banner.webp" alt="" />
+<script src="/assets/analytics.js"></script>"""
+
+ASSET_TYPES = {
+    ".css": "text/css",
+    ".js": "application/javascript",
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".webp": "image/webp",
+    ".woff2": "font/woff2",
+}
+
+HOME_PAGE = """<!DOCTYPE html><html><head><title>Substack</title></head>
+<body><h1>Substack (stub)</h1></body></html>"""
+
+DASHBOARD_PAGE = """<!DOCTYPE html><html><head><title>Dashboard</title>""" + PAGE_ASSETS + """</head>
+<body><h1>Dashboard</h1><a href="/publish/post">New post</a></body></html>"""
+
+EDITOR_PAGE = """<!DOCTYPE html><html><head><title>Editor</title>""" + PAGE_ASSETS + """</head>
+<body>
+<input class="post-title-input" type="text" placeholder="Title" />
+<button class="editor-menu-button" onclick="document.getElementById('menu').style.display='block'">Editor</button>
+<div id="menu" style="display:none">
+  <button data-format="markdown" onclick="document.getElementById('md').style.display='block'">Markdown</button>
+</div>
+<textarea id="md" class="markdown-editor-input" style="display:none" rows="20" cols="80"></textarea>
+<button class="save-draft-button" onclick="saveDraft()">Save draft</button>
+<p id="status"></p>
+<script>
+function saveDraft() {
+  fetch('/api/v1/drafts', {
+    method: 'POST',
+    headers: {'Content-Type': 'application/json'},
+    body: JSON.stringify({
+      title: document.querySelector('input.post-title-input').value,
+      body: document.querySelector('textarea.markdown-editor-input').value
+    })
+  }).then(function () { document.getElementById('status').textContent = 'Saved'; });
+}
+</script>
+</body></html>"""
+
+
+class FakeSubstack:
+    """Stato del finto Substack: bozze salvate, latenza delle pagine, risorse servite e pagine di bozze elencate."""
+
+    def __init__(self, latency=0.0, asset_size=200 * 1024, asset_latency=0.05):
+        self.latency = latency
+        self.asset_size = asset_size
+        self.asset_latency = asset_latency
+        self.asset_requests = 0
+        self.list_requests = 0
+        self.drafts = []
+        self._lock = threading.Lock()
+
+    def asset(self, name):
+        """Contenuto di una risorsa statica: `asset_size` byte del tipo giusto."""
+        with self._lock:
+            self.asset_requests += 1
+        if name.endswith(".css"):
+            return "@font-face { font-family: Stub; src: url('/assets/body.woff2'); } body { font-family: Stub; }"
+        if name.endswith(".js"):
+            return "window.stubAnalytics = true;\n/*" + "x" * self.asset_size + "*/"
+        return b"\0" * self.asset_size
+
+    def add_draft(self, title, body):
+        with self._lock:
+            draft = {
+                "id": len(self.drafts) + 1,
+                "draft_title": title,
+                "draft_body": body,
+                "draft_created_at": datetime.now().isoformat(),
+            }
+            self.drafts.append(draft)
+        return draft
+
+
+def make_handler(substack):
+    class SubstackHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status, body, content_type="text/html; charset=utf-8"):
+            if isinstance(body, (dict, list)):
+                body = json.dumps(body)
+                content_type = "application/json"
+            if isinstance(body, str):
+                body = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _redirect(self, location):
+            self.send_response(302)
+            self.send_header("Location", location)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def _drafts_page(self, url):
+            if "substack.sid=" not in self.headers.get("Cookie", ""):
+                return self._send(401, {"error": "Not authorized"})
+            with substack._lock:
+                substack.list_requests += 1
+            query = parse_qs(url.query)
+            offset = int(query.get("offset", ["0"])[0])
+            limit = int(query.get("limit", ["25"])[0])
+            return self._send(200, {
+                "posts": substack.drafts[offset:offset + limit],
+                "offset": offset,
+                "limit": limit,
+                "total": len(substack.drafts),
+            })
+
+        def do_GET(self):
+            if substack.latency:
+                time.sleep(substack.latency)
+            url = urlparse(self.path)
+            if url.path.startswith("/assets/"):
+                if substack.asset_latency:
+                    time.sleep(substack.asset_latency)
+                name = url.path[len("/assets/"):]
+                content_type = ASSET_TYPES.get(name[name.rfind("."):], "application/octet-stream")
+                return self._send(200, substack.asset(name), content_type)
+            if url.path in ("", "/"):
+                return self._send(200, HOME_PAGE)
+            if url.path == "/publish":
+                if "substack.sid=" not in self.headers.get("Cookie", ""):
+                    return self._redirect("/sign-in?redirect=%2Fpublish")
+                return self._send(200, DASHBOARD_PAGE)
+            if url.path == "/publish/post":
+                return self._send(200, EDITOR_PAGE)
+            if url.path == "/api/v1/drafts":
+                query = parse_qs(url.query)
+                offset = int(query.get("offset", ["0"])[0])
+                limit = int(query.get("limit", ["25"])[0])
+                return self._send(200, substack.drafts[offset:offset + limit])
+            if url.path == "/api/v1/post_management/drafts":
+                return self._drafts_page(url)
+            return self._send(404, "Not found", "text/plain")
+
+        def do_POST(self):
+            if urlparse(self.path).path != "/api/v1/drafts":
+                return self._send(404, "Not found", "text/plain")
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            draft = substack.add_draft(payload.get("title", ""), payload.get("body", ""))
+            return self._send(200, draft)
+
+    return SubstackHandler
+
+
+def start(substack=None, host="127.0.0.1", port=0):
+    """
+    Avvia il finto Substack in un thread.
+
+    Returns:
+        tuple: (server, URL base da usare come SUBSTACK_BASE_URL).
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(substack or FakeSubstack()))
+    return server, serve_in_thread(server)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Finta pagina di pubblicazione Substack")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8026)
+    parser.add_argument("--latency", type=float, default=0.0, help="Latenza per pagina (s)")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(FakeSubstack(args.latency)))
+    print(f"Finto Substack in ascolto su http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
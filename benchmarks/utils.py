@@ -0,0 +1,17 @@
+from functools import lru_cache
+
+from benchmarks.corpus import SIZES, generate_newsletter
+
+# Round per dimensione: le newsletter da 5 MB richiedono centinaia di ms per iterazione
+ROUNDS = {"5KB": 50, "50KB": 20, "500KB": 5, "5MB": 3}
+
+
+@lru_cache(maxsize=None)
+def newsletter(size_label):
+    """Newsletter sintetica deterministica per la dimensione indicata."""
+    return generate_newsletter(SIZES[size_label], seed=42)
+
+
+def run(benchmark, size_label, func, *args):
+    """Esegue `func` con un numero di round adatto alla dimensione del documento."""
+    return benchmark.pedantic(func, args=args, rounds=ROUNDS[size_label], iterations=1, warmup_rounds=1)
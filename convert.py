@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Conversione in blocco di newsletter HTML in Markdown, senza Brevo né Substack.
+
+Legge le campagne da una directory (file `<id>.json` come la cache di
+batch_migrate, oppure file `.html`), da un archivio tar (anche compresso) o
+da un file JSON/JSONL, e le converte su più processi con la stessa pipeline
+del batch (`process_html_content` e `convert_html_to_markdown`). I risultati
+vengono scritti man mano, in ordine di lettura:
+
+    python convert.py cache/campaigns converted/
+    python convert.py newsletter.tar.gz convertite.jsonl --workers 8 --chunksize 8
+
+In una directory ogni post diventa `<id>.md` e i tempi per file finiscono in
+`timings.csv`; in un file JSONL ogni riga contiene anche i tempi.
+"""
+import os
+import re
+import sys
+import csv
+import json
+import time
+import logging
+import tarfile
+import argparse
+import heapq
+import statistics
+from collections import deque
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+
+# Aggiungi il path della cartella corrente
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.utils import process_html_content, convert_html_to_markdown
+from app.models import clean_title
+from app.logging_setup import setup_logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNKSIZE = 4
+# Blocchi in coda per ogni processo: tiene il pool occupato senza leggere tutto l'input
+PENDING_CHUNKS = 4
+PROGRESS_SECONDS = 2.0
+
+_TITLE_RE = re.compile(r"<title[^>]*>(.*?)</title>", re.IGNORECASE | re.DOTALL)
+_UNSAFE_NAME_RE = re.compile(r"[^\w.-]+")
+
+
+def _from_html(name, html_content):
+    key = os.path.splitext(os.path.basename(name))[0]
+    match = _TITLE_RE.search(html_content)
+    return {"id": key, "name": match.group(1).strip() if match else key, "htmlContent": html_content}
+
+
+def _from_member(name, data):
+    """
+    Campagna da un file `.json` (dettagli Brevo) o `.html`; None per gli altri file.
+
+    Un file illeggibile non interrompe la conversione: diventa una campagna con
+    `error`, riportata come errore di quel file.
+    """
+    try:
+        if name.endswith(".json"):
+            campaign = json.loads(data)
+            if not isinstance(campaign, dict):
+                raise ValueError(f"atteso un oggetto JSON, trovato {type(campaign).__name__}")
+            return campaign
+        if name.endswith((".html", ".htm")):
+            return _from_html(name, data.decode("utf-8", errors="replace"))
+    except ValueError as e:
+        return {"id": os.path.splitext(os.path.basename(name))[0], "error": f"{name}: {e}"}
+    return None
+
+
+def iter_campaigns(source):
+    """
+    Legge le campagne una alla volta, senza caricare tutto l'input in memoria.
+
+    Args:
+        source (str): Directory, archivio tar (.tar, .tar.gz, .tgz), file JSONL o JSON.
+
+    Yields:
+        dict: Campagne con almeno 'id', 'name' o 'subject' e 'htmlContent'
+        (oppure 'error' per un file o una riga illeggibile).
+    """
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            path = os.path.join(source, name)
+            if os.path.isfile(path):
+                with open(path, "rb") as f:
+                    campaign = _from_member(name, f.read())
+                if campaign:
+                    yield campaign
+    elif tarfile.is_tarfile(source):
+        # Lettura in streaming: i membri vengono letti in ordine, senza indice
+        with tarfile.open(source, "r|*") as archive:
+            for member in archive:
+                if member.isfile():
+                    campaign = _from_member(member.name, archive.extractfile(member).read())
+                    if campaign:
+                        yield campaign
+    elif source.endswith(".jsonl"):
+        with open(source, "r", encoding="utf-8", errors="replace") as f:
+            for number, line in enumerate(f, start=1):
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except ValueError as e:
+                        yield {"id": None, "error": f"riga {number}: {e}"}
+    else:
+        with open(source, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        yield from (data.get("campaigns", []) if isinstance(data, dict) else data)
+
+
+def convert_one(campaign):
+    """
+    Converte una campagna; eseguita nei processi del pool.
+
+    Returns:
+        dict: id, titolo, Markdown, byte di HTML, secondi impiegati ed eventuale errore.
+    """
+    start = time.perf_counter()
+    result = {"id": None, "title": "", "sent_date": None, "html_bytes": 0, "markdown": None, "error": None}
+    try:
+        if not isinstance(campaign, dict):
+            raise ValueError(f"campagna non valida: atteso un oggetto JSON, trovato {type(campaign).__name__}")
+        html_content = campaign.get("htmlContent") or ""
+        result.update(
+            id=campaign.get("id"),
+            title=clean_title(campaign.get("name") or campaign.get("subject") or str(campaign.get("id") or "")),
+            sent_date=campaign.get("sentDate"),
+            html_bytes=len(html_content),
+        )
+        if campaign.get("error"):
+            raise ValueError(campaign["error"])
+        if not html_content:
+            raise ValueError("nessun contenuto HTML")
+        result["markdown"] = convert_html_to_markdown(process_html_content(html_content))
+    except Exception as e:
+        result["error"] = str(e)
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def convert_chunk(campaigns):
+    """Converte un blocco di campagne in un solo invio al processo."""
+    return [convert_one(campaign) for campaign in campaigns]
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def convert_all(campaigns, workers=None, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Converte le campagne su `workers` processi, restituendo i risultati nell'ordine di ingresso.
+
+    Le campagne partono a blocchi di `chunksize` (un solo pickle per blocco) e
+    restano in coda al massimo `workers * PENDING_CHUNKS` blocchi: l'input
+    viene letto man mano che i risultati escono. Con workers=1 la conversione
+    avviene nel processo corrente.
+
+    Yields:
+        dict: I risultati di convert_one.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        yield from map(convert_one, campaigns)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in _chunks(campaigns, chunksize):
+            pending.append(executor.submit(convert_chunk, chunk))
+            if len(pending) >= workers * PENDING_CHUNKS:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+class DirectoryWriter:
+    """
+    Scrive ogni post in `<id>.md` e i tempi in `timings.csv`.
+
+    I nomi restano unici: campagne senza ID o con lo stesso ID (ad esempio
+    file `.html` omonimi in cartelle diverse dell'archivio) ricevono un
+    suffisso numerico; `timings.csv` riporta il file scritto.
+    """
+
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self._names = set()
+        self._timings_file = open(os.path.join(directory, "timings.csv"), "w", newline="", encoding="utf-8")
+        self._timings = csv.writer(self._timings_file)
+        self._timings.writerow(["id", "file", "title", "html_bytes", "seconds", "error"])
+
+    def _file_name(self, campaign_id):
+        base = _UNSAFE_NAME_RE.sub("_", str(campaign_id)).strip("._") if campaign_id is not None else ""
+        base = base or "senza-id"
+        name, suffix = f"{base}.md", 1
+        while name in self._names:
+            suffix += 1
+            name = f"{base}-{suffix}.md"
+        self._names.add(name)
+        return name
+
+    def write(self, result):
+        name = ""
+        if result["markdown"] is not None:
+            name = self._file_name(result["id"])
+            with open(os.path.join(self.directory, name), "w", encoding="utf-8") as f:
+                f.write(f"# {result['title']}\n\n{result['markdown']}")
+        self._timings.writerow([result["id"], name, result["title"], result["html_bytes"],
+                                f"{result['seconds']:.4f}", result["error"] or ""])
+
+    def close(self):
+        self._timings_file.close()
+
+
+class JsonlWriter:
+    """Scrive un risultato per riga (con tempi ed eventuale errore)."""
+
+    def __init__(self, path):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "w", encoding="utf-8")
+
+    def write(self, result):
+        self._file.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+    def close(self):
+        self._file.close()
+
+
+def run(source, output, workers=None, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Converte tutte le campagne di `source` e le scrive in `output` (directory o file .jsonl).
+
+    Returns:
+        dict: Riepilogo con conteggi, durata, throughput e tempi per file.
+    """
+    writer = JsonlWriter(output) if output.endswith(".jsonl") else DirectoryWriter(output)
+    workers = workers or os.cpu_count() or 1
+    logger.info(f"Conversione di {source} in {output} con {workers} processi (chunksize {chunksize})")
+
+    start = last_progress = time.perf_counter()
+    timings, errors = [], 0
+    try:
+        for result in convert_all(iter_campaigns(source), workers, chunksize):
+            writer.write(result)
+            timings.append((result["seconds"], result["id"]))
+            if result["error"]:
+                errors += 1
+                logger.warning(f"Campagna {result['id']} non convertita: {result['error']}")
+
+            now = time.perf_counter()
+            if now - last_progress >= PROGRESS_SECONDS:
+                last_progress = now
+                logger.info(f"Convertite {len(timings)} campagne ({len(timings) / (now - start):.1f}/s)")
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    durations = [seconds for seconds, _ in timings]
+    summary = {
+        "converted": len(timings) - errors,
+        "errors": errors,
+        "seconds": elapsed,
+        "per_second": len(timings) / elapsed if elapsed else 0.0,
+        "median_seconds": statistics.median(durations) if durations else 0.0,
+        "max_seconds": max(durations, default=0.0),
+        "slowest": [{"id": campaign_id, "seconds": seconds}
+                    for seconds, campaign_id in heapq.nlargest(5, timings, key=lambda t: t[0])],
+    }
+    logger.info(
+        f"Convertite {summary['converted']} campagne ({errors} errori) in {elapsed:.1f}s, "
+        f"{summary['per_second']:.1f}/s; per file mediana {summary['median_seconds'] * 1000:.0f} ms, "
+        f"max {summary['max_seconds'] * 1000:.0f} ms"
+    )
+    for item in summary["slowest"]:
+        logger.info(f"  - campagna {item['id']}: {item['seconds'] * 1000:.0f} ms")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Conversione in blocco di newsletter HTML in Markdown")
+    parser.add_argument("source", help="Directory, archivio tar o file JSON/JSONL con le campagne")
+    parser.add_argument("output", help="Directory di destinazione o file .jsonl")
+    parser.add_argument("--workers", type=int, help="Processi di conversione (default: numero di CPU)")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE,
+                        help="Campagne inviate insieme a ogni processo")
+    args = parser.parse_args()
+
+    setup_logging()
+    summary = run(args.source, args.output, args.workers, args.chunksize)
+    return 1 if summary["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
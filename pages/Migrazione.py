@@ -1,18 +1,19 @@
 import streamlit as st
 import os
-import json
 import logging
-import pandas as pd
-from datetime import datetime
-import requests
+from datetime import datetime, timezone
 from dotenv import load_dotenv
 import time
-import re
-from app.utils import process_html_content, retry_function
+from app import brevo, campaign_index, exporter, session
+from app.jobs import JobManager
+from app.utils import process_html_content, convert_html_to_markdown, chunk_text
 
 # Configurazione logging
 logger = logging.getLogger(__name__)
 
+# Numero massimo di caratteri mostrati per blocco nelle anteprime
+PREVIEW_CHARS = 20000
+
 # Carica variabili d'ambiente
 load_dotenv()
 
@@ -37,127 +38,99 @@ if brevo_list_id:
 if newsletter_name:
     os.environ["NEWSLETTER_NAME"] = newsletter_name
 
+# Mostra un errore di Brevo, con il dettaglio della risposta HTTP se presente
+def show_brevo_error(context, e):
+    response = getattr(e, 'response', None)
+    prefix = "Errore HTTP" if response is not None else "Errore"
+    logger.error(f"{prefix} {context}: {e}")
+    st.error(f"{prefix} {context}: {e}")
+    if response is not None:
+        # Mostra il contenuto della risposta per debug
+        error_details = f"Dettagli risposta: {response.text}"
+        logger.error(error_details)
+        st.error(error_details)
+
 # Funzione per ottenere le campagne da Brevo
 @st.cache_data(ttl=600)
 def get_brevo_campaigns():
     logger.info("Ottengo le campagne da Brevo")
-    url = "https://api.brevo.com/v3/emailCampaigns"
-    headers = {
-        "Accept": "application/json",
-        "api-key": os.getenv("BREVO_API_KEY")
-    }
     
     try:
-        # Prima prova senza parametri o con parametri minimi
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        
-        campaigns = response.json().get("campaigns", [])
+        campaigns = brevo.get_campaigns(os.getenv("BREVO_API_KEY"), status=None)
         logger.info(f"Ottenute {len(campaigns)} campagne")
-        
-        # Filtra le campagne per nome newsletter se specificato
-        if os.getenv("NEWSLETTER_NAME") and os.getenv("NEWSLETTER_NAME").strip():
-            filtered_campaigns = [c for c in campaigns if os.getenv("NEWSLETTER_NAME").lower() in c.get("name", "").lower()]
-            logger.info(f"Filtrate a {len(filtered_campaigns)} campagne con nome '{os.getenv('NEWSLETTER_NAME')}'")
-            return filtered_campaigns
-        
         return campaigns
-    except requests.exceptions.HTTPError as e:
-        logger.error(f"Errore HTTP nel recupero delle campagne: {e}")
-        st.error(f"Errore HTTP nel recupero delle campagne: {e}")
-        # Mostra il contenuto della risposta per debug
-        if hasattr(e, 'response') and e.response is not None:
-            error_details = f"Dettagli risposta: {e.response.text}"
-            logger.error(error_details)
-            st.error(error_details)
-        return []
     except Exception as e:
-        logger.error(f"Errore nel recupero delle campagne: {e}")
-        st.error(f"Errore nel recupero delle campagne: {e}")
+        show_brevo_error("nel recupero delle campagne", e)
         return []
 
-# Funzione per ottenere i dettagli di una campagna
-def get_campaign_content(campaign_id):
+# Indice delle campagne con date e stato di esportazione precalcolati. La pagina lo
+# legge soltanto: cache_resource lo condivide senza serializzarlo a ogni rerun
+@st.cache_resource(ttl=600)
+def get_campaign_index():
+    return campaign_index.build_index(get_brevo_campaigns(), campaign_index.load_exported_keys())
+
+# Contenuto di una campagna scaricato e convertito una sola volta, in cache per ID
+@st.cache_data(ttl=600, max_entries=32, show_spinner=False)
+def get_campaign_preview(campaign_id):
     logger.info(f"Ottengo i dettagli della campagna {campaign_id}")
-    url = f"https://api.brevo.com/v3/emailCampaigns/{campaign_id}"
-    headers = {
-        "Accept": "application/json",
-        "api-key": os.getenv("BREVO_API_KEY")
+    campaign_details = brevo.get_campaign(os.getenv("BREVO_API_KEY"), campaign_id)
+    html_content = campaign_details.get("htmlContent", "")
+    processed_html = process_html_content(html_content)
+    return {
+        "subject": campaign_details.get("subject", ""),
+        "html_content": html_content,
+        "processed_html": processed_html,
+        # Il Markdown che verrà effettivamente caricato su Substack
+        "markdown": convert_html_to_markdown(processed_html),
     }
-    
+
+# Funzione per ottenere i dettagli di una campagna
+def get_campaign_content(campaign_id):
     try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.HTTPError as e:
-        logger.error(f"Errore HTTP nel recupero dei dettagli della campagna {campaign_id}: {e}")
-        st.error(f"Errore HTTP nel recupero dei dettagli della campagna {campaign_id}: {e}")
-        if hasattr(e, 'response') and e.response is not None:
-            error_details = f"Dettagli risposta: {e.response.text}"
-            logger.error(error_details)
-            st.error(error_details)
-        return None
+        return get_campaign_preview(campaign_id)
     except Exception as e:
-        logger.error(f"Errore nel recupero dei dettagli della campagna {campaign_id}: {e}")
-        st.error(f"Errore nel recupero dei dettagli della campagna {campaign_id}: {e}")
+        show_brevo_error(f"nel recupero dei dettagli della campagna {campaign_id}", e)
         return None
 
-# Funzione per esportare una campagna a Substack (simulazione)
-def export_to_substack(title, content, date):
-    # Qui andrà la logica di esportazione a Substack
-    # Per ora è solo una simulazione
-    logger.info(f"Esportazione a Substack: {title}")
-    
-    # Salva il post in un file JSON per tenere traccia
+# Mostra un blocco alla volta di un contenuto potenzialmente molto grande
+def show_chunked(text, key, language=None):
+    chunks = chunk_text(text, PREVIEW_CHARS)
+    index = 0
+    if len(chunks) > 1:
+        index = st.number_input(
+            f"Blocco (di {len(chunks)}, {len(text):,} caratteri totali)",
+            min_value=1, max_value=len(chunks), value=1, key=f"{key}-chunk"
+        ) - 1
+    if language:
+        st.code(chunks[index], language=language)
+    else:
+        st.markdown(chunks[index])
+    return chunks[index]
+
+# Gestore dei job di esportazione, condiviso tra le sessioni
+@st.cache_resource
+def get_job_manager():
+    return JobManager(max_workers=2)
+
+# Verifica la sessione Substack prima di avviare Chrome per ogni campagna
+def check_substack_session():
     try:
-        # Carica i post già esportati
-        if os.path.exists("exported_posts.json"):
-            with open("exported_posts.json", "r") as f:
-                try:
-                    exported_posts = json.load(f)
-                except json.JSONDecodeError:
-                    logger.warning("File exported_posts.json non valido, verrà creato nuovo")
-                    exported_posts = []
-        else:
-            exported_posts = []
-        
-        # Aggiungi il nuovo post
-        exported_posts.append({
-            "title": title,
-            "date": date,
-            "exported_at": datetime.now().isoformat()
-        })
-        
-        # Salva il file aggiornato
-        with open("exported_posts.json", "w") as f:
-            json.dump(exported_posts, f, indent=2)
-        
-        # Salva anche il contenuto HTML in un file separato
-        clean_title = re.sub(r'[^\w\s-]', '', title).strip().replace(' ', '-').lower()
-        os.makedirs("converted", exist_ok=True)
-        with open(f"converted/{clean_title}.html", "w", encoding="utf-8") as f:
-            f.write(content)
-        
-        return True
-    except Exception as e:
-        logger.error(f"Errore nell'esportazione a Substack: {e}")
-        st.error(f"Errore nell'esportazione a Substack: {e}")
-        return False
+        session.preflight()
+    except session.SessionError as e:
+        raise session.SessionError(f"{e}. Aggiorna cookies.json e riprova.") from e
 
-# Funzione per verificare se una campagna è già stata esportata
-def is_already_exported(title, date):
-    if os.path.exists("exported_posts.json"):
-        try:
-            with open("exported_posts.json", "r") as f:
-                exported_posts = json.load(f)
-            
-            for post in exported_posts:
-                if post.get("title") == title and post.get("date") == date:
-                    return True
-        except Exception as e:
-            logger.error(f"Errore nella verifica dei post esportati: {e}")
-    
-    return False
+# Accoda un job di esportazione e lo associa alla sessione corrente
+def submit_export_job(label, campaign_ids, upload):
+    api_key = os.getenv("BREVO_API_KEY")
+    job = get_job_manager().submit(
+        label,
+        campaign_ids,
+        lambda campaign_id: exporter.export_campaign(api_key, campaign_id, upload=upload),
+        # La verifica fa richieste di rete: gira nel thread del job, non nello script Streamlit
+        setup=check_substack_session if upload else None
+    )
+    st.session_state.setdefault("export_jobs", []).append(job.id)
+    return job
 
 # Main
 if not brevo_api_key:
@@ -165,122 +138,157 @@ if not brevo_api_key:
 else:
     # Ottieni le campagne
     with st.spinner("Caricamento campagne..."):
-        campaigns = get_brevo_campaigns()
+        index = get_campaign_index()
+    
+    # Filtra le campagne per nome newsletter se specificato
+    if newsletter_name.strip():
+        index = campaign_index.filter_index(index, name=newsletter_name)
+        logger.info(f"Filtrate a {len(index)} campagne con nome '{newsletter_name}'")
     
-    if not campaigns:
+    if not index:
         st.info("Nessuna campagna trovata o errore nel recupero delle campagne")
     else:
-        # Mostra le campagne in una tabella
-        st.header(f"Campagne trovate: {len(campaigns)}")
+        st.header(f"Campagne trovate: {len(index)}")
         
-        # Prepara i dati per la tabella
-        campaign_data = []
-        for c in campaigns:
-            # Converti la data in un formato più leggibile
-            sent_date = c.get("sentDate", "")
-            if sent_date:
-                # Gestisci diversi formati di data
-                try:
-                    if 'T' in sent_date:
-                        sent_date_obj = datetime.fromisoformat(sent_date.replace('Z', '+00:00'))
-                    else:
-                        sent_date_obj = datetime.strptime(sent_date, '%Y-%m-%d %H:%M:%S')
-                    sent_date_formatted = sent_date_obj.strftime("%d/%m/%Y %H:%M")
-                except Exception as e:
-                    logger.warning(f"Errore nella conversione della data {sent_date}: {e}")
-                    sent_date_formatted = sent_date
-            else:
-                sent_date_formatted = "N/D"
-            
-            # Verifica se è già esportata
-            is_exported = is_already_exported(c.get("name"), sent_date)
-            
-            campaign_data.append({
-                "ID": c.get("id"),
-                "Nome": c.get("name"),
-                "Data invio": sent_date_formatted,
-                "Oggetto": c.get("subject", ""),
-                "Già esportata": "✓" if is_exported else "",
-                "sentDate": sent_date  # Campo nascosto per ordinamento
-            })
+        # Filtri della tabella
+        col_name, col_dates, col_status = st.columns([2, 2, 1])
+        search = col_name.text_input("Cerca per nome")
+        dated = [row.sent_ts for row in index if row.sent_ts is not None]
+        date_range = ()
+        if dated:
+            min_date = datetime.fromtimestamp(min(dated), timezone.utc).date()
+            max_date = datetime.fromtimestamp(max(dated), timezone.utc).date()
+            date_range = col_dates.date_input("Periodo di invio", value=(min_date, max_date),
+                                              min_value=min_date, max_value=max_date)
+        status_filter = col_status.selectbox("Stato", ["Tutte", "Da esportare", "Già esportate"])
         
-        # Ordinamento delle campagne per data di invio (più recenti prima)
-        try:
-            sorted_campaigns = sorted(
-                campaign_data,
-                key=lambda x: datetime.fromisoformat(x['sentDate'].replace('Z', '+00:00')) if 'T' in x['sentDate'] else datetime.strptime(x['sentDate'], '%Y-%m-%d %H:%M:%S'),
-                reverse=True
-            )
-        except Exception as e:
-            logger.warning(f"Errore nell'ordinamento delle campagne: {e}")
-            sorted_campaigns = campaign_data
+        start_ts = end_ts = None
+        if len(date_range) == 2 and tuple(date_range) != (min_date, max_date):
+            start_ts = datetime(*date_range[0].timetuple()[:3], tzinfo=timezone.utc).timestamp()
+            end_ts = datetime(*date_range[1].timetuple()[:3], tzinfo=timezone.utc).timestamp() + 86400
+        exported = {"Tutte": None, "Da esportare": False, "Già esportate": True}[status_filter]
+        rows = campaign_index.filter_index(index, name=search, start_ts=start_ts, end_ts=end_ts, exported=exported)
         
-        # Crea una tabella con Pandas
-        df = pd.DataFrame(sorted_campaigns)
-        if "sentDate" in df.columns:
-            df = df.drop(columns=["sentDate"])  # Rimuovi la colonna nascosta
+        # Paginazione: viene materializzata solo la pagina visibile
+        col_size, col_page = st.columns([1, 1])
+        page_size = col_size.selectbox("Campagne per pagina", [25, 50, 100], index=1)
+        total_pages = max(1, -(-len(rows) // page_size))
+        page = col_page.number_input(f"Pagina (di {total_pages})", min_value=1, max_value=total_pages, value=1)
+        page_rows, _ = campaign_index.paginate(rows, page, page_size)
         
-        st.dataframe(df)
+        st.caption(f"{len(rows)} campagne corrispondono ai filtri")
+        st.dataframe([
+            {
+                "ID": row.id,
+                "Nome": row.name,
+                "Data invio": row.sent_label,
+                "Oggetto": row.subject,
+                "Già esportata": "✓" if row.exported else "",
+            }
+            for row in page_rows
+        ])
         
         # Sezione per esportare una campagna specifica
         st.header("Esporta una campagna")
         
-        campaign_ids = [c.get("ID") for c in sorted_campaigns]
-        campaign_names = [c.get("Nome") for c in sorted_campaigns]
-        
-        # Crea un dizionario di mappatura ID -> Nome
-        campaign_map = {str(id): name for id, name in zip(campaign_ids, campaign_names)}
+        # Crea un dizionario di mappatura ID -> Nome per le campagne della pagina
+        campaign_map = {row.id: row.name for row in page_rows}
         
         # Selettore per la campagna
-        selected_campaign_id = st.selectbox("Seleziona una campagna", options=[str(id) for id in campaign_ids], format_func=lambda x: f"{campaign_map.get(x)} (ID: {x})")
+        selected_campaign_id = st.selectbox("Seleziona una campagna", options=list(campaign_map), format_func=lambda x: f"{campaign_map.get(x)} (ID: {x})")
         
         if st.button("Carica contenuto"):
             if selected_campaign_id:
-                with st.spinner("Caricamento contenuto..."):
-                    campaign_details = get_campaign_content(selected_campaign_id)
-                    
-                    if campaign_details:
-                        # Estrai il contenuto HTML
-                        html_content = campaign_details.get("htmlContent", "")
-                        subject = campaign_details.get("subject", "")
-                        sent_date = campaign_details.get("sentDate", "")
-                        
-                        # Processa il contenuto HTML per renderlo compatibile con Substack
-                        processed_html = process_html_content(html_content)
-                        
-                        # Mostra il contenuto
-                        st.subheader(f"Contenuto della campagna: {subject}")
-                        
-                        # Tabs per visualizzare HTML originale e processato
-                        tab1, tab2 = st.tabs(["HTML Processato", "HTML Originale"])
-                        
-                        with tab1:
-                            st.code(processed_html, language="html")
-                        
-                        with tab2:
-                            st.code(html_content, language="html")
-                        
-                        # Preview del contenuto
-                        st.subheader("Anteprima")
-                        st.write(subject)
-                        st.markdown("---")
-                        st.markdown(processed_html, unsafe_allow_html=True)
-                        
-                        # Bottone per esportare
-                        if st.button("Esporta a Substack"):
-                            with st.spinner("Esportazione in corso..."):
-                                success = export_to_substack(subject, processed_html, sent_date)
-                                if success:
-                                    st.success("Campagna esportata con successo!")
-                                    # Invalida la cache per ricaricare le campagne
-                                    get_brevo_campaigns.clear()
-                                else:
-                                    st.error("Errore nell'esportazione della campagna")
-                    else:
-                        st.error("Impossibile caricare i dettagli della campagna")
+                # Ricorda la campagna caricata: i bottoni successivi provocano un rerun
+                st.session_state["loaded_campaign_id"] = selected_campaign_id
             else:
                 st.warning("Seleziona una campagna da esportare")
         
+        loaded_campaign_id = st.session_state.get("loaded_campaign_id")
+        if loaded_campaign_id:
+            with st.spinner("Caricamento contenuto..."):
+                preview = get_campaign_content(loaded_campaign_id)
+                
+            if preview:
+                subject = preview["subject"]
+                markdown_content = preview["markdown"]
+                
+                # Mostra il contenuto
+                st.subheader(f"Contenuto della campagna: {subject}")
+                
+                # Anteprima del Markdown che verrà caricato, un blocco alla volta
+                st.subheader("Anteprima")
+                st.write(subject)
+                st.markdown("---")
+                show_chunked(markdown_content, f"preview-{loaded_campaign_id}")
+                
+                # I sorgenti completi vengono inviati al browser solo su richiesta:
+                # l'expander esegue comunque il suo contenuto a ogni rerun
+                sources_key = f"show-sources-{loaded_campaign_id}"
+                with st.expander("Sorgenti"):
+                    if not st.session_state.get(sources_key):
+                        st.button("Mostra sorgenti", key=f"{sources_key}-show",
+                                  on_click=st.session_state.__setitem__, args=(sources_key, True))
+                    else:
+                        source = st.radio("Sorgente", ["Markdown", "HTML Processato", "HTML Originale"], horizontal=True)
+                        text, language = {
+                            "Markdown": (markdown_content, "markdown"),
+                            "HTML Processato": (preview["processed_html"], "html"),
+                            "HTML Originale": (preview["html_content"], "html"),
+                        }[source]
+                        show_chunked(text, f"source-{source}-{loaded_campaign_id}", language=language)
+                        st.download_button("Scarica sorgente completo", text, file_name=f"{loaded_campaign_id}-{source.lower().replace(' ', '-')}.txt")
+                        st.button("Nascondi sorgenti", key=f"{sources_key}-hide",
+                                  on_click=st.session_state.__setitem__, args=(sources_key, False))
+                
+                # Bottone per esportare: il lavoro avviene in background
+                if st.button("Esporta a Substack"):
+                    submit_export_job(subject, [loaded_campaign_id], upload=False)
+                    st.success("Esportazione avviata in background")
+            else:
+                st.error("Impossibile caricare i dettagli della campagna")
+        
         # Sezione per esportazione batch
         st.header("Esportazione Batch")
-        st.info("Per esportare più campagne contemporaneamente, usa lo script batch_migrate.py")
+        
+        select_all = st.checkbox(f"Seleziona tutte le campagne filtrate ({len(rows)})")
+        if select_all:
+            bulk_ids = [row.id for row in rows]
+        else:
+            bulk_ids = st.multiselect(
+                "Campagne da esportare",
+                options=[row.id for row in page_rows],
+                format_func=lambda x: f"{campaign_map.get(x)} (ID: {x})"
+            )
+        upload = st.checkbox("Carica anche su Substack come bozza (richiede cookies.json)")
+        
+        if st.button("Avvia esportazione in background", disabled=not bulk_ids):
+            job = submit_export_job(f"{len(bulk_ids)} campagne", bulk_ids, upload)
+            st.success(f"Job {job.id} avviato: {len(bulk_ids)} campagne")
+        
+        # Avanzamento dei job della sessione
+        session_jobs = get_job_manager().jobs(st.session_state.get("export_jobs", []))
+        if session_jobs:
+            st.subheader("Job di esportazione")
+            for job in session_jobs:
+                st.progress(job.progress, text=f"[{job.id}] {job.label}: {job.done + job.failed}/{job.total} ({job.status})")
+                if job.errors:
+                    with st.expander(f"Errori del job {job.id} ({len(job.errors)})"):
+                        st.text("\n".join(job.errors[-50:]))
+                if job.running and st.button("Annulla", key=f"cancel-{job.id}"):
+                    job.cancel()
+            
+            # Ricarica l'indice una volta per ogni job terminato, per aggiornare lo stato "Già esportata"
+            indexed_jobs = st.session_state.setdefault("indexed_jobs", set())
+            finished = {job.id for job in session_jobs if not job.running and job.done}
+            if finished - indexed_jobs:
+                indexed_jobs.update(finished)
+                get_campaign_index.clear()
+            
+            if any(job.running for job in session_jobs):
+                # Il rerun legge solo lo stato dei job: il lavoro resta nei thread del pool
+                st.button("Aggiorna stato")
+                if st.checkbox("Aggiornamento automatico", value=True):
+                    time.sleep(2)
+                    rerun = getattr(st, "rerun", None) or st.experimental_rerun
+                    rerun()
@@ -1,21 +1,62 @@
-
 import streamlit as st
-import json
-import os
+
+from app.history import get_history
 
 st.set_page_config(page_title="Storico Newsletter", layout="wide")
 st.title("Storico Newsletter Esportate")
 
-export_file = "exported_posts.json"
-
-if os.path.exists(export_file):
-    with open(export_file, "r") as f:
-        exported = json.load(f)
-    if exported:
-        st.success(f"Newsletter esportate trovate: {len(exported)}")
-        for eid in exported:
-            st.markdown(f"- Campagna ID: `{eid}`")
-    else:
-        st.info("Nessuna newsletter esportata finora.")
-else:
-    st.warning("File exported_posts.json non trovato.")
+history = get_history()
+# Rilegge exported_posts.json solo se è cambiato dall'ultima visita
+history.sync_ledger()
+
+stats = history.stats()
+if stats["total_exports"] == 0 and stats["attempts"] == 0:
+    st.info("Nessuna newsletter esportata finora.")
+    st.stop()
+
+# Statistiche aggregate
+col_total, col_failures, col_upload = st.columns(3)
+col_total.metric("Newsletter esportate", stats["total_exports"])
+col_failures.metric("Tasso di fallimento", f"{stats['failure_rate']:.1%}",
+                    help=f"{stats['failures']} tentativi falliti su {stats['attempts']}")
+avg_upload = stats["avg_upload_seconds"]
+col_upload.metric("Tempo medio di upload", f"{avg_upload:.1f} s" if avg_upload is not None else "N/D")
+
+if stats["exports_per_day"]:
+    st.subheader("Esportazioni al giorno (ultimi 30 giorni)")
+    st.bar_chart(stats["exports_per_day"])
+
+# Filtri
+col_search, col_dates = st.columns([2, 2])
+search = col_search.text_input("Cerca per titolo o ID campagna")
+date_range = col_dates.date_input("Periodo di esportazione", value=())
+start_day = end_day = None
+if len(date_range) == 2:
+    start_day, end_day = date_range
+elif len(date_range) == 1:
+    start_day = end_day = date_range[0]
+
+# Paginazione: dal database viene letta solo la pagina visibile
+total = history.count(search, start_day, end_day)
+col_size, col_page = st.columns([1, 1])
+page_size = col_size.selectbox("Righe per pagina", [25, 50, 100], index=1)
+total_pages = max(1, -(-total // page_size))
+page = col_page.number_input(f"Pagina (di {total_pages})", min_value=1, max_value=total_pages, value=1)
+
+st.caption(f"{total} esportazioni corrispondono ai filtri")
+st.dataframe([
+    {
+        "ID": row["campaign_id"],
+        "Titolo": row["title"] or "",
+        "Data invio": row["sent_date"] or "",
+        "Esportata il": (row["exported_at"] or "")[:16].replace("T", " "),
+    }
+    for row in history.query(search, start_day, end_day, page, page_size)
+])
+
+failures = history.recent_failures()
+if failures:
+    with st.expander(f"Ultimi tentativi falliti ({stats['failures']})"):
+        for failure in failures:
+            st.write(f"**{failure['title'] or failure['campaign_id']}** "
+                     f"({failure['attempted_at'][:16].replace('T', ' ')}): {failure['error']}")
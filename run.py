@@ -19,16 +19,20 @@ def main():
     """Main entry point to start the application."""
     logger.info("Avvio newsletter_migrator")
     
-    # Esegui il setup iniziale
-    if not os.path.exists("setup.py"):
+    # Esegui il setup iniziale nello stesso processo
+    try:
+        import setup
+    except ImportError:
         logger.error("setup.py non trovato. Esecuzione non possibile.")
         return
     
     try:
-        logger.info("Esecuzione setup.py...")
-        subprocess.run([sys.executable, "setup.py"], check=True)
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Errore durante l'esecuzione di setup.py: {e}")
+        logger.info("Esecuzione setup...")
+        setup.setup_directories()
+        setup.setup_exported_posts()
+        setup.setup_logging_config()
+    except OSError as e:
+        logger.error(f"Errore durante l'esecuzione del setup: {e}")
         return
     
     # Avvia Streamlit
@@ -24,12 +24,15 @@ def setup_logging_config():
             "standard": {
                 "format": "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
             },
+            "json": {
+                "()": "app.logging_setup.JsonFormatter"
+            },
         },
         "handlers": {
             "file": {
                 "class": "logging.FileHandler",
                 "level": "INFO",
-                "formatter": "standard",
+                "formatter": "json",
                 "filename": "logs/newsletter_migrator.log",
                 "mode": "a",
             },